@@ -0,0 +1,274 @@
+import re
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from .models import IndexSuggestion
+from .plan_tree import PlanTree
+
+
+SCAN_TYPES = ('Seq Scan', 'Bitmap Heap Scan', 'Index Scan', 'Index Only Scan')
+JOIN_CONDITIONS = ('Hash Cond', 'Merge Cond', 'Join Filter')
+EQUALITY_OPERATORS = ('=', 'IS NULL')
+RANGE_OPERATORS = ('<', '>', '<=', '>=', '~~')
+MAX_KEY_COLUMNS = 4
+MAX_INCLUDE_COLUMNS = 3
+ADVISOR_INDEX_PREFIX = 't1_advisor_'
+
+INDEX_SIZE_SQL = """
+SELECT pg_relation_size(i.indexrelid)
+FROM pg_index i
+JOIN pg_class c ON c.oid = i.indexrelid
+WHERE i.indrelid = %s::regclass AND c.relname = %s
+"""
+
+_COLUMN = r'\(*(?:"?(\w+)"?\.)?"?(\w+)"?\)?(?:::[\w ]+?(?:\[\])?)?\)?'
+_PREDICATE = re.compile(_COLUMN + r' (<=|>=|<>|=|<|>|~~|IS NULL)(?![\w*])')
+_JOIN_KEY = re.compile(_COLUMN + r' = ' + _COLUMN)
+_SORT_KEY = re.compile(r'^(?:"?(\w+)"?\.)?"?(\w+)"?(?: (?:ASC|DESC))?(?: NULLS (?:FIRST|LAST))?$')
+_OUTPUT_COLUMN = _SORT_KEY
+
+
+class QueryPlan(NamedTuple):
+    query: str
+    weight: float
+    tree: PlanTree
+    params: int
+
+
+class IndexCandidate(NamedTuple):
+    table: str
+    columns: Tuple[str, ...]
+    include: Tuple[str, ...]
+    queries: Tuple[int, ...]
+    scan_cost: float
+
+
+def quote_ident(name: str) -> str:
+    if re.fullmatch(r'[a-z_][a-z0-9_$]*', name):
+        return name
+    return '"%s"' % name.replace('"', '""')
+
+
+def qualified_name(node: Dict[str, Any]) -> str:
+    name = quote_ident(node['Relation Name'])
+    if node.get('Schema'):
+        name = f"{quote_ident(node['Schema'])}.{name}"
+    return name
+
+
+def index_definition(candidate: IndexCandidate, name: Optional[str] = None) -> str:
+    columns = ', '.join(quote_ident(column) for column in candidate.columns)
+    include = ''
+    if candidate.include:
+        include = f" INCLUDE ({', '.join(quote_ident(column) for column in candidate.include)})"
+    return f"CREATE INDEX {quote_ident(name) + ' ' if name else ''}ON {candidate.table} ({columns}){include}"
+
+
+def _belongs(alias: Optional[str], node: Dict[str, Any]) -> bool:
+    return alias is None or alias in (node.get('Alias'), node.get('Relation Name'))
+
+
+def scan_predicates(node: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+    equality, ranges = [], []
+    for key in ('Filter', 'Index Cond', 'Recheck Cond'):
+        for alias, column, operator in _PREDICATE.findall(node.get(key, '')):
+            if not _belongs(alias or None, node):
+                continue
+            if operator in EQUALITY_OPERATORS and column not in equality:
+                equality.append(column)
+            elif operator in RANGE_OPERATORS and column not in ranges:
+                ranges.append(column)
+    return equality, [column for column in ranges if column not in equality]
+
+
+def join_columns(tree: PlanTree, scans: Dict[str, List[int]]) -> Dict[int, List[str]]:
+    columns: Dict[int, List[str]] = {}
+    for node in tree.nodes:
+        for key in JOIN_CONDITIONS:
+            for match in _JOIN_KEY.findall(node.get(key, '')):
+                for alias, column in (match[:2], match[2:]):
+                    for index in scans.get(alias, ()):
+                        if column not in columns.setdefault(index, []):
+                            columns[index].append(column)
+    return columns
+
+
+def sort_columns(tree: PlanTree, index: int) -> List[str]:
+    parent = tree.parents[index]
+    if parent < 0 or tree.nodes[parent].get('Node Type') not in ('Sort', 'Incremental Sort'):
+        return []
+    columns = []
+    for key in tree.nodes[parent].get('Sort Key', []):
+        match = _SORT_KEY.match(key)
+        if match is None or not _belongs(match.group(1), tree.nodes[index]):
+            break
+        columns.append(match.group(2))
+    return columns
+
+
+def output_columns(node: Dict[str, Any]) -> List[str]:
+    columns = []
+    for item in node.get('Output', []):
+        match = _OUTPUT_COLUMN.match(item)
+        if match is None or not _belongs(match.group(1), node):
+            return []
+        columns.append(match.group(2))
+    return columns
+
+
+def plan_candidates(plan: QueryPlan, query_index: int) -> List[IndexCandidate]:
+    tree = plan.tree
+    scans: Dict[str, List[int]] = {}
+    for index, node in enumerate(tree.nodes):
+        if node.get('Node Type') in SCAN_TYPES and node.get('Relation Name'):
+            scans.setdefault(node.get('Alias') or node['Relation Name'], []).append(index)
+    joins = join_columns(tree, scans)
+
+    candidates = []
+    for indexes in scans.values():
+        for index in indexes:
+            node = tree.nodes[index]
+            if node['Node Type'] != 'Seq Scan' and 'Filter' not in node:
+                continue
+            equality, ranges = scan_predicates(node)
+            equality += [column for column in joins.get(index, []) if column not in equality]
+            ordering = [column for column in sort_columns(tree, index) if column not in equality]
+            tail = ranges[:1] or ordering
+            columns = tuple((equality + tail)[:MAX_KEY_COLUMNS])
+            if not columns:
+                continue
+
+            scan_cost = tree.exclusive(index, 'Total Cost') * plan.weight
+            table = qualified_name(node)
+            candidates.append(IndexCandidate(table, columns, (), (query_index,), scan_cost))
+            include = tuple(column for column in output_columns(node) if column not in columns)
+            if 0 < len(include) <= MAX_INCLUDE_COLUMNS:
+                candidates.append(IndexCandidate(table, columns, include, (query_index,), scan_cost))
+    return candidates
+
+
+def _covers(wide: IndexCandidate, narrow: IndexCandidate) -> bool:
+    return (wide.table == narrow.table and wide.columns[:len(narrow.columns)] == narrow.columns and
+            (bool(narrow.include) or not wide.include) and
+            set(narrow.include) <= set(wide.columns) | set(wide.include))
+
+
+def merge_candidates(candidates: Iterable[IndexCandidate]) -> List[IndexCandidate]:
+    merged: Dict[Tuple[str, Tuple[str, ...], Tuple[str, ...]], IndexCandidate] = {}
+    for candidate in candidates:
+        key = (candidate.table, candidate.columns, tuple(sorted(candidate.include)))
+        known = merged.get(key)
+        if known is not None:
+            candidate = known._replace(queries=tuple(sorted(set(known.queries) | set(candidate.queries))),
+                                       scan_cost=known.scan_cost + candidate.scan_cost)
+        merged[key] = candidate
+
+    ordered = sorted(merged.values(), key=lambda c: (-len(c.columns), -len(c.include)))
+    result: List[IndexCandidate] = []
+    for candidate in ordered:
+        for position, wide in enumerate(result):
+            if _covers(wide, candidate):
+                result[position] = wide._replace(
+                    queries=tuple(sorted(set(wide.queries) | set(candidate.queries))),
+                    scan_cost=wide.scan_cost + candidate.scan_cost)
+                break
+        else:
+            result.append(candidate)
+    return sorted(result, key=lambda c: -c.scan_cost)
+
+
+def collect_candidates(plans: List[QueryPlan], max_candidates: int = 50) -> List[IndexCandidate]:
+    candidates = []
+    for query_index, plan in enumerate(plans):
+        candidates.extend(plan_candidates(plan, query_index))
+    return merge_candidates(candidates)[:max_candidates]
+
+
+def _plan_cost(analyzer, conn, plan: QueryPlan) -> float:
+    return analyzer.build_plan_tree(analyzer.explain(conn, plan.query, plan.params)).root['Total Cost']
+
+
+def evaluate_candidate(analyzer, conn, candidate: IndexCandidate, plans: List[QueryPlan],
+                       name: str, lock_timeout_ms: int = 1000) -> Tuple[int, Dict[int, float]]:
+    import psycopg2
+
+    with conn.cursor() as cur:
+        cur.execute("BEGIN")
+        try:
+            cur.execute("SET LOCAL lock_timeout = %s", (lock_timeout_ms,))
+            cur.execute("SET LOCAL statement_timeout = %s", (analyzer.statement_timeout_ms,))
+            cur.execute(index_definition(candidate, name))
+            cur.execute(INDEX_SIZE_SQL, (candidate.table, name))
+            size = cur.fetchone()[0]
+            costs = {index: _plan_cost(analyzer, conn, plans[index]) for index in candidate.queries}
+            return size, costs
+        except psycopg2.Error as e:
+            raise Exception(f"Не удалось оценить индекс {index_definition(candidate)}: {e}")
+        finally:
+            cur.execute("ROLLBACK")
+
+
+def select_indexes(suggestions: List[IndexSuggestion], budget_bytes: int) -> List[IndexSuggestion]:
+    selected: List[IndexSuggestion] = []
+    used = 0
+    ranked = sorted(suggestions, key=lambda s: -s.benefit / max(s.size_bytes, 8192))
+    for suggestion in ranked:
+        if suggestion.benefit <= 0 or used + suggestion.size_bytes > budget_bytes:
+            continue
+        if any(s.table == suggestion.table and
+               (s.columns[:len(suggestion.columns)] == suggestion.columns or
+                suggestion.columns[:len(s.columns)] == s.columns)
+               for s in selected):
+            continue
+        selected.append(suggestion)
+        used += suggestion.size_bytes
+    return selected
+
+
+def advise_indexes(
+        analyzer,
+        workload: Iterable[Tuple[str, float]],
+        budget_bytes: int,
+        max_candidates: int = 50,
+        lock_timeout_ms: int = 1000
+) -> List[IndexSuggestion]:
+    from .utils import extract_query_info
+
+    with analyzer.acquire() as conn:
+        generic_in_transaction = conn.server_version >= 160000
+        plans = []
+        baseline: Dict[int, float] = {}
+        for query, weight in workload:
+            params = extract_query_info(query)['max_param']
+            if params and not generic_in_transaction:
+                continue
+            try:
+                tree = analyzer.build_plan_tree(analyzer.explain(conn, query, params))
+            except Exception as e:
+                analyzer.logger.warning("Запрос пропущен советником индексов: %s", e)
+                continue
+            baseline[len(plans)] = tree.root['Total Cost']
+            plans.append(QueryPlan(query, weight, tree, params))
+
+        suggestions = []
+        for number, candidate in enumerate(collect_candidates(plans, max_candidates)):
+            try:
+                size, costs = evaluate_candidate(analyzer, conn, candidate, plans,
+                                                 f"{ADVISOR_INDEX_PREFIX}{number}", lock_timeout_ms)
+            except Exception as e:
+                analyzer.logger.warning("%s", e)
+                continue
+
+            improved: Set[int] = {index for index, cost in costs.items() if cost < baseline[index]}
+            suggestions.append(IndexSuggestion(
+                table=candidate.table,
+                columns=list(candidate.columns),
+                include=list(candidate.include),
+                definition=index_definition(candidate),
+                size_bytes=size,
+                benefit=sum((baseline[index] - costs[index]) * plans[index].weight for index in improved),
+                queries=len(candidate.queries),
+                improved_queries=len(improved),
+                cost_before=sum(baseline[index] for index in candidate.queries),
+                cost_after=sum(costs.values())
+            ))
+
+    return select_indexes(suggestions, budget_bytes)
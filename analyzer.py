@@ -1,24 +1,87 @@
-import psycopg2
 import json
 import logging
-from typing import Dict, Any, List, Optional
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Any, Iterator, List, Optional, Tuple, Union
 from datetime import datetime
-from .models import QueryMetric, Recommendation, AnalysisReport, Priority, T1CloudService
-from .utils import extract_query_info, extract_filter_columns, find_plan_nodes, parse_psql_connection_string
+from .models import (AnalysisReport, MetricRecord, NodeActualRecord, NodeCostRecord, Priority, RecommendationRecord,
+                     ReportRecord, T1CloudService, to_report)
+from .advisor import scan_predicates
+from .cache import PlanCache
+from .calibration import ExecutionTimeModel, DEFAULT_COST_FACTOR, load_model, node_actual_times
+from .plan_tree import PlanTree, structural_hash
+from .profiling import NO_STAGE
+from .rules import RuleContext, RuleRegistry, registry as default_rules
+from .utils import ensure_single_statement, extract_query_info, extract_filter_columns, parse_psql_connection_string
+
+if TYPE_CHECKING:
+    from .catalog import CatalogSnapshot, RelationInfo
+    from .history import PlanHistory
+    from .profiling import StageMetrics
 
 
 logger = logging.getLogger("T1PgQueryAnalyzer")
 
+ROW_ERROR_THRESHOLD = 10.0
+ROW_ERROR_MIN_ROWS = 1000
+HOT_NODES_LIMIT = 5
+LOW_SELECTIVITY = 0.2
+EXPLAIN_SAVEPOINT = "t1_explain"
+
+PLANNER_SETTINGS = (
+    'work_mem', 'random_page_cost', 'seq_page_cost', 'cpu_tuple_cost', 'cpu_index_tuple_cost',
+    'cpu_operator_cost', 'effective_cache_size', 'default_statistics_target', 'jit',
+    'plan_cache_mode', 'max_parallel_workers_per_gather', 'from_collapse_limit',
+    'join_collapse_limit', 'geqo', 'geqo_threshold', 'constraint_exclusion',
+)
+
+PLANNER_SETTINGS_SQL = """
+SELECT current_setting('search_path'),
+       string_agg(name || '=' || setting, ',' ORDER BY name)
+FROM pg_settings
+WHERE name LIKE 'enable\\_%%' OR name = ANY(%s)
+"""
+
 
 class T1PgQueryAnalyzer:
-    def __init__(self, dsn: str, t1_environment: Optional[str] = None, verbose: bool = False):
+    def __init__(self, dsn: Optional[str] = None, t1_environment: Optional[str] = None, verbose: bool = False,
+                 plan_cache: Optional[PlanCache] = None, catalog_check_interval: float = 5.0,
+                 time_model: Optional[ExecutionTimeModel] = None, explain_analyze: bool = False,
+                 statement_timeout_ms: int = 30000, plan_history: Optional["PlanHistory"] = None,
+                 catalog: Optional["CatalogSnapshot"] = None, rules: Optional[RuleRegistry] = None,
+                 stage_metrics: Optional["StageMetrics"] = None):
         self.raw_dsn = dsn
         self.dsn = None
         self.connection_params = None
         self.t1_environment = t1_environment
         self.verbose = verbose
         self.connection = None
+        self.pool = None
         self.logger = logger
+        self.plan_cache = plan_cache
+        self.catalog_check_interval = catalog_check_interval
+        self._session_settings = None
+        self._catalog_checked_at = 0.0
+        self._catalog_lock = threading.Lock()
+        if time_model is None:
+            try:
+                time_model = load_model(t1_environment)
+            except (ValueError, KeyError, OSError) as e:
+                logger.warning("Модель калибровки не загружена, используется коэффициент %s: %s", DEFAULT_COST_FACTOR, e)
+        self.time_model = time_model
+        self.explain_analyze = explain_analyze
+        self.statement_timeout_ms = statement_timeout_ms
+        self.plan_history = plan_history
+        self.catalog = catalog
+        self._catalog_refreshed_at: Optional[float] = None
+        self._catalog_refresh_lock = threading.Lock()
+        self.rules = rules if rules is not None else default_rules
+        self.stage_metrics = stage_metrics
+
+        if dsn is None:
+            return
 
         dsn_stripped = dsn.strip()
 
@@ -30,13 +93,23 @@ class T1PgQueryAnalyzer:
         else:
             self.dsn = dsn
 
+    def stage(self, name: str):
+        return self.stage_metrics.stage(name) if self.stage_metrics is not None else NO_STAGE
+
+    def _connect_kwargs(self) -> Dict[str, Any]:
+        kwargs = dict(self.connection_params or {})
+        if self.dsn:
+            kwargs['dsn'] = self.dsn
+        kwargs.setdefault('connect_timeout', 10)
+        kwargs.setdefault('application_name', "pgqueryguard-t1-cloud")
+        return kwargs
+
     def connect(self):
+        import psycopg2
+
         try:
-            self.connection = psycopg2.connect(
-                self.dsn,
-                connect_timeout=10,
-                application_name="pgqueryguard-t1-cloud"
-            )
+            with self.stage('connect'):
+                self.connection = psycopg2.connect(**self._connect_kwargs())
             self.connection.autocommit = True
 
             with self.connection.cursor() as cur:
@@ -48,15 +121,156 @@ class T1PgQueryAnalyzer:
         except psycopg2.Error as e:
             raise
 
-    def get_explain_plan(self, query: str) -> Dict[str, Any]:
-        with self.connection.cursor() as cur:
+    def open_pool(self, max_connections: int, min_connections: int = 1):
+        if max_connections < 1:
+            raise ValueError("Размер пула соединений должен быть не меньше 1")
+        import psycopg2.pool
+
+        with self.stage('connect'):
+            self.pool = psycopg2.pool.ThreadedConnectionPool(
+                min(min_connections, max_connections), max_connections, **self._connect_kwargs()
+            )
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.closeall()
+            self.pool = None
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    @contextmanager
+    def acquire(self) -> Iterator[Any]:
+        if self.pool is None:
+            yield self.connection
+            return
+
+        with self.stage('acquire'):
+            conn = self.pool.getconn()
+        try:
+            conn.autocommit = True
+            yield conn
+        finally:
+            self.pool.putconn(conn, close=bool(conn.closed))
+
+    def _load_plan(self, raw: Any) -> Any:
+        if isinstance(raw, (bytes, str)):
+            with self.stage('json_parse'):
+                return json.loads(raw)
+        return raw
+
+    def get_session_settings(self, connection) -> tuple:
+        if self._session_settings is None:
+            with connection.cursor() as cur:
+                cur.execute(PLANNER_SETTINGS_SQL, (list(PLANNER_SETTINGS),))
+                self._session_settings = tuple(cur.fetchone())
+        return self._session_settings
+
+    def _check_plan_cache(self, connection):
+        now = time.monotonic()
+        if now - self._catalog_checked_at < self.catalog_check_interval:
+            return
+        if not self._catalog_lock.acquire(blocking=False):
+            return
+        try:
+            self._catalog_checked_at = now
+            invalidated = self.plan_cache.check_catalog(connection)
+            if invalidated:
+                self.logger.info("Кэш планов: сброшено %d записей после изменения каталога", invalidated)
+        finally:
+            self._catalog_lock.release()
+
+    @staticmethod
+    def plan_relations(tree: PlanTree) -> List[str]:
+        relations = {}
+        for node in tree.nodes:
+            relation = node.get('Relation Name')
+            if relation is None:
+                continue
+            name = '"%s"' % relation.replace('"', '""')
+            if node.get('Schema'):
+                name = '"%s".%s' % (node['Schema'].replace('"', '""'), name)
+            relations[name] = None
+        return list(relations)
+
+    def _refresh_catalog(self, connection):
+        now = time.monotonic()
+        if self._catalog_refreshed_at is not None and now - self._catalog_refreshed_at < self.catalog_check_interval:
+            return
+        if not self._catalog_refresh_lock.acquire(blocking=not self.catalog.loaded):
+            return
+        try:
+            if self._catalog_refreshed_at is not None and now - self._catalog_refreshed_at < self.catalog_check_interval:
+                return
+            self._catalog_refreshed_at = now
+            reloaded = self.catalog.refresh(connection)
+            if reloaded:
+                self.logger.info("Снимок каталога: обновлено %d таблиц", reloaded)
+        except Exception as e:
+            self.logger.warning("Не удалось загрузить снимок каталога: %s", e)
+        finally:
+            self._catalog_refresh_lock.release()
+
+    def get_explain_plan(self, query: str, query_info: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        ensure_single_statement(query)
+        query_info = query_info or extract_query_info(query)
+        params = query_info['max_param']
+        with self.acquire() as conn:
+            if self.catalog is not None:
+                with self.stage('catalog_refresh'):
+                    self._refresh_catalog(conn)
+
+            if self.explain_analyze and not params:
+                with self.stage('explain'):
+                    return self.run_explain_analyze(conn, query)
+
+            if self.plan_cache is None:
+                with self.stage('explain'):
+                    return self.explain(conn, query, params)
+
+            self._check_plan_cache(conn)
+            key = (query_info['fingerprint'],) + self.get_session_settings(conn)
+            plan = self.plan_cache.get(key)
+            if plan is None:
+                with self.stage('explain'):
+                    plan = self.explain(conn, query, params)
+                relations = self.plan_relations(self.build_plan_tree(plan))
+                self.plan_cache.put(key, plan, relations)
+                missing = self.plan_cache.missing_state(relations)
+                if missing:
+                    self.plan_cache.check_catalog(conn, missing)
+            return plan
+
+    def _fetch_plan(self, cur, explain_query: str, savepoint: bool):
+        if not savepoint:
+            cur.execute(explain_query)
+            return cur.fetchone()
+        cur.execute(f"SAVEPOINT {EXPLAIN_SAVEPOINT}")
+        try:
+            cur.execute(explain_query)
+            result = cur.fetchone()
+        except Exception:
+            cur.execute(f"ROLLBACK TO SAVEPOINT {EXPLAIN_SAVEPOINT}")
+            raise
+        cur.execute(f"RELEASE SAVEPOINT {EXPLAIN_SAVEPOINT}")
+        return result
+
+    def explain(self, conn, query: str, params: int = 0) -> Dict[str, Any]:
+        import psycopg2
+        from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+        ensure_single_statement(query)
+        savepoint = conn.get_transaction_status() != TRANSACTION_STATUS_IDLE
+        if params:
+            return self._explain_generic(conn, query, params, savepoint)
+
+        with conn.cursor() as cur:
             try:
                 explain_query = f"EXPLAIN (FORMAT JSON, VERBOSE, SETTINGS, BUFFERS) {query}"
-                cur.execute(explain_query)
-                result = cur.fetchone()
+                result = self._fetch_plan(cur, explain_query, savepoint)
 
                 if result and result[0]:
-                    plan_data = json.loads(result[0])
+                    plan_data = self._load_plan(result[0])
                     return plan_data
                 else:
                     raise Exception("Пустой результат EXPLAIN")
@@ -64,142 +278,275 @@ class T1PgQueryAnalyzer:
             except psycopg2.Error:
                 try:
                     explain_query = f"EXPLAIN (FORMAT JSON) {query}"
-                    cur.execute(explain_query)
-                    result = cur.fetchone()
+                    result = self._fetch_plan(cur, explain_query, savepoint)
                     if result and result[0]:
-                        plan_data = json.loads(result[0])
+                        plan_data = self._load_plan(result[0])
                         return plan_data
                 except psycopg2.Error as e:
                     raise Exception(f"Не удалось получить план выполнения: {e}")
 
-    def extract_metrics(self, plan: Dict[str, Any]) -> QueryMetric:
-        total_plan = plan[0]['Plan']
+    def _explain_generic(self, conn, query: str, params: int, savepoint: bool = False) -> Dict[str, Any]:
+        import psycopg2
+
+        with conn.cursor() as cur:
+            try:
+                if conn.server_version >= 160000:
+                    return self._load_plan(
+                        self._fetch_plan(cur, f"EXPLAIN (FORMAT JSON, GENERIC_PLAN) {query}", savepoint)[0])
 
-        metrics = QueryMetric(
+                cur.execute(f"SAVEPOINT {EXPLAIN_SAVEPOINT}" if savepoint else "BEGIN")
+                try:
+                    cur.execute("SET LOCAL plan_cache_mode = force_generic_plan")
+                    cur.execute(f"PREPARE t1_generic_plan AS {query}")
+                    cur.execute(f"EXPLAIN (FORMAT JSON) EXECUTE t1_generic_plan({', '.join(['NULL'] * params)})")
+                    return self._load_plan(cur.fetchone()[0])
+                finally:
+                    cur.execute(f"ROLLBACK TO SAVEPOINT {EXPLAIN_SAVEPOINT}" if savepoint else "ROLLBACK")
+                    cur.execute("DEALLOCATE ALL")
+            except psycopg2.Error as e:
+                raise Exception(f"Не удалось получить обобщённый план выполнения: {e}")
+
+    def run_explain_analyze(self, conn, query: str, read_only: bool = False) -> Dict[str, Any]:
+        import psycopg2
+
+        ensure_single_statement(query)
+        with conn.cursor() as cur:
+            cur.execute("BEGIN READ ONLY" if read_only else "BEGIN")
+            try:
+                cur.execute("SET LOCAL statement_timeout = %s", (self.statement_timeout_ms,))
+                cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, VERBOSE, FORMAT JSON) {query}")
+                return self._load_plan(cur.fetchone()[0])
+            except psycopg2.Error as e:
+                raise Exception(f"Не удалось выполнить EXPLAIN ANALYZE: {e}")
+            finally:
+                cur.execute("ROLLBACK")
+
+    def build_plan_tree(self, plan: Dict[str, Any]) -> PlanTree:
+        return PlanTree.from_explain(plan)
+
+    def extract_metrics(self, plan: Dict[str, Any], tree: Optional[PlanTree] = None,
+                        node_actuals: Optional[List[NodeActualRecord]] = None) -> MetricRecord:
+        tree = tree or self.build_plan_tree(plan)
+        if node_actuals is None:
+            node_actuals = self.extract_node_actuals(tree)
+        total_plan = tree.root
+        gathers = tree.nodes_of_type('Gather', 'Gather Merge')
+
+        metrics = MetricRecord(
             total_cost=total_plan['Total Cost'],
-            planning_time=total_plan.get('Planning Time'),
-            max_execution_time=self.estimate_execution_time(total_plan['Total Cost']),
+            planning_time=plan[0].get('Planning Time', total_plan.get('Planning Time')),
+            max_execution_time=self.estimate_execution_time(total_plan['Total Cost'], tree),
             shared_hit_blocks=total_plan.get('Shared Hit Blocks', 0),
             shared_read_blocks=total_plan.get('Shared Read Blocks', 0),
             plan_width=total_plan['Plan Width'],
             total_rows=total_plan['Plan Rows'],
-            node_types=self.extract_node_types(total_plan),
+            node_types=tree.node_types(),
             startup_cost=total_plan.get('Startup Cost', 0),
-            total_workers=total_plan.get('Workers', 0),
-            parallel_workers=total_plan.get('Workers Launched', 0)
+            total_workers=sum(node.get('Workers Planned', 0) for node in gathers),
+            parallel_workers=sum(node.get('Workers Launched', node.get('Workers Planned', 0)) for node in gathers),
+            execution_time=plan[0].get('Execution Time'),
+            actual_rows=int(total_plan['Actual Rows']) if 'Actual Rows' in total_plan else None,
+            misestimated_nodes=sum(1 for node in node_actuals if self.is_misestimated(node))
         )
 
         return metrics
 
-    def extract_node_types(self, plan_node: Dict[str, Any]) -> List[str]:
-        node_types = []
-
-        def _extract_nodes(node):
-            if 'Node Type' in node:
-                node_types.append(node['Node Type'])
-            if 'Plans' in node:
-                for child in node['Plans']:
-                    _extract_nodes(child)
-
-        _extract_nodes(plan_node)
-        return list(set(node_types))
+    def extract_node_actuals(self, tree: PlanTree) -> List[NodeActualRecord]:
+        if 'Actual Loops' not in tree.root:
+            return []
+
+        times = [time or 0.0 for time in node_actual_times(tree)]
+        total_time = sum(times) or 1.0
+        actuals = []
+        for index, node in enumerate(tree.nodes):
+            loops = node.get('Actual Loops', 0)
+            if not loops:
+                continue
+            estimated = node.get('Plan Rows', 0)
+            actual = node.get('Actual Rows', 0)
+            actuals.append(NodeActualRecord(
+                node_type=node.get('Node Type', 'unknown'),
+                relation=node.get('Relation Name'),
+                depth=tree.depths[index],
+                estimated_rows=estimated,
+                actual_rows=actual,
+                loops=loops,
+                row_error=max(estimated, actual, 1) / max(min(estimated, actual), 1),
+                exclusive_time=times[index],
+                time_share=times[index] / total_time,
+                shared_hit_blocks=node.get('Shared Hit Blocks', 0),
+                shared_read_blocks=node.get('Shared Read Blocks', 0)
+            ))
+        return actuals
+
+    def extract_node_costs(self, tree: PlanTree, limit: Optional[int] = HOT_NODES_LIMIT) -> List[NodeCostRecord]:
+        total_cost = tree.root.get('Total Cost', 0.0) or 1.0
+        costs = tree.exclusive_values('Total Cost')
+        times = None
+        if 'Actual Loops' in tree.root:
+            times = [time or 0.0 for time in node_actual_times(tree)]
+            total_time = sum(times) or 1.0
+
+        ranking = times or costs
+        indexes = sorted(range(len(tree)), key=ranking.__getitem__, reverse=True)[:limit]
+        hits = tree.exclusive_values('Shared Hit Blocks')
+        reads = tree.exclusive_values('Shared Read Blocks')
+        hot_nodes = []
+        for index in indexes:
+            node = tree.nodes[index]
+            hot_nodes.append(NodeCostRecord(
+                node_index=index,
+                node_type=node.get('Node Type', 'unknown'),
+                relation=node.get('Relation Name'),
+                index_name=node.get('Index Name'),
+                depth=tree.depths[index],
+                total_cost=node.get('Total Cost', 0.0),
+                exclusive_cost=costs[index],
+                cost_share=costs[index] / total_cost,
+                plan_rows=node.get('Plan Rows', 0),
+                exclusive_time=times[index] if times else None,
+                time_share=times[index] / total_time if times else None,
+                shared_hit_blocks=hits[index],
+                shared_read_blocks=reads[index]
+            ))
+        return hot_nodes
+
+    @staticmethod
+    def node_share(node: NodeCostRecord) -> float:
+        return node.time_share if node.time_share is not None else node.cost_share
+
+    @staticmethod
+    def is_misestimated(node: NodeActualRecord) -> bool:
+        return (node.row_error >= ROW_ERROR_THRESHOLD and
+                max(node.estimated_rows, node.actual_rows) >= ROW_ERROR_MIN_ROWS)
 
-    def analyze_plan_structure(self, plan: Dict[str, Any]) -> None:
-        total_plan = plan[0]['Plan']
-
-        def build_tree(node, parent_tree=None):
-            if 'Plans' in node:
-                for child in node['Plans']:
-                    build_tree(child, parent_tree)
+    def extract_node_types(self, plan_node: Dict[str, Any]) -> List[str]:
+        return PlanTree(plan_node).node_types()
 
-        build_tree(total_plan)
+    def analyze_plan_structure(self, plan: Dict[str, Any], tree: Optional[PlanTree] = None) -> None:
+        tree = tree or self.build_plan_tree(plan)
+        self.logger.debug(
+            "План: %d узлов, глубина %d, отношения: %s",
+            len(tree), tree.max_depth, ', '.join(tree.relations()) or '-'
+        )
+        for node, depth in zip(tree.nodes, tree.depths):
+            self.logger.debug(
+                "%s%s %s (cost=%s rows=%s)", '  ' * depth, node.get('Node Type'),
+                node.get('Relation Name', ''), node.get('Total Cost'), node.get('Plan Rows')
+            )
 
-    def estimate_execution_time(self, total_cost: float) -> float:
-        return total_cost * 0.01
+    def estimate_execution_time(self, total_cost: float, tree: Optional[PlanTree] = None) -> float:
+        if self.time_model is not None and tree is not None:
+            return self.time_model.predict(tree)
+        return total_cost * DEFAULT_COST_FACTOR
 
-    def extract_indexes_used(self, plan: Dict[str, Any]) -> List[str]:
+    def extract_indexes_used(self, plan: Dict[str, Any], tree: Optional[PlanTree] = None) -> List[str]:
+        tree = tree or self.build_plan_tree(plan)
         indexes = []
 
-        def _find_indexes(node):
-            if node.get('Node Type') == 'Index Scan':
-                index_name = node.get('Index Name', 'unknown')
-                relation_name = node.get('Relation Name', 'unknown')
-                indexes.append(f"{relation_name}({index_name})")
-
-            if 'Plans' in node:
-                for child in node['Plans']:
-                    _find_indexes(child)
+        for node in tree.nodes_of_type('Index Scan'):
+            index_name = node.get('Index Name', 'unknown')
+            relation_name = node.get('Relation Name', 'unknown')
+            indexes.append(f"{relation_name}({index_name})")
 
-        _find_indexes(plan[0]['Plan'])
         return indexes
 
-    def generate_warnings(self, plan: Dict[str, Any], query: str) -> List[str]:
-        warnings = []
-        total_plan = plan[0]['Plan']
-
-        joins = find_plan_nodes(total_plan, 'Nested Loop')
-        if len(joins) > 2:
-            warnings.append("Возможное Cartesian product в JOIN операциях")
-
-        if ('SELECT' in query.upper() and 'LIMIT' not in query.upper() and
-                total_plan['Plan Rows'] > 10000):
-            warnings.append("Большая выборка без LIMIT - риск высокой нагрузки")
-
-        return warnings
-
-    def generate_t1_recommendations(self, plan: Dict[str, Any], query: str) -> List[Recommendation]:
-        recommendations = []
-        total_plan = plan[0]['Plan']
-
-        seq_scans = find_plan_nodes(total_plan, 'Seq Scan')
-        for scan in seq_scans:
-            if scan['Plan Rows'] > 10000 and 'Filter' in scan:
-                table_name = scan.get('Relation Name', 'unknown')
-                rec = Recommendation(
+    def run_rules(self, plan: Dict[str, Any], query: str, tree: Optional[PlanTree] = None,
+                  query_info: Optional[Dict[str, Any]] = None,
+                  node_actuals: Optional[List[NodeActualRecord]] = None,
+                  node_costs: Optional[List[NodeCostRecord]] = None) -> RuleContext:
+        tree = tree or self.build_plan_tree(plan)
+        query_info = query_info or extract_query_info(query)
+        if node_actuals is None:
+            node_actuals = self.extract_node_actuals(tree)
+        if node_costs is None:
+            node_costs = self.extract_node_costs(tree)
+        context = RuleContext(self, plan, query, tree, query_info, node_actuals, node_costs)
+        return self.rules.run(context)
+
+    def generate_warnings(self, plan: Dict[str, Any], query: str, tree: Optional[PlanTree] = None,
+                          query_info: Optional[Dict[str, Any]] = None,
+                          node_actuals: Optional[List[NodeActualRecord]] = None) -> List[str]:
+        return self.run_rules(plan, query, tree, query_info, node_actuals).warnings
+
+    def generate_t1_recommendations(self, plan: Dict[str, Any], query: str,
+                                    tree: Optional[PlanTree] = None,
+                                    node_actuals: Optional[List[NodeActualRecord]] = None,
+                                    node_costs: Optional[List[NodeCostRecord]] = None) -> List[RecommendationRecord]:
+        return self.run_rules(plan, query, tree, None, node_actuals, node_costs).recommendations
+
+    def _catalog_relation(self, node: Dict[str, Any]) -> Optional["RelationInfo"]:
+        if self.catalog is None or not self.catalog.loaded or not node.get('Relation Name'):
+            return None
+        return self.catalog.relation(node['Relation Name'], node.get('Schema'))
+
+    def scan_filter_columns(self, scan: Dict[str, Any],
+                            relation: Optional["RelationInfo"] = None) -> Tuple[List[str], List[str]]:
+        equality, ranges = scan_predicates(scan)
+        if relation is None:
+            return equality, ranges[:1]
+
+        known = set(relation.columns)
+        equality = [column for column in equality if column in known]
+        ranges = [column for column in ranges if column in known]
+        if not equality and not ranges:
+            words = re.findall(r'\w+', scan.get('Filter', ''))
+            return [], [column for column in dict.fromkeys(words) if column in known][:1]
+        equality.sort(key=lambda column: -(self.catalog.distinct_values(relation, column) or 0.0))
+        return equality, ranges[:1]
+
+    def index_recommendation(self, scan: Dict[str, Any]) -> RecommendationRecord:
+        table_name = scan.get('Relation Name', 'unknown')
+        relation = self._catalog_relation(scan)
+        equality, ranges = self.scan_filter_columns(scan, relation)
+        columns = equality + ranges
+        column_list = ', '.join(columns) or extract_filter_columns(scan)
+        size = f"{scan['Plan Rows']:,} строк"
+        if relation is not None:
+            size = f"{scan['Plan Rows']:,} из {relation.tuples:,.0f} строк, {relation.size_bytes / 1024 / 1024:,.1f} МБ"
+
+            selectivity = self.catalog.selectivity(relation, equality)
+            if selectivity is not None and selectivity > LOW_SELECTIVITY:
+                return RecommendationRecord(
                     type="missing_index",
-                    description=f"Полное сканирование большой таблицы {table_name} ({scan['Plan Rows']:,} строк)",
-                    priority=Priority.HIGH,
-                    estimated_improvement="Ускорение на 80-95%",
-                    suggested_action=f"Создать индекс на {table_name}({extract_filter_columns(scan)})",
+                    description=(f"Полное сканирование таблицы {table_name} ({size}); условие по {column_list} "
+                                 f"малоселективно (~{selectivity:.0%} строк)"),
+                    priority=Priority.LOW,
+                    estimated_improvement="Индекс по малоселективному условию вряд ли ускорит запрос",
+                    suggested_action=(f"Добавить в условие более селективные столбцы или рассмотреть частичный "
+                                      f"индекс на {table_name}"),
                     affected_components=[table_name],
                     t1_service=T1CloudService.POSTGRESQL,
-                    impact_score=9
+                    impact_score=3
                 )
-                recommendations.append(rec)
-
-        sort_nodes = find_plan_nodes(total_plan, 'Sort')
-        for sort_node in sort_nodes:
-            if sort_node.get('Sort Method') == 'external':
-                rec = Recommendation(
-                    type="disk_sort",
-                    description="Сортировка выполняется на диске (медленно)",
+
+            existing = self.catalog.find_index(relation, columns) if columns else None
+            if existing is not None:
+                return RecommendationRecord(
+                    type="unused_index",
+                    description=(f"Полное сканирование {table_name} ({size}) при существующем индексе "
+                                 f"{existing.name}({', '.join(c or '<выражение>' for c in existing.columns)})"),
                     priority=Priority.MEDIUM,
-                    estimated_improvement="Ускорение на 50-70%",
-                    suggested_action="Увеличить work_mem или оптимизировать ORDER BY",
-                    affected_components=["PostgreSQL Configuration"],
+                    estimated_improvement="Ускорение на 50-90% при использовании существующего индекса",
+                    suggested_action=(f"Обновить статистику (ANALYZE {table_name}) и проверить, что условие "
+                                      f"по {column_list} совпадает с индексом {existing.name} по типам и выражениям"),
+                    affected_components=[table_name, existing.name],
                     t1_service=T1CloudService.POSTGRESQL,
                     impact_score=6
                 )
-                recommendations.append(rec)
-
-        nested_loops = find_plan_nodes(total_plan, 'Nested Loop')
-        for loop in nested_loops:
-            if loop['Plan Rows'] > 1000:
-                rec = Recommendation(
-                    type="inefficient_join",
-                    description="Неэффективное вложенное соединение для большого набора данных",
-                    priority=Priority.MEDIUM,
-                    estimated_improvement="Ускорение на 30-60%",
-                    suggested_action="Рассмотреть Hash Join или Merge Join, добавить индексы",
-                    affected_components=["Join Operations"],
-                    t1_service=T1CloudService.POSTGRESQL,
-                    impact_score=7
-                )
-                recommendations.append(rec)
 
-        return recommendations
+        return RecommendationRecord(
+            type="missing_index",
+            description=f"Полное сканирование большой таблицы {table_name} ({size})",
+            priority=Priority.HIGH,
+            estimated_improvement="Ускорение на 80-95%",
+            suggested_action=f"Создать индекс на {table_name}({column_list})",
+            affected_components=[table_name],
+            t1_service=T1CloudService.POSTGRESQL,
+            impact_score=9
+        )
 
-    def calculate_score(self, metrics: QueryMetric, recommendations: List[Recommendation]) -> int:
+    def calculate_score(self, metrics: MetricRecord, recommendations: List[RecommendationRecord]) -> int:
         base_score = 100
 
         if metrics.total_cost > 10000:
@@ -222,28 +569,66 @@ class T1PgQueryAnalyzer:
 
         return max(0, min(100, base_score))
 
-    def analyze_query(self, query: str) -> AnalysisReport:
-        query_info = extract_query_info(query)
-
-        plan = self.get_explain_plan(query)
+    def analyze_query(self, query: str, validate: bool = True) -> Union[AnalysisReport, ReportRecord]:
+        with self.stage('analyze_query'):
+            query_info = extract_query_info(query)
+            plan = self.get_explain_plan(query, query_info)
+            return self.analyze_plan(plan, query, query_info, validate)
+
+    def analyze_plan(self, plan: Any, query: str = "", query_info: Optional[Dict[str, Any]] = None,
+                     validate: bool = True) -> Union[AnalysisReport, ReportRecord]:
+        report = self.build_report(plan, query, query_info)
+        if not validate:
+            return report
+        with self.stage('validate'):
+            return to_report(report)
+
+    def build_report(self, plan: Any, query: str = "",
+                     query_info: Optional[Dict[str, Any]] = None) -> ReportRecord:
+        query_info = query_info or extract_query_info(query)
+        with self.stage('plan_tree'):
+            tree = self.build_plan_tree(plan)
 
         if self.verbose:
-            self.analyze_plan_structure(plan)
-
-        metrics = self.extract_metrics(plan)
-        recommendations = self.generate_t1_recommendations(plan, query)
+            self.analyze_plan_structure(plan, tree)
+
+        with self.stage('metrics'):
+            node_actuals = self.extract_node_actuals(tree)
+            node_costs = self.extract_node_costs(tree)
+            metrics = self.extract_metrics(plan, tree, node_actuals)
+        with self.stage('rules'):
+            context = self.run_rules(plan, query, tree, query_info, node_actuals, node_costs)
+        recommendations = context.recommendations
+        warnings = context.warnings
+
+        outline = tree.outline()
+        plan_hash = structural_hash(outline)
+        plan_change = None
+        if self.plan_history is not None and query:
+            with self.stage('history'):
+                plan_change = self.plan_history.record(query_info['fingerprint'], self.t1_environment, outline,
+                                                       metrics.total_cost, plan_hash)
+        if plan_change is not None:
+            delta = f" ({plan_change.cost_delta_pct:+.0f}%)" if plan_change.cost_delta_pct is not None else ""
+            warnings.append(
+                f"План запроса изменился ({plan_change.previous_hash} -> {plan_hash}): "
+                f"стоимость {plan_change.previous_cost:.2f} -> {metrics.total_cost:.2f}{delta}"
+            )
 
-        report = AnalysisReport(
+        return ReportRecord(
             query=query,
             metrics=metrics,
             recommendations=recommendations,
             is_critical=any(r.priority == Priority.HIGH for r in recommendations),
             score=self.calculate_score(metrics, recommendations),
+            analyzed_at=datetime.now(),
             t1_environment=self.t1_environment,
             query_type=query_info['type'],
-            tables_affected=query_info['tables'],
-            indexes_used=self.extract_indexes_used(plan),
-            warnings=self.generate_warnings(plan, query)
+            tables_affected=query_info['tables'] or tree.relations(),
+            indexes_used=self.extract_indexes_used(plan, tree),
+            warnings=warnings,
+            node_actuals=node_actuals,
+            hot_nodes=node_costs,
+            plan_hash=plan_hash,
+            plan_change=plan_change
         )
-
-        return report
\ No newline at end of file
@@ -0,0 +1,46 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, NamedTuple, Optional, Tuple, Union
+from .analyzer import T1PgQueryAnalyzer
+from .models import AnalysisReport, ReportRecord
+
+if TYPE_CHECKING:
+    from .profiling import ThreadProfiler
+
+
+class BatchResult(NamedTuple):
+    index: int
+    query: str
+    report: Optional[Union[AnalysisReport, ReportRecord]]
+    error: Optional[Exception]
+
+
+def analyze_batch(
+        analyzer: T1PgQueryAnalyzer,
+        statements: Iterable[str],
+        concurrency: int = 4,
+        max_pending: Optional[int] = None,
+        validate: bool = True,
+        profiler: Optional["ThreadProfiler"] = None
+) -> Iterator[BatchResult]:
+    if concurrency < 1:
+        raise ValueError("Параллельность должна быть не меньше 1")
+    max_pending = max_pending or concurrency * 2
+    analyze_query = profiler.wrap(analyzer.analyze_query) if profiler is not None else analyzer.analyze_query
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="t1-explain") as executor:
+        pending: Dict[Future, Tuple[int, str]] = {}
+
+        def drain(return_when):
+            done, _ = wait(pending, return_when=return_when)
+            for future in done:
+                index, query = pending.pop(future)
+                error = future.exception()
+                yield BatchResult(index, query, None if error else future.result(), error)
+
+        for index, query in enumerate(statements):
+            if len(pending) >= max_pending:
+                yield from drain(FIRST_COMPLETED)
+            pending[executor.submit(analyze_query, query, validate)] = (index, query)
+
+        while pending:
+            yield from drain(FIRST_COMPLETED)
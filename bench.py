@@ -0,0 +1,499 @@
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from .lexer import scan_query
+
+
+def legacy_extract_query_info(query: str) -> Dict[str, Any]:
+    query_upper = query.upper()
+
+    info = {
+        'type': 'UNKNOWN',
+        'tables': [],
+        'operations': []
+    }
+
+    for query_type in ('SELECT', 'INSERT', 'UPDATE', 'DELETE'):
+        if query_upper.startswith(query_type):
+            info['type'] = query_type
+
+    table_matches = re.findall(r'\b(FROM|JOIN|INTO|UPDATE)\s+(\w+)', query_upper)
+    info['tables'] = list(set([match[1] for match in table_matches]))
+
+    for keyword, operation in (('WHERE', 'FILTER'), ('ORDER BY', 'SORT'), ('GROUP BY', 'AGGREGATE'), ('JOIN', 'JOIN')):
+        if keyword in query_upper:
+            info['operations'].append(operation)
+    return info
+
+
+def generate_large_query(shape: str, count: int) -> str:
+    if shape == 'inlist':
+        return "SELECT * FROM orders WHERE id IN (" + ",".join(str(i) for i in range(count)) + ")"
+    if shape == 'values':
+        return "INSERT INTO items (a, b, c) VALUES " + ",".join(f"({i}, 'v{i}', {i}.5)" for i in range(count))
+    if shape == 'union':
+        return " UNION ALL ".join(
+            f"SELECT a{i}, b FROM tab{i % 50} t JOIN other o ON o.id = t.id WHERE t.c = {i} AND t.s = 'x{i}'"
+            for i in range(count)
+        )
+    if shape == 'or':
+        return "SELECT * FROM events e WHERE " + " OR ".join(
+            f"(e.tenant_id = {i} AND e.kind = 'k{i % 7}' AND e.ts >= '2024-01-{i % 28 + 1:02d}')"
+            for i in range(count)
+        )
+    if shape == 'case':
+        return ("UPDATE accounts SET tier = CASE id " + " ".join(f"WHEN {i} THEN 'tier_{i % 5}'" for i in range(count)) +
+                " END WHERE id IN (" + ",".join(str(i) for i in range(count)) + ")")
+    raise ValueError(f"Неизвестная форма запроса: {shape}")
+
+
+LEXER_SHAPES = {
+    'inlist': 500000,
+    'values': 120000,
+    'union': 30000,
+    'or': 40000,
+    'case': 120000,
+}
+
+
+def best_of(func: Callable[[], Any], repeat: int = 7) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def bench_lexer(shapes: Iterable[str] = LEXER_SHAPES, repeat: int = 7) -> List[Dict[str, Any]]:
+    rows = []
+    for shape in shapes:
+        query = generate_large_query(shape, LEXER_SHAPES[shape])
+        rows.append({
+            'shape': shape,
+            'size_kib': len(query) // 1024,
+            'lexer_ms': best_of(lambda: scan_query(query), repeat) * 1000,
+            'legacy_ms': best_of(lambda: legacy_extract_query_info(query), repeat) * 1000,
+        })
+    return rows
+
+
+STARTUP_COMMAND = ("analyze", "--output", "json", "--pdf", "none", "--query", "SELECT 1",
+                   "postgresql://127.0.0.1:1/postgres?connect_timeout=1")
+STARTUP_BUDGET_MS = 400.0
+STARTUP_FORBIDDEN_MODULES = ("weasyprint", "rich", "concurrent.futures.process", "multiprocessing")
+
+
+def measure_startup(command: Iterable[str] = STARTUP_COMMAND) -> Tuple[float, Dict[str, float]]:
+    package = __package__ or "package"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", f"{package}.main", *command],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+
+    total = 0.0
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue
+        cumulative_ms = int(cumulative) / 1000
+        modules[name.strip()] = cumulative_ms
+        if not name[1:].startswith(" "):
+            total += cumulative_ms
+    return total, modules
+
+
+def check_startup(budget_ms: float = STARTUP_BUDGET_MS, repeat: int = 3) -> bool:
+    runs = [measure_startup() for _ in range(repeat)]
+    total, modules = min(runs, key=lambda run: run[0])
+    forbidden = [name for name in STARTUP_FORBIDDEN_MODULES if name in modules]
+
+    print(f"Импорт при запуске `{' '.join(STARTUP_COMMAND[:3])}`: {total:.1f} мс (бюджет {budget_ms:.0f} мс)")
+    for name, cumulative_ms in sorted(modules.items(), key=lambda item: -item[1])[:10]:
+        print(f"  {cumulative_ms:8.1f} мс  {name}")
+    if forbidden:
+        print(f"Загружены тяжелые модули, которые должны импортироваться лениво: {', '.join(forbidden)}")
+    return total <= budget_ms and not forbidden
+
+
+STAGE_CASES = (
+    ("deep_join", 50),
+    ("deep_join", 200),
+    ("partitions", 1000),
+    ("partitions", 5000),
+    ("sorts", 100),
+    ("sorts", 300),
+    ("mixed", 100),
+    ("mixed", 500),
+)
+CORPUS_SIZE = 2000
+NOISE_FLOOR_MS = 0.02
+
+
+def measure(func: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {'best_ms': min(timings), 'median_ms': statistics.median(timings)}
+
+
+def bench_stages(cases: Iterable[Tuple[str, int]] = STAGE_CASES, repeat: int = 5, seed: int = 42) -> List[Dict[str, Any]]:
+    from .analyzer import T1PgQueryAnalyzer
+    from .demo import generate_query_corpus, generate_random_plan
+    from .ndjson import encode_report
+    from .renderers import RENDERERS
+    from .utils import extract_query_info
+
+    analyzer = T1PgQueryAnalyzer()
+    rows = []
+
+    corpus = generate_query_corpus(CORPUS_SIZE, seed)
+    rows.append({
+        'case': f"corpus-{CORPUS_SIZE}",
+        'stage': 'query_scan',
+        'nodes': 0,
+        **measure(lambda: [scan_query(query) for query in corpus], repeat),
+    })
+
+    for shape, size in cases:
+        plan_text = json.dumps(generate_random_plan(shape, size, seed))
+        query = corpus[size % len(corpus)]
+        plan = json.loads(plan_text)
+        tree = analyzer.build_plan_tree(plan)
+        query_info = extract_query_info(query)
+        metrics = analyzer.extract_metrics(plan, tree)
+        recommendations = analyzer.generate_t1_recommendations(plan, query, tree)
+        report = analyzer.analyze_plan(plan, query, query_info)
+
+        stages = {
+            'parse': lambda: analyzer.build_plan_tree(json.loads(plan_text)),
+            'metrics': lambda: analyzer.extract_metrics(plan, tree),
+            'rules': lambda: analyzer.run_rules(plan, query, tree, query_info),
+            'scoring': lambda: analyzer.calculate_score(metrics, recommendations),
+            'analyze_plan': lambda: analyzer.analyze_plan(json.loads(plan_text), query, query_info),
+        }
+        for name, renderer in RENDERERS.items():
+            stages[f'render_{name}'] = lambda renderer=renderer: renderer(report)
+        record = analyzer.build_report(plan, query, query_info)
+        stages['render_ndjson'] = lambda: encode_report(record)
+
+        for stage, func in stages.items():
+            rows.append({'case': f"{shape}-{size}", 'stage': stage, 'nodes': len(tree), **measure(func, repeat)})
+    return rows
+
+
+MODEL_REPORTS = 100000
+
+
+def bench_models(count: int = MODEL_REPORTS, seed: int = 42) -> List[Dict[str, Any]]:
+    import tracemalloc
+    from .analyzer import T1PgQueryAnalyzer
+    from .demo import generate_query_corpus, generate_random_plan
+    from .models import (AnalysisReport, MetricRecord, NodeCost, NodeCostRecord, QueryMetric, Recommendation,
+                         RecommendationRecord, ReportRecord, to_report)
+
+    query = generate_query_corpus(1, seed)[0]
+    sample = T1PgQueryAnalyzer().build_report(generate_random_plan('mixed', 12, seed), query)
+    metrics = sample.metrics._asdict()
+    recommendations = [rec._asdict() for rec in sample.recommendations]
+    hot_nodes = [node._asdict() for node in sample.hot_nodes]
+    report = {name: value for name, value in sample._asdict().items()
+              if name not in ('metrics', 'recommendations', 'hot_nodes')}
+
+    def build(report_cls, metric_cls, recommendation_cls, node_cls) -> Any:
+        return report_cls(**report,
+                          metrics=metric_cls(**metrics),
+                          recommendations=[recommendation_cls(**rec) for rec in recommendations],
+                          hot_nodes=[node_cls(**node) for node in hot_nodes])
+
+    paths = {
+        'pydantic': lambda: build(AnalysisReport, QueryMetric, Recommendation, NodeCost),
+        'records': lambda: build(ReportRecord, MetricRecord, RecommendationRecord, NodeCostRecord),
+        'records+to_report': lambda: to_report(build(ReportRecord, MetricRecord, RecommendationRecord, NodeCostRecord)),
+    }
+    rows = []
+    for path, make in paths.items():
+        started = time.perf_counter()
+        for _ in range(count):
+            make()
+        elapsed = time.perf_counter() - started
+
+        tracemalloc.start()
+        retained = [make() for _ in range(count)]
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del retained
+        rows.append({
+            'path': path,
+            'reports': count,
+            'recommendations': len(recommendations),
+            'hot_nodes': len(hot_nodes),
+            'seconds': elapsed,
+            'reports_per_sec': count / elapsed,
+            'memory_mib': memory / 1024 / 1024,
+        })
+    return rows
+
+
+SERVER_REQUESTS = 2000
+SERVER_CLIENTS = (1, 8, 32)
+SERVER_EXPLAIN_MS = 5.0
+SERVER_HOT_QUERIES = 20
+
+
+def bench_server(clients: Iterable[int] = SERVER_CLIENTS, requests: int = SERVER_REQUESTS,
+                 explain_ms: float = SERVER_EXPLAIN_MS, duplicates: float = 0.5, concurrency: int = 4,
+                 dsn: Optional[str] = None, seed: int = 42) -> List[Dict[str, Any]]:
+    import http.client
+    import random
+    import threading
+    from .analyzer import T1PgQueryAnalyzer
+    from .demo import generate_query_corpus, generate_random_plan
+    from .profiling import percentile
+    from .server import AnalysisService, make_server
+
+    analyzer = T1PgQueryAnalyzer(dsn)
+    if dsn:
+        analyzer.open_pool(concurrency)
+    else:
+        plan = generate_random_plan('mixed', 60, seed)
+
+        def explain(query: str, query_info: Optional[Dict[str, Any]] = None) -> Any:
+            time.sleep(explain_ms / 1000)
+            return plan
+
+        analyzer.get_explain_plan = explain
+
+    rng = random.Random(seed)
+    corpus = generate_query_corpus(requests + SERVER_HOT_QUERIES, seed)
+    rows = []
+    try:
+        for count in clients:
+            service = AnalysisService(analyzer, concurrency)
+            server = make_server(service, '127.0.0.1', 0)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            unique = iter(corpus[SERVER_HOT_QUERIES:])
+            bodies = [
+                json.dumps({'query': rng.choice(corpus[:SERVER_HOT_QUERIES]) if rng.random() < duplicates else next(unique)})
+                for _ in range(requests)
+            ]
+            latencies: List[float] = []
+            failures = [0]
+            lock = threading.Lock()
+
+            def client(part: List[str]):
+                connection = http.client.HTTPConnection('127.0.0.1', server.server_port)
+                for body in part:
+                    started = time.perf_counter()
+                    connection.request('POST', '/analyze', body, {'Content-Type': 'application/json'})
+                    response = connection.getresponse()
+                    response.read()
+                    with lock:
+                        latencies.append((time.perf_counter() - started) * 1000)
+                        failures[0] += response.status != 200
+                connection.close()
+
+            threads = [threading.Thread(target=client, args=(bodies[i::count],)) for i in range(count)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            server.shutdown()
+            server.server_close()
+
+            rows.append({
+                'clients': count,
+                'requests': requests,
+                'seconds': elapsed,
+                'requests_per_sec': requests / elapsed,
+                'p50_ms': percentile(latencies, 0.5),
+                'p95_ms': percentile(latencies, 0.95),
+                'p99_ms': percentile(latencies, 0.99),
+                'coalesced': service.coalesced,
+                'errors': failures[0],
+            })
+    finally:
+        analyzer.close()
+    return rows
+
+
+GUARD_CALLS = 200000
+GUARD_STATEMENTS = 200
+
+
+def bench_guard(calls: int = GUARD_CALLS, statements: int = GUARD_STATEMENTS, seed: int = 42) -> List[Dict[str, Any]]:
+    from .analyzer import T1PgQueryAnalyzer
+    from .demo import generate_query_corpus, generate_random_plan
+    from .guard import QueryGuard
+    from .profiling import percentile
+
+    analyzer = T1PgQueryAnalyzer()
+    plan = generate_random_plan('mixed', 30, seed)
+    analyzer.get_explain_plan = lambda query, query_info=None: plan
+    guard = QueryGuard(analyzer, max_cost=float('inf'), block_critical=False, cache_size=statements * 4)
+    corpus = generate_query_corpus(statements, seed)
+
+    def timed(queries: List[str]) -> List[float]:
+        timings = []
+        check = guard.check
+        clock = time.perf_counter_ns
+        for query in queries:
+            started = clock()
+            check(query)
+            timings.append((clock() - started) / 1000)
+        return timings
+
+    paths = {'miss': timed(corpus)}
+    paths['fingerprint_hit'] = timed([f"/* {i} */ {query}" for i, query in enumerate(corpus)])
+    paths['hit'] = timed([corpus[i % statements] for i in range(calls)])
+    return [
+        {
+            'path': path,
+            'calls': len(timings),
+            'p50_us': percentile(timings, 0.5),
+            'p99_us': percentile(timings, 0.99),
+            'max_us': max(timings),
+        }
+        for path, timings in paths.items()
+    ]
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def save_results(rows: List[Dict[str, Any]], path: str):
+    data = {
+        'meta': {
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+        },
+        'results': rows,
+    }
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def load_results(path: str) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return {(row['case'], row['stage']): row for row in data['results']}
+
+
+def compare_results(baseline_path: str, current_path: str, threshold: float = 10.0) -> bool:
+    baseline = load_results(baseline_path)
+    current = load_results(current_path)
+    regressions = 0
+
+    print(f"{'случай':<18} {'этап':<16} {'было, мс':>10} {'стало, мс':>10} {'изм.':>8}")
+    for key, row in current.items():
+        old = baseline.get(key)
+        if old is None:
+            continue
+        change = (row['best_ms'] - old['best_ms']) / old['best_ms'] * 100 if old['best_ms'] else 0.0
+        marker = ''
+        if change > threshold and row['best_ms'] - old['best_ms'] > NOISE_FLOOR_MS:
+            regressions += 1
+            marker = ' !'
+        print(f"{key[0]:<18} {key[1]:<16} {old['best_ms']:>10.3f} {row['best_ms']:>10.3f} {change:>+7.1f}%{marker}")
+
+    if regressions:
+        print(f"Регрессий больше {threshold:.0f}%: {regressions}")
+    return not regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки T1 PgQueryAnalyzer")
+    subparsers = parser.add_subparsers(dest="suite")
+    subparsers.add_parser("lexer", help="Лексер против прежнего regex-разбора")
+    startup = subparsers.add_parser("startup", help="Бюджет времени импорта CLI")
+    startup.add_argument("--budget", type=float, default=STARTUP_BUDGET_MS, help="Бюджет времени импорта (мс)")
+    stages = subparsers.add_parser("stages", help="Этапы анализа на синтетических планах")
+    stages.add_argument("--repeat", type=int, default=5, help="Количество повторов каждого замера")
+    stages.add_argument("--save", help="Сохранить результаты в JSON для последующего сравнения")
+    models = subparsers.add_parser("models", help="Создание отчетов: модели pydantic против легких записей")
+    models.add_argument("--count", type=int, default=MODEL_REPORTS, help="Количество создаваемых отчетов")
+    server = subparsers.add_parser("server", help="Задержка HTTP-сервера анализа под параллельной нагрузкой")
+    server.add_argument("--clients", default=",".join(map(str, SERVER_CLIENTS)), help="Количество клиентов через запятую")
+    server.add_argument("--requests", type=int, default=SERVER_REQUESTS, help="Количество запросов на прогон")
+    server.add_argument("--explain-ms", type=float, default=SERVER_EXPLAIN_MS, help="Имитируемое время EXPLAIN без --dsn (мс)")
+    server.add_argument("--duplicates", type=float, default=0.5, help="Доля повторяющихся запросов")
+    server.add_argument("--concurrency", type=int, default=4, help="Количество одновременных EXPLAIN")
+    server.add_argument("--dsn", help="Реальный PostgreSQL вместо имитации EXPLAIN")
+    guard = subparsers.add_parser("guard", help="Добавочная задержка проверки запроса перед execute()")
+    guard.add_argument("--calls", type=int, default=GUARD_CALLS, help="Количество проверок с попаданием в кэш")
+    compare = subparsers.add_parser("compare", help="Сравнить два сохраненных результата")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--threshold", type=float, default=10.0, help="Допустимое замедление (%%)")
+    args = parser.parse_args()
+
+    if args.suite == "startup":
+        sys.exit(0 if check_startup(args.budget) else 1)
+
+    if args.suite == "compare":
+        sys.exit(0 if compare_results(args.baseline, args.current, args.threshold) else 1)
+
+    if args.suite == "models":
+        rows = bench_models(args.count)
+        print(f"{'путь':<18} {'отчетов':>8} {'сек':>8} {'отчетов/с':>10} {'память, МиБ':>12}")
+        for row in rows:
+            print(f"{row['path']:<18} {row['reports']:>8} {row['seconds']:>8.2f} "
+                  f"{row['reports_per_sec']:>10.0f} {row['memory_mib']:>12.1f}")
+        return
+
+    if args.suite == "server":
+        rows = bench_server([int(count) for count in args.clients.split(',')], args.requests, args.explain_ms,
+                            args.duplicates, args.concurrency, args.dsn)
+        print(f"{'клиентов':>8} {'запросов/с':>11} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'объединено':>11} {'ошибок':>7}")
+        for row in rows:
+            print(f"{row['clients']:>8} {row['requests_per_sec']:>11.0f} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} "
+                  f"{row['p99_ms']:>9.2f} {row['coalesced']:>11} {row['errors']:>7}")
+        return
+
+    if args.suite == "guard":
+        rows = bench_guard(args.calls)
+        print(f"{'путь':<16} {'вызовов':>8} {'p50, мкс':>9} {'p99, мкс':>9} {'макс, мкс':>10}")
+        for row in rows:
+            print(f"{row['path']:<16} {row['calls']:>8} {row['p50_us']:>9.2f} {row['p99_us']:>9.2f} {row['max_us']:>10.1f}")
+        return
+
+    if args.suite == "stages":
+        rows = bench_stages(repeat=args.repeat)
+        print(f"{'случай':<18} {'этап':<16} {'узлов':>6} {'лучшее, мс':>11} {'медиана, мс':>12}")
+        for row in rows:
+            print(f"{row['case']:<18} {row['stage']:<16} {row['nodes']:>6} {row['best_ms']:>11.3f} {row['median_ms']:>12.3f}")
+        if args.save:
+            save_results(rows, args.save)
+        return
+
+    print(f"{'форма':<8} {'размер, КиБ':>12} {'лексер, мс':>12} {'regex, мс':>12}")
+    for row in bench_lexer():
+        print(f"{row['shape']:<8} {row['size_kib']:>12} {row['lexer_ms']:>12.1f} {row['legacy_ms']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, NamedTuple, Optional, Set, Tuple
+
+
+CATALOG_STATE_SQL = """
+SELECT r.name, c.oid IS NOT NULL, c.relpages, c.reltuples, c.relfilenode::bigint,
+       c.xmin::text,
+       ARRAY(SELECT i.indexrelid::bigint FROM pg_index i WHERE i.indrelid = c.oid ORDER BY 1)
+FROM unnest(%s::text[]) AS r(name)
+LEFT JOIN pg_class c ON c.oid = to_regclass(r.name)
+"""
+
+
+class _Entry(NamedTuple):
+    value: Any
+    relations: Tuple[str, ...]
+    expires_at: Optional[float]
+
+
+class PlanCache:
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = 300.0,
+                 clock: Callable[[], float] = time.monotonic):
+        if max_size < 1:
+            raise ValueError("Размер кэша планов должен быть не меньше 1")
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: 'OrderedDict[Hashable, _Entry]' = OrderedDict()
+        self._by_relation: Dict[str, Set[Hashable]] = {}
+        self._relation_state: Dict[str, Tuple] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at is not None and entry.expires_at <= self.clock():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def put(self, key: Hashable, value: Any, relations: Iterable[str] = ()):
+        relations = tuple(dict.fromkeys(relations))
+        expires_at = self.clock() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(value, relations, expires_at)
+            for relation in relations:
+                self._by_relation.setdefault(relation, set()).add(key)
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key)
+        for relation in entry.relations:
+            keys = self._by_relation.get(relation)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_relation[relation]
+                    self._relation_state.pop(relation, None)
+
+    def invalidate(self, key: Hashable) -> bool:
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._remove(key)
+            self.invalidations += 1
+            return True
+
+    def invalidate_relations(self, relations: Iterable[str]) -> int:
+        removed = 0
+        with self._lock:
+            for relation in relations:
+                for key in list(self._by_relation.get(relation, ())):
+                    self._remove(key)
+                    removed += 1
+                self._relation_state.pop(relation, None)
+            self.invalidations += removed
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_relation.clear()
+            self._relation_state.clear()
+
+    def tracked_relations(self) -> Tuple[str, ...]:
+        with self._lock:
+            return tuple(self._by_relation)
+
+    def missing_state(self, relations: Iterable[str]) -> Tuple[str, ...]:
+        with self._lock:
+            return tuple(r for r in relations if r in self._by_relation and r not in self._relation_state)
+
+    def check_catalog(self, connection, relations: Optional[Iterable[str]] = None) -> int:
+        relations = list(self.tracked_relations() if relations is None else relations)
+        if not relations:
+            return 0
+
+        with connection.cursor() as cur:
+            cur.execute(CATALOG_STATE_SQL, (relations,))
+            rows = cur.fetchall()
+
+        changed = []
+        with self._lock:
+            for name, exists, *state in rows:
+                current = (exists, *(tuple(v) if isinstance(v, list) else v for v in state))
+                previous = self._relation_state.get(name)
+                if previous is None:
+                    self._relation_state[name] = current
+                elif previous != current:
+                    changed.append(name)
+
+        return self.invalidate_relations(changed) if changed else 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+        }
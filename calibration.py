@@ -0,0 +1,180 @@
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from .plan_tree import PlanTree
+
+
+DEFAULT_MODEL_DIR = os.path.join(os.path.expanduser("~"), ".t1_pgqueryguard", "models")
+FEATURES = ("intercept", "exclusive_total_cost", "total_rows", "total_kbytes")
+MIN_SAMPLES_PER_TYPE = 8
+DEFAULT_COST_FACTOR = 0.01
+GATHER_TYPES = ('Gather', 'Gather Merge')
+
+
+def parallel_processes(tree: PlanTree) -> List[int]:
+    processes = [1] * len(tree)
+    for index, parent in enumerate(tree.parents):
+        if parent < 0:
+            continue
+        if tree.nodes[parent].get('Node Type') in GATHER_TYPES:
+            processes[index] = max(1, tree.nodes[index].get('Actual Loops', 1))
+        else:
+            processes[index] = processes[parent]
+    return processes
+
+
+def node_actual_times(tree: PlanTree) -> List[Optional[float]]:
+    processes = parallel_processes(tree)
+    totals = [node.get('Actual Total Time', 0.0) * node.get('Actual Loops', 1) / n
+              for node, n in zip(tree.nodes, processes)]
+    exclusive = totals[:]
+    for index, parent in enumerate(tree.parents):
+        if parent >= 0:
+            exclusive[parent] -= totals[index]
+    return [max(0.0, time) if 'Actual Total Time' in node else None for node, time in zip(tree.nodes, exclusive)]
+
+
+def node_loops(tree: PlanTree) -> List[float]:
+    processes = parallel_processes(tree)
+    loops = [1.0] * len(tree)
+    for index, node in enumerate(tree.nodes):
+        parent = tree.parents[index]
+        if 'Actual Loops' in node:
+            loops[index] = node['Actual Loops'] / processes[index]
+        elif parent >= 0:
+            loops[index] = loops[parent]
+            relationship = node.get('Parent Relationship')
+            if relationship == 'Inner' and tree.nodes[parent].get('Node Type') == 'Nested Loop':
+                loops[index] *= max(1.0, tree.nodes[tree.children[parent][0]].get('Plan Rows', 1))
+            elif relationship == 'SubPlan':
+                loops[index] *= max(1.0, tree.nodes[parent].get('Plan Rows', 1))
+    return loops
+
+
+def plan_features(tree: PlanTree) -> List[List[float]]:
+    loops = node_loops(tree)
+    costs = [node.get('Total Cost', 0) * n for node, n in zip(tree.nodes, loops)]
+    exclusive = costs[:]
+    for index, parent in enumerate(tree.parents):
+        if parent >= 0:
+            exclusive[parent] -= costs[index]
+
+    features = []
+    for index, node in enumerate(tree.nodes):
+        rows = float(node.get('Plan Rows', 0)) * loops[index]
+        features.append([1.0, max(0.0, exclusive[index]), rows, rows * node.get('Plan Width', 0) / 1024])
+    return features
+
+
+def plan_samples(plan: Any) -> List[Tuple[str, List[float], float]]:
+    tree = PlanTree.from_explain(plan)
+    samples = []
+    for node, features, actual in zip(tree.nodes, plan_features(tree), node_actual_times(tree)):
+        if actual is not None and node.get('Actual Loops', 1) != 0:
+            samples.append((node['Node Type'], features, actual))
+    return samples
+
+
+class ExecutionTimeModel:
+    def __init__(self, coefficients: Dict[str, List[float]], default: List[float],
+                 environment: Optional[str] = None, samples: int = 0,
+                 created_at: Optional[str] = None):
+        self.coefficients = coefficients
+        self.default = default
+        self.environment = environment
+        self.samples = samples
+        self.created_at = created_at
+
+    @classmethod
+    def fit(cls, samples: Iterable[Tuple[str, List[float], float]],
+            environment: Optional[str] = None) -> 'ExecutionTimeModel':
+        import numpy as np
+
+        samples = list(samples)
+        if not samples:
+            raise ValueError("Нет данных EXPLAIN ANALYZE для калибровки")
+
+        node_types, features, actual = zip(*samples)
+        x = np.asarray(features, dtype=np.float64)
+        y = np.asarray(actual, dtype=np.float64)
+        type_names, type_index = np.unique(np.asarray(node_types), return_inverse=True)
+
+        # Масштабирование признаков делает lstsq устойчивым к разнице порядков стоимости и строк.
+        scale = np.abs(x).max(axis=0)
+        scale[scale == 0] = 1.0
+
+        def solve(mask) -> List[float]:
+            solution = np.linalg.lstsq(x[mask] / scale, y[mask], rcond=None)[0] / scale
+            return [float(v) for v in solution]
+
+        coefficients = {}
+        counts = np.bincount(type_index, minlength=len(type_names))
+        for i, name in enumerate(type_names):
+            if counts[i] >= MIN_SAMPLES_PER_TYPE:
+                coefficients[str(name)] = solve(type_index == i)
+
+        return cls(coefficients, solve(np.ones(len(y), dtype=bool)), environment, len(samples),
+                   datetime.now().isoformat(timespec='seconds'))
+
+    def predict_node(self, node_type: str, features: List[float]) -> float:
+        weights = self.coefficients.get(node_type, self.default)
+        return max(0.0, sum(w * f for w, f in zip(weights, features)))
+
+    def predict(self, tree: PlanTree) -> float:
+        return sum(
+            self.predict_node(node.get('Node Type', ''), features)
+            for node, features in zip(tree.nodes, plan_features(tree))
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'environment': self.environment,
+            'created_at': self.created_at,
+            'samples': self.samples,
+            'features': list(FEATURES),
+            'coefficients': self.coefficients,
+            'default': self.default,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ExecutionTimeModel':
+        if not isinstance(data, dict) or data.get('features') != list(FEATURES):
+            raise ValueError("Модель калибровки построена для другого набора признаков")
+        return cls(data['coefficients'], data['default'], data.get('environment'),
+                   data.get('samples', 0), data.get('created_at'))
+
+
+def model_path(environment: Optional[str], model_dir: Optional[str] = None) -> str:
+    return os.path.join(model_dir or DEFAULT_MODEL_DIR, f"{environment or 'default'}.json")
+
+
+def save_model(model: ExecutionTimeModel, model_dir: Optional[str] = None) -> str:
+    path = model_path(model.environment, model_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(model.to_dict(), f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_model(environment: Optional[str], model_dir: Optional[str] = None) -> Optional[ExecutionTimeModel]:
+    path = model_path(environment, model_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return ExecutionTimeModel.from_dict(json.load(f))
+
+
+def collect_samples(analyzer, queries: Iterable[str], repeat: int = 1) -> List[Tuple[str, List[float], float]]:
+    samples = []
+    with analyzer.acquire() as conn:
+        for query in queries:
+            for _ in range(repeat):
+                try:
+                    plan = analyzer.run_explain_analyze(conn, query, read_only=True)
+                except Exception:
+                    break
+                samples.extend(plan_samples(plan))
+    return samples
@@ -0,0 +1,228 @@
+import time
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+
+BLOCK_SIZE = 8192
+
+USER_SCHEMAS = "n.nspname NOT IN ('pg_catalog', 'information_schema') AND n.nspname NOT LIKE 'pg\\_toast%%'"
+
+RELATIONS_SQL = f"""
+SELECT c.oid::bigint, n.nspname, c.relname, c.relkind, c.relpages, c.reltuples,
+       c.relfilenode::bigint, c.xmin::text,
+       pg_stat_get_analyze_count(c.oid) + pg_stat_get_autoanalyze_count(c.oid),
+       ARRAY(SELECT i.indexrelid::text || ':' || i.indisvalid FROM pg_index i WHERE i.indrelid = c.oid ORDER BY 1),
+       ARRAY(SELECT k.oid::bigint FROM pg_constraint k WHERE k.conrelid = c.oid AND k.contype = 'f' ORDER BY 1)
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE c.relkind IN ('r', 'p', 'm', 'f') AND {USER_SCHEMAS}
+"""
+
+COLUMNS_SQL = """
+SELECT a.attrelid::bigint, array_agg(a.attname::text ORDER BY a.attnum)
+FROM pg_attribute a
+WHERE a.attrelid = ANY(%s::oid[]) AND a.attnum > 0 AND NOT a.attisdropped
+GROUP BY a.attrelid
+"""
+
+INDEXES_SQL = """
+SELECT i.indrelid::bigint, c.relname, i.indisunique, i.indisvalid, i.indpred IS NOT NULL,
+       ARRAY(SELECT a.attname::text
+             FROM unnest(i.indkey[0:i.indnkeyatts - 1]) WITH ORDINALITY AS k(attnum, position)
+             LEFT JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+             ORDER BY k.position),
+       pg_get_indexdef(i.indexrelid)
+FROM pg_index i
+JOIN pg_class c ON c.oid = i.indexrelid
+WHERE i.indrelid = ANY(%s::oid[])
+ORDER BY i.indrelid, c.relname
+"""
+
+STATS_SQL = """
+SELECT c.oid::bigint, s.attname::text, s.null_frac, s.n_distinct, s.correlation
+FROM pg_stats s
+JOIN pg_namespace n ON n.nspname = s.schemaname
+JOIN pg_class c ON c.relnamespace = n.oid AND c.relname = s.tablename
+WHERE c.oid = ANY(%s::oid[])
+ORDER BY s.inherited DESC
+"""
+
+FOREIGN_KEYS_SQL = """
+SELECT k.conrelid::bigint, k.conname, k.confrelid::regclass::text,
+       ARRAY(SELECT a.attname::text FROM unnest(k.conkey) WITH ORDINALITY AS u(attnum, position)
+             JOIN pg_attribute a ON a.attrelid = k.conrelid AND a.attnum = u.attnum ORDER BY u.position),
+       ARRAY(SELECT a.attname::text FROM unnest(k.confkey) WITH ORDINALITY AS u(attnum, position)
+             JOIN pg_attribute a ON a.attrelid = k.confrelid AND a.attnum = u.attnum ORDER BY u.position)
+FROM pg_constraint k
+WHERE k.contype = 'f' AND k.conrelid = ANY(%s::oid[])
+"""
+
+
+class RelationInfo(NamedTuple):
+    oid: int
+    schema: str
+    name: str
+    kind: str
+    pages: int
+    tuples: float
+    columns: Tuple[str, ...]
+
+    @property
+    def size_bytes(self) -> int:
+        return self.pages * BLOCK_SIZE
+
+
+class IndexInfo(NamedTuple):
+    name: str
+    columns: Tuple[Optional[str], ...]
+    unique: bool
+    valid: bool
+    partial: bool
+    definition: str
+
+
+class ColumnStats(NamedTuple):
+    null_frac: float
+    n_distinct: float
+    correlation: Optional[float]
+
+
+class ForeignKey(NamedTuple):
+    name: str
+    columns: Tuple[str, ...]
+    referenced: str
+    referenced_columns: Tuple[str, ...]
+
+
+def _leading_keys(index: IndexInfo) -> List[FrozenSet[str]]:
+    keys = []
+    for position, column in enumerate(index.columns):
+        if column is None:
+            break
+        keys.append(frozenset(index.columns[:position + 1]))
+    return keys
+
+
+class CatalogSnapshot:
+    def __init__(self):
+        self.relations: Dict[int, RelationInfo] = {}
+        self.indexes: Dict[int, List[IndexInfo]] = {}
+        self.stats: Dict[Tuple[int, str], ColumnStats] = {}
+        self.foreign_keys: Dict[int, List[ForeignKey]] = {}
+        self._by_name: Dict[Tuple[Optional[str], str], int] = {}
+        self._index_keys: Dict[int, Dict[FrozenSet[str], IndexInfo]] = {}
+        self._signatures: Dict[int, Tuple] = {}
+        self.loaded_at: Optional[float] = None
+        self.refreshes = 0
+        self.reloaded = 0
+
+    def __len__(self) -> int:
+        return len(self.relations)
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def relation(self, name: str, schema: Optional[str] = None) -> Optional[RelationInfo]:
+        oid = self._by_name.get((schema, name))
+        return self.relations.get(oid) if oid is not None else None
+
+    def find_index(self, relation: RelationInfo, columns: Sequence[str]) -> Optional[IndexInfo]:
+        keys = self._index_keys.get(relation.oid)
+        if not keys:
+            return None
+        for size in range(len(columns), 0, -1):
+            index = keys.get(frozenset(columns[:size]))
+            if index is not None:
+                return index
+        return None
+
+    def column_stats(self, relation: RelationInfo, column: str) -> Optional[ColumnStats]:
+        return self.stats.get((relation.oid, column))
+
+    def distinct_values(self, relation: RelationInfo, column: str) -> Optional[float]:
+        stats = self.stats.get((relation.oid, column))
+        if stats is None:
+            return None
+        if stats.n_distinct < 0:
+            return -stats.n_distinct * max(relation.tuples, 1.0)
+        return stats.n_distinct or None
+
+    def selectivity(self, relation: RelationInfo, columns: Iterable[str]) -> Optional[float]:
+        selectivity = None
+        for column in columns:
+            distinct = self.distinct_values(relation, column)
+            if distinct:
+                selectivity = (selectivity if selectivity is not None else 1.0) / distinct
+        return selectivity
+
+    def unindexed_foreign_keys(self, relation: RelationInfo) -> List[ForeignKey]:
+        keys = self._index_keys.get(relation.oid, {})
+        return [fk for fk in self.foreign_keys.get(relation.oid, []) if frozenset(fk.columns) not in keys]
+
+    def _drop(self, oid: int):
+        relation = self.relations.pop(oid, None)
+        self._signatures.pop(oid, None)
+        self.indexes.pop(oid, None)
+        self._index_keys.pop(oid, None)
+        self.foreign_keys.pop(oid, None)
+        if relation is not None:
+            for column in relation.columns:
+                self.stats.pop((oid, column), None)
+            for key in ((relation.schema, relation.name), (None, relation.name)):
+                if self._by_name.get(key) == oid:
+                    del self._by_name[key]
+
+    def refresh(self, connection) -> int:
+        with connection.cursor() as cur:
+            cur.execute(RELATIONS_SQL)
+            rows = cur.fetchall()
+
+            current = {}
+            for oid, schema, name, kind, pages, tuples, *signature in rows:
+                current[oid] = (schema, name, kind, pages, tuples, *(tuple(v) if isinstance(v, list) else v
+                                                                     for v in signature))
+            changed = [oid for oid, signature in current.items() if self._signatures.get(oid) != signature]
+            for oid in set(self._signatures) - set(current):
+                self._drop(oid)
+
+            columns: Dict[int, Tuple[str, ...]] = {}
+            indexes: Dict[int, List[IndexInfo]] = {}
+            stats: List[Tuple] = []
+            foreign_keys: Dict[int, List[ForeignKey]] = {}
+            if changed:
+                cur.execute(COLUMNS_SQL, (changed,))
+                columns = {oid: tuple(names) for oid, names in cur.fetchall()}
+                cur.execute(INDEXES_SQL, (changed,))
+                for oid, name, unique, valid, partial, keys, definition in cur.fetchall():
+                    indexes.setdefault(oid, []).append(IndexInfo(name, tuple(keys), unique, valid, partial, definition))
+                cur.execute(STATS_SQL, (changed,))
+                stats = cur.fetchall()
+                cur.execute(FOREIGN_KEYS_SQL, (changed,))
+                for oid, name, referenced, keys, referenced_keys in cur.fetchall():
+                    foreign_keys.setdefault(oid, []).append(
+                        ForeignKey(name, tuple(keys), referenced, tuple(referenced_keys)))
+
+        for oid in changed:
+            self._drop(oid)
+            schema, name, kind, pages, tuples = current[oid][:5]
+            relation = RelationInfo(oid, schema, name, kind, pages, tuples, columns.get(oid, ()))
+            self.relations[oid] = relation
+            self._signatures[oid] = current[oid]
+            self._by_name[(schema, name)] = oid
+            if (None, name) not in self._by_name or schema == 'public':
+                self._by_name[(None, name)] = oid
+            self.indexes[oid] = indexes.get(oid, [])
+            self._index_keys[oid] = {
+                key: index
+                for index in sorted(self.indexes[oid], key=lambda i: len(i.columns), reverse=True)
+                if index.valid and not index.partial
+                for key in _leading_keys(index)
+            }
+            self.foreign_keys[oid] = foreign_keys.get(oid, [])
+        for oid, column, null_frac, n_distinct, correlation in stats:
+            self.stats[(oid, column)] = ColumnStats(null_frac, n_distinct, correlation)
+
+        self.loaded_at = time.time()
+        self.refreshes += 1
+        self.reloaded += len(changed)
+        return len(changed)
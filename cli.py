@@ -1,18 +1,96 @@
 import typer
-import json as json_lib
-from rich.console import Console
-from .models import T1CloudService, AnalysisReport, Priority
-from .analyzer import T1PgQueryAnalyzer
-from typing import Optional
-from .pdf_report import generate_pdf_report
+from typing import TYPE_CHECKING, List, Optional, TextIO, Union
 import os
+import sys
 from datetime import datetime
 
-console = Console()
+if TYPE_CHECKING:
+    from rich.console import Console
+    from .models import AnalysisReport, ReportRecord
+    from .ndjson import NdjsonWriter
+    from .pdf_report import PdfWriter
+    from .profiling import StageMetrics
+    from .store import ReportStore
 
-def print_detailed_report(report: AnalysisReport, max_cost: float):
+_console: Optional["Console"] = None
+_console_stderr = False
+
+def get_console() -> "Console":
+    global _console
+    if _console is None:
+        from rich.console import Console
+        _console = Console(stderr=_console_stderr)
+    return _console
+
+def console_stream() -> TextIO:
+    return sys.stderr if _console_stderr else sys.stdout
+
+def open_ndjson(output: str, output_file: Optional[str], fields: Optional[str]) -> Optional["NdjsonWriter"]:
+    global _console, _console_stderr
+
+    _console = None
+    _console_stderr = output == "ndjson" and (output_file is None or output_file == "-")
+    if output != "ndjson":
+        return None
+    from .ndjson import NdjsonWriter
+
+    return NdjsonWriter(output_file, [field for field in (fields or "").split(",") if field.strip()])
+
+def close_pdf_writer(pdf_writer: Optional["PdfWriter"]) -> bool:
+    if pdf_writer is None:
+        return True
+    try:
+        pdf_writer.close()
+    except Exception as e:
+        get_console().print(f"[red]Не удалось создать PDF-отчеты: {e}[/red]")
+        return False
+    return True
+
+def print_detailed_report(report: "AnalysisReport", max_cost: float):
     pass
 
+def handle_report(report: Union["AnalysisReport", "ReportRecord"], label: str, max_cost: float, output: str = "text",
+                  pdf_writer: Optional["PdfWriter"] = None, pdf_filename: Optional[str] = None,
+                  store: Optional["ReportStore"] = None, stage_metrics: Optional["StageMetrics"] = None,
+                  ndjson_writer: Optional["NdjsonWriter"] = None) -> bool:
+    from .profiling import NO_STAGE
+
+    def stage(name: str):
+        return stage_metrics.stage(name) if stage_metrics is not None else NO_STAGE
+
+    with stage('output'):
+        if output == "text":
+            hot_node = ""
+            if report.hot_nodes:
+                node = report.hot_nodes[0]
+                share = node.time_share if node.time_share is not None else node.cost_share
+                hot_node = f" узел={node.node_type}{f'({node.relation})' if node.relation else ''}:{share:.0%}"
+            get_console().print(
+                f"{label} {report.query_type} стоимость={report.metrics.total_cost:.2f} "
+                f"оценка={report.score}/100 рекомендаций={len(report.recommendations)}{hot_node}"
+            )
+            if report.plan_change is not None:
+                change = report.plan_change
+                get_console().print(f"  [yellow]план изменился: стоимость {change.previous_cost:.2f} -> "
+                                    f"{report.metrics.total_cost:.2f}[/yellow]")
+                get_console().print('\n'.join(f"  {line}" for line in change.diff), markup=False)
+        elif output == "ndjson":
+            ndjson_writer.write(report)
+        else:
+            from .models import to_report
+            from .renderers import render_report
+            report = to_report(report)
+            typer.echo(render_report(report, output))
+    if pdf_writer is not None and pdf_filename:
+        from .models import to_report
+        with stage('pdf'):
+            report = to_report(report)
+            pdf_writer.add(report, pdf_filename)
+    if store is not None:
+        with stage('store'):
+            store.add(report)
+    return report.is_critical or report.metrics.total_cost > max_cost
+
 app = typer.Typer(name="The_Last_Siberia", help="SQL Query Analyzer for T1 Cloud")
 
 DEFAULT_DSN = '''
@@ -24,38 +102,630 @@ def analyze(
         dsn: str = typer.Argument(DEFAULT_DSN.strip(), help="PostgreSQL DSN для T1 Cloud (поддерживается формат psql \"host=...\")"),
         query: Optional[str] = typer.Option(None, "--query", "-q", help="SQL запрос для анализа"),
         file: Optional[str] = typer.Option(None, "--file", "-f", help="Файл с SQL запросами"),
+        directory: Optional[str] = typer.Option(None, "--dir", "-d", help="Каталог с файлами .sql (включая подкаталоги)"),
         max_cost: float = typer.Option(5000.0, "--max-cost", help="Максимально допустимая стоимость"),
         t1_env: Optional[str] = typer.Option("demo", "--t1-env", help="Окружение T1 Cloud (prod/stage/test)"),
+        output: str = typer.Option("text", "--output", "-o", help="Формат вывода (text/json/md/html/ndjson)"),
+        output_file: Optional[str] = typer.Option(None, "--output-file", help="Файл для --output ndjson (*.gz - со сжатием gzip), по умолчанию stdout"),
+        fields: Optional[str] = typer.Option(None, "--fields", help="Поля отчета для --output ndjson через запятую (например score,metrics.total_cost,recommendations.type)"),
+        verbose: bool = typer.Option(False, "--verbose", "-v", help="Подробный вывод"),
+        concurrency: int = typer.Option(4, "--concurrency", "-j", help="Количество одновременных EXPLAIN (размер пула соединений)"),
+        cache_size: int = typer.Option(1024, "--cache-size", help="Размер кэша планов по отпечатку запроса (0 - отключить)"),
+        cache_ttl: float = typer.Option(300.0, "--cache-ttl", help="Время жизни записи кэша планов (сек)"),
+        explain_analyze: bool = typer.Option(False, "--analyze", help="Выполнить EXPLAIN ANALYZE (DML - в откатываемой транзакции)"),
+        statement_timeout: int = typer.Option(30000, "--statement-timeout", help="Ограничение времени EXPLAIN ANALYZE (мс)"),
+        catalog: bool = typer.Option(True, "--catalog/--no-catalog", help="Загрузить снимок каталога (индексы, статистика, внешние ключи) для уточнения рекомендаций"),
+        store_path: Optional[str] = typer.Option(None, "--store", help="Сохранять отчеты в колоночное хранилище (SQLite) для команды stats"),
+        history_path: Optional[str] = typer.Option(None, "--history", help="История структурных хэшей планов (SQLite) для обнаружения смены плана"),
+        result_cache_path: Optional[str] = typer.Option(None, "--result-cache", help="Кэш результатов (SQLite) по хэшу текста запроса, версии схемы и статистики планировщика; ответы из кэша не записываются в --history"),
+        result_cache_days: float = typer.Option(30.0, "--result-cache-days", help="Удалять записи кэша результатов, не использованные дольше N дней"),
+        pdf: Optional[str] = typer.Option(None, "--pdf", help="PDF-отчеты: each - файл на запрос, single - один сводный файл, none - без PDF (по умолчанию each, для --output ndjson - none)"),
+        pdf_workers: int = typer.Option(2, "--pdf-workers", help="Количество процессов для рендеринга PDF (0 - в основном процессе)"),
+        stage_stats_path: Optional[str] = typer.Option(None, "--stage-stats", help="Записать гистограммы этапов анализа: JSON-сводка или формат Prometheus (*.prom)"),
+        profile_path: Optional[str] = typer.Option(None, "--profile", help="Записать профиль пакета: cProfile (pstats) или временную шкалу этапов для speedscope (*.speedscope.json)"),
+):
+    from .analyzer import T1PgQueryAnalyzer
+    from .batch import analyze_batch
+    from .cache import PlanCache
+    from .catalog import CatalogSnapshot
+    from .pdf_report import open_pdf_writer
+    from .history import PlanHistory
+    from .profiling import StageMetrics, ThreadProfiler, write_profile, write_stage_metrics
+    from .result_cache import ResultCache, catalog_version
+    from .store import ReportStore
+    from .utils import read_sql_dir, split_statements
+
+    stage_metrics = None
+    if verbose or stage_stats_path or profile_path:
+        stage_metrics = StageMetrics(record_spans=bool(profile_path and profile_path.endswith(".speedscope.json")))
+    profiler = ThreadProfiler() if profile_path else None
+    if profiler is not None:
+        profiler.enable()
+    plan_history = PlanHistory(history_path) if history_path else None
+    plan_cache = PlanCache(cache_size, cache_ttl) if cache_size > 0 else None
+    analyzer = T1PgQueryAnalyzer(dsn, t1_env, verbose, plan_cache=plan_cache, explain_analyze=explain_analyze,
+                                 statement_timeout_ms=statement_timeout, plan_history=plan_history,
+                                 catalog=CatalogSnapshot() if catalog else None, stage_metrics=stage_metrics)
+    started_at = datetime.now().strftime("%Y%m%d_%H%M%S")
+    ndjson_writer = open_ndjson(output, output_file, fields)
+    pdf_writer = open_pdf_writer(pdf or ("none" if output == "ndjson" else "each"), pdf_workers,
+                                 f"reports/report_{started_at}.pdf", console_stream())
+    store = ReportStore(store_path) if store_path else None
+    result_cache = ResultCache(result_cache_path, result_cache_days) if result_cache_path else None
+
+    try:
+        labels = None
+        if query:
+            queries = split_statements(query)
+        elif file:
+            with open(file, 'r', encoding='utf-8') as f:
+                queries = split_statements(f.read())
+        elif directory:
+            statements = read_sql_dir(directory)
+            queries = [statement.query for statement in statements]
+            labels = [f"{statement.path}#{statement.number}" for statement in statements]
+        else:
+            raise typer.Exit(1)
+
+        labels = labels or [f"#{index + 1}" for index in range(len(queries))]
+        concurrency = max(1, min(concurrency, len(queries)))
+        analyzer.open_pool(concurrency)
+
+        failed = False
+        pending = list(range(len(queries)))
+        if result_cache is not None:
+            with analyzer.acquire() as conn:
+                result_cache.catalog = catalog_version(analyzer, conn)
+            pending = []
+            for index, statement in enumerate(queries):
+                report = result_cache.get(statement)
+                if report is None:
+                    pending.append(index)
+                    continue
+                pdf_filename = f"reports/report_{started_at}_{index + 1:04d}.pdf"
+                if handle_report(report, f"{labels[index]} (кэш)", max_cost, output, pdf_writer, pdf_filename, store,
+                                 stage_metrics, ndjson_writer):
+                    failed = True
+
+        for result in analyze_batch(analyzer, [queries[index] for index in pending], concurrency, validate=False,
+                                    profiler=profiler):
+            index = pending[result.index]
+            if result.error is not None:
+                get_console().print(f"[red]{labels[index]}: ошибка анализа: {result.error}[/red]")
+                failed = True
+                continue
+
+            if result_cache is not None:
+                result_cache.put(result.query, result.report)
+            pdf_filename = f"reports/report_{started_at}_{index + 1:04d}.pdf"
+            if handle_report(result.report, labels[index], max_cost, output, pdf_writer, pdf_filename, store,
+                             stage_metrics, ndjson_writer):
+                failed = True
+
+        if result_cache is not None:
+            result_cache.prune()
+            summary = result_cache.summary()
+            get_console().print(f"Кэш результатов: из кэша {summary.hits}, проанализировано заново {summary.analyzed}, "
+                                f"удалено устаревших {summary.pruned}, всего записей {summary.entries}")
+
+        if verbose and plan_cache is not None:
+            get_console().print(f"Кэш планов: {plan_cache.stats()}")
+
+        if verbose:
+            from rich.table import Table
+
+            table = Table(title="Правила анализа", title_justify="left")
+            for column in ("Правило", "Типы узлов", "Вызовов", "Время, мс", "Ошибок"):
+                table.add_column(column)
+            for stat in analyzer.rules.stats():
+                table.add_row(stat.name, ', '.join(stat.node_types) if stat.node_types else "план",
+                              str(stat.calls), f"{stat.seconds * 1000:.2f}", str(stat.errors))
+            get_console().print(table)
+
+            table = Table(title="Этапы анализа", title_justify="left")
+            for column in ("Этап", "Вызовов", "Всего, мс", "p50, мс", "p95, мс", "p99, мс"):
+                table.add_column(column)
+            for name, stage in stage_metrics.summary().items():
+                table.add_row(name, str(stage['count']), f"{stage['total_ms']:.1f}", f"{stage['p50_ms']:.2f}",
+                              f"{stage['p95_ms']:.2f}", f"{stage['p99_ms']:.2f}")
+            get_console().print(table)
+
+        if failed:
+            raise typer.Exit(1)
+
+    except Exception:
+        raise typer.Exit(1)
+    finally:
+        analyzer.close()
+        if store is not None:
+            store.close()
+        with analyzer.stage('pdf_close'):
+            pdf_closed = close_pdf_writer(pdf_writer)
+        if plan_history is not None:
+            plan_history.close()
+        if result_cache is not None:
+            result_cache.close()
+        if ndjson_writer is not None:
+            ndjson_writer.close()
+        if profiler is not None:
+            profiler.disable()
+            write_profile(profile_path, profiler, stage_metrics)
+        if stage_stats_path:
+            write_stage_metrics(stage_stats_path, stage_metrics)
+        if not pdf_closed:
+            raise typer.Exit(1)
+
+@app.command()
+def workload(
+        dsn: str = typer.Argument(DEFAULT_DSN.strip(), help="PostgreSQL DSN для T1 Cloud (поддерживается формат psql \"host=...\")"),
+        top: int = typer.Option(50, "--top", "-n", help="Количество запросов из pg_stat_statements"),
+        order_by: str = typer.Option("total", "--order-by", help="Сортировка запросов (total/mean/calls)"),
+        state_file: str = typer.Option(".t1_pgss_state.json", "--state-file", help="Файл состояния предыдущего снимка"),
+        min_calls: int = typer.Option(100, "--min-calls", help="Прирост вызовов для повторного анализа"),
+        min_time: float = typer.Option(1000.0, "--min-time", help="Прирост суммарного времени для повторного анализа (мс)"),
+        max_cost: float = typer.Option(5000.0, "--max-cost", help="Максимально допустимая стоимость"),
+        t1_env: Optional[str] = typer.Option("demo", "--t1-env", help="Окружение T1 Cloud (prod/stage/test)"),
+        verbose: bool = typer.Option(False, "--verbose", "-v", help="Подробный вывод"),
+        concurrency: int = typer.Option(4, "--concurrency", "-j", help="Количество одновременных EXPLAIN (размер пула соединений)"),
+        cache_size: int = typer.Option(1024, "--cache-size", help="Размер кэша планов по отпечатку запроса (0 - отключить)"),
+        cache_ttl: float = typer.Option(300.0, "--cache-ttl", help="Время жизни записи кэша планов (сек)"),
+        output: str = typer.Option("text", "--output", "-o", help="Формат вывода (text/json/md/html/ndjson)"),
+        output_file: Optional[str] = typer.Option(None, "--output-file", help="Файл для --output ndjson (*.gz - со сжатием gzip), по умолчанию stdout"),
+        fields: Optional[str] = typer.Option(None, "--fields", help="Поля отчета для --output ndjson через запятую (например score,metrics.total_cost,recommendations.type)"),
+        catalog: bool = typer.Option(True, "--catalog/--no-catalog", help="Загрузить снимок каталога (индексы, статистика, внешние ключи) для уточнения рекомендаций"),
+        store_path: Optional[str] = typer.Option(None, "--store", help="Сохранять отчеты в колоночное хранилище (SQLite) для команды stats"),
+        history_path: Optional[str] = typer.Option(None, "--history", help="История структурных хэшей планов (SQLite) для обнаружения смены плана"),
+        pdf: Optional[str] = typer.Option(None, "--pdf", help="PDF-отчеты: each - файл на запрос, single - один сводный файл, none - без PDF (по умолчанию each, для --output ndjson - none)"),
+        pdf_workers: int = typer.Option(2, "--pdf-workers", help="Количество процессов для рендеринга PDF (0 - в основном процессе)"),
+):
+    from .analyzer import T1PgQueryAnalyzer
+    from .batch import analyze_batch
+    from .cache import PlanCache
+    from .catalog import CatalogSnapshot
+    from .pdf_report import open_pdf_writer
+    from .history import PlanHistory
+    from .pgss import StatementState, fetch_top_statements, is_explainable
+    from .store import ReportStore
+
+    plan_history = PlanHistory(history_path) if history_path else None
+    plan_cache = PlanCache(cache_size, cache_ttl) if cache_size > 0 else None
+    analyzer = T1PgQueryAnalyzer(dsn, t1_env, verbose, plan_cache=plan_cache, plan_history=plan_history,
+                                 catalog=CatalogSnapshot() if catalog else None)
+    state = StatementState(state_file).load()
+    started_at = datetime.now().strftime("%Y%m%d_%H%M%S")
+    ndjson_writer = open_ndjson(output, output_file, fields)
+    pdf_writer = open_pdf_writer(pdf or ("none" if output == "ndjson" else "each"), pdf_workers,
+                                 f"reports/pgss_{started_at}.pdf", console_stream())
+    store = ReportStore(store_path) if store_path else None
+
+    try:
+        analyzer.open_pool(max(1, concurrency))
+        with analyzer.acquire() as conn:
+            current = [stat for stat in fetch_top_statements(conn, top, order_by) if is_explainable(stat)]
+
+        changed = state.select_changed(current, min_calls, min_time)
+        get_console().print(f"pg_stat_statements: {len(current)} запросов, к анализу {len(changed)}")
+
+        failed = False
+        for result in analyze_batch(analyzer, [stat.query for stat, _ in changed], concurrency, validate=False):
+            stat, reason = changed[result.index]
+            if result.error is not None:
+                get_console().print(f"[red]queryid={stat.queryid}: ошибка анализа: {result.error}[/red]")
+                failed = True
+                continue
+
+            state.mark_analyzed(stat)
+            pdf_filename = f"reports/pgss_{stat.queryid}_{started_at}.pdf"
+            label = f"queryid={stat.queryid} ({reason}, вызовов={stat.calls}, среднее={stat.mean_time:.2f} мс)"
+            if handle_report(result.report, label, max_cost, output, pdf_writer, pdf_filename, store,
+                             ndjson_writer=ndjson_writer):
+                failed = True
+
+        state.save(current)
+
+        if failed:
+            raise typer.Exit(1)
+
+    except Exception:
+        raise typer.Exit(1)
+    finally:
+        analyzer.close()
+        if store is not None:
+            store.close()
+        pdf_closed = close_pdf_writer(pdf_writer)
+        if plan_history is not None:
+            plan_history.close()
+        if ndjson_writer is not None:
+            ndjson_writer.close()
+        if not pdf_closed:
+            raise typer.Exit(1)
+
+@app.command()
+def offline(
+        source: str = typer.Argument(..., help="Каталог, архив (.tar/.tar.gz) или файл с выводом EXPLAIN (FORMAT JSON) / auto_explain"),
+        workers: Optional[int] = typer.Option(None, "--workers", "-j", help="Количество процессов (по умолчанию - число ядер)"),
+        chunk_size: int = typer.Option(16, "--chunk-size", help="Количество планов в одном пакете для процесса"),
+        max_cost: float = typer.Option(5000.0, "--max-cost", help="Максимально допустимая стоимость"),
+        t1_env: Optional[str] = typer.Option("demo", "--t1-env", help="Окружение T1 Cloud (prod/stage/test)"),
+        store_path: Optional[str] = typer.Option(None, "--store", help="Сохранять отчеты в колоночное хранилище (SQLite) для команды stats"),
+        history_path: Optional[str] = typer.Option(None, "--history", help="История структурных хэшей планов (SQLite) для обнаружения смены плана"),
+        pdf_dir: Optional[str] = typer.Option(None, "--pdf-dir", help="Каталог для PDF-отчетов (по умолчанию не создаются)"),
+        pdf_workers: int = typer.Option(2, "--pdf-workers", help="Количество процессов для рендеринга PDF (0 - в основном процессе)")
+):
+    from .offline import analyze_offline
+    from .pdf_report import PdfWriter
+    from .store import ReportStore
+
+    pdf_writer = PdfWriter("each", pdf_workers, stream=console_stream()) if pdf_dir else None
+    store = ReportStore(store_path) if store_path else None
+
+    try:
+        failed = False
+        analyzed = 0
+        for result in analyze_offline(source, workers, chunk_size, t1_env, history_path):
+            label = f"{result.source}#{result.index + 1}"
+            if result.error is not None:
+                get_console().print(f"[red]{label}: ошибка анализа: {result.error}[/red]")
+                failed = True
+                continue
+
+            analyzed += 1
+            pdf_filename = None
+            if pdf_dir:
+                stem = os.path.splitext(os.path.basename(result.source))[0]
+                pdf_filename = os.path.join(pdf_dir, f"{stem}_{result.index + 1}.pdf")
+            if handle_report(result.report, label, max_cost, pdf_writer=pdf_writer, pdf_filename=pdf_filename, store=store):
+                failed = True
+
+        get_console().print(f"Проанализировано планов: {analyzed}")
+
+        if failed:
+            raise typer.Exit(1)
+
+    except ValueError as e:
+        get_console().print(f"[red]{e}[/red]")
+        raise typer.Exit(1)
+    except Exception:
+        raise typer.Exit(1)
+    finally:
+        if store is not None:
+            store.close()
+        pdf_closed = close_pdf_writer(pdf_writer)
+        if not pdf_closed:
+            raise typer.Exit(1)
+
+@app.command()
+def logs(
+        paths: List[str] = typer.Argument(..., help="Файлы журналов PostgreSQL (stderr/csvlog/jsonlog, в том числе .gz и ротированные)"),
+        state_file: Optional[str] = typer.Option(".t1_log_state.json", "--state-file", help="Файл с позициями чтения журналов (пусто - читать с начала)"),
+        follow: bool = typer.Option(False, "--follow", "-F", help="Следить за последним журналом, учитывая ротацию"),
+        poll_interval: float = typer.Option(1.0, "--poll-interval", help="Интервал опроса журнала в режиме --follow (сек)"),
+        min_duration: float = typer.Option(0.0, "--min-duration", help="Минимальная длительность запроса для анализа (мс)"),
+        max_cost: float = typer.Option(5000.0, "--max-cost", help="Максимально допустимая стоимость"),
+        t1_env: Optional[str] = typer.Option("demo", "--t1-env", help="Окружение T1 Cloud (prod/stage/test)"),
+        store_path: Optional[str] = typer.Option(None, "--store", help="Сохранять отчеты в колоночное хранилище (SQLite) для команды stats"),
+        history_path: Optional[str] = typer.Option(None, "--history", help="История структурных хэшей планов (SQLite) для обнаружения смены плана"),
+        pdf_dir: Optional[str] = typer.Option(None, "--pdf-dir", help="Каталог для PDF-отчетов (по умолчанию не создаются)"),
+        pdf_workers: int = typer.Option(2, "--pdf-workers", help="Количество процессов для рендеринга PDF (0 - в основном процессе)")
+):
+    from .analyzer import T1PgQueryAnalyzer
+    from .history import PlanHistory
+    from .logs import LogState, iter_logs
+    from .pdf_report import PdfWriter
+    from .store import ReportStore
+
+    plan_history = PlanHistory(history_path) if history_path else None
+    analyzer = T1PgQueryAnalyzer(None, t1_env, plan_history=plan_history)
+    state = LogState(state_file or None).load()
+    pdf_writer = PdfWriter("each", pdf_workers, stream=console_stream()) if pdf_dir else None
+    store = ReportStore(store_path) if store_path else None
+
+    try:
+        failed = False
+        for entry in iter_logs(paths, state, follow, poll_interval):
+            if entry.duration is not None and entry.duration < min_duration:
+                continue
+
+            label = f"{os.path.basename(entry.source)}@{entry.offset} ({entry.duration} мс)"
+            try:
+                report = analyzer.build_report(entry.plan, entry.query)
+            except Exception as e:
+                get_console().print(f"[red]{label}: ошибка анализа: {e}[/red]")
+                failed = True
+                continue
+
+            pdf_filename = os.path.join(pdf_dir, f"log_{entry.offset}.pdf") if pdf_dir else None
+            if handle_report(report, label, max_cost, pdf_writer=pdf_writer, pdf_filename=pdf_filename, store=store):
+                failed = True
+
+        if failed:
+            raise typer.Exit(1)
+
+    except KeyboardInterrupt:
+        pass
+    except Exception:
+        raise typer.Exit(1)
+    finally:
+        if store is not None:
+            store.close()
+        pdf_closed = close_pdf_writer(pdf_writer)
+        if plan_history is not None:
+            plan_history.close()
+        if not pdf_closed:
+            raise typer.Exit(1)
+
+@app.command()
+def calibrate(
+        dsn: str = typer.Argument(DEFAULT_DSN.strip(), help="PostgreSQL DSN для T1 Cloud (поддерживается формат psql \"host=...\")"),
+        file: Optional[str] = typer.Option(None, "--file", "-f", help="Файл с SQL запросами для калибровки"),
+        from_pgss: int = typer.Option(0, "--from-pgss", help="Взять N самых тяжелых запросов без параметров из pg_stat_statements"),
+        repeat: int = typer.Option(3, "--repeat", help="Количество прогонов EXPLAIN ANALYZE на запрос"),
+        statement_timeout: int = typer.Option(30000, "--statement-timeout", help="Ограничение времени одного прогона (мс)"),
+        t1_env: Optional[str] = typer.Option("demo", "--t1-env", help="Окружение T1 Cloud (prod/stage/test)")
+):
+    from .analyzer import T1PgQueryAnalyzer
+    from .calibration import ExecutionTimeModel, collect_samples, save_model
+    from .pgss import fetch_top_statements
+    from .utils import extract_query_info, split_statements
+
+    analyzer = T1PgQueryAnalyzer(dsn, t1_env, statement_timeout_ms=statement_timeout)
+
+    try:
+        queries = []
+        if file:
+            with open(file, 'r', encoding='utf-8') as f:
+                queries.extend(split_statements(f.read()))
+
+        analyzer.connect()
+        if from_pgss:
+            queries.extend(stat.query for stat in fetch_top_statements(analyzer.connection, from_pgss))
+        infos = [(query, extract_query_info(query)) for query in queries]
+        queries = [query for query, info in infos if info['type'] == 'SELECT' and not info['max_param']]
+        if not queries:
+            get_console().print("[red]Нет SELECT-запросов без параметров для калибровки[/red]")
+            raise typer.Exit(1)
+
+        samples = collect_samples(analyzer, queries, repeat)
+        model = ExecutionTimeModel.fit(samples, t1_env)
+        path = save_model(model)
+        get_console().print(
+            f"Модель для окружения {t1_env}: {len(queries)} запросов, {model.samples} узлов, "
+            f"типов узлов с собственной моделью: {len(model.coefficients)}. Сохранено: {path}"
+        )
+
+    except Exception:
+        raise typer.Exit(1)
+    finally:
+        analyzer.close()
+
+@app.command()
+def advise(
+        dsn: str = typer.Argument(DEFAULT_DSN.strip(), help="PostgreSQL DSN для T1 Cloud (поддерживается формат psql \"host=...\")"),
+        file: Optional[str] = typer.Option(None, "--file", "-f", help="Файл с SQL запросами нагрузки"),
+        from_pgss: int = typer.Option(0, "--from-pgss", help="Взять N самых тяжелых запросов из pg_stat_statements (вес - число вызовов)"),
+        budget_mb: float = typer.Option(1024.0, "--budget-mb", help="Допустимый суммарный размер новых индексов (МБ)"),
+        max_candidates: int = typer.Option(50, "--max-candidates", help="Максимум проверяемых индексов-кандидатов"),
+        statement_timeout: int = typer.Option(60000, "--statement-timeout", help="Ограничение времени построения одного индекса (мс)"),
+        lock_timeout: int = typer.Option(1000, "--lock-timeout", help="Ожидание блокировки таблицы при построении индекса (мс); на время построения запись в таблицу блокируется"),
         output: str = typer.Option("text", "--output", "-o", help="Формат вывода (text/json)"),
-        verbose: bool = typer.Option(False, "--verbose", "-v", help="Подробный вывод")
+        t1_env: Optional[str] = typer.Option("demo", "--t1-env", help="Окружение T1 Cloud (prod/stage/test)")
 ):
-    analyzer = T1PgQueryAnalyzer(dsn, t1_env, verbose)
+    from .advisor import advise_indexes
+    from .analyzer import T1PgQueryAnalyzer
+    from .pgss import fetch_top_statements, is_explainable
+    from .utils import split_statements
+
+    analyzer = T1PgQueryAnalyzer(dsn, t1_env, statement_timeout_ms=statement_timeout)
 
     try:
+        workload = []
+        if file:
+            with open(file, 'r', encoding='utf-8') as f:
+                workload.extend((query, 1.0) for query in split_statements(f.read()))
+
         analyzer.connect()
+        if from_pgss:
+            workload.extend((stat.query, float(stat.calls or 1))
+                            for stat in fetch_top_statements(analyzer.connection, from_pgss) if is_explainable(stat))
+        if not workload:
+            get_console().print("[red]Нет запросов для подбора индексов[/red]")
+            raise typer.Exit(1)
+
+        suggestions = advise_indexes(analyzer, workload, int(budget_mb * 1024 * 1024), max_candidates, lock_timeout)
+        if output == "json":
+            import json
+            typer.echo(json.dumps([s.model_dump() for s in suggestions], ensure_ascii=False, indent=2))
+        else:
+            get_console().print(f"Нагрузка: {len(workload)} запросов, рекомендовано индексов: {len(suggestions)}")
+            for suggestion in suggestions:
+                get_console().print(
+                    f"{suggestion.definition};  -- {suggestion.size_bytes / 1024 / 1024:.1f} МБ, "
+                    f"стоимость {suggestion.cost_before:.0f} -> {suggestion.cost_after:.0f}, "
+                    f"улучшено запросов {suggestion.improved_queries}/{suggestion.queries}"
+                )
+
+    except Exception:
+        raise typer.Exit(1)
+    finally:
+        analyzer.close()
+
+@app.command()
+def stats(
+        store_path: str = typer.Argument(..., help="Файл колоночного хранилища отчетов (--store)"),
+        limit: int = typer.Option(20, "--limit", "-n", help="Количество строк в каждом разделе"),
+        days: Optional[float] = typer.Option(None, "--days", help="Учитывать только отчеты за последние N дней"),
+        bucket: str = typer.Option("day", "--bucket", help="Интервал для частоты рекомендаций (hour/day/week)")
+):
+    from .store import ReportStore
+
+    store = ReportStore(store_path)
+    since = datetime.now().timestamp() - days * 86400 if days else None
 
+    try:
+        console = get_console()
+        console.print(f"Отчетов в хранилище: {len(store)}")
+
+        console.print("\nСтоимость по отпечаткам запросов (p50 / p95 / max):")
+        for item in store.cost_percentiles(limit, since):
+            console.print(f"  {item.fingerprint} x{item.reports}: {item.p50:.2f} / {item.p95:.2f} / {item.max_cost:.2f}  "
+                          f"{item.query[:80]}", markup=False)
+
+        console.print("\nТаблицы с наибольшей суммарной стоимостью:")
+        for item in store.top_tables(limit, since):
+            console.print(f"  {item.table}: отчетов {item.reports}, критичных {item.critical}, "
+                          f"стоимость {item.total_cost:.2f}", markup=False)
+
+        trend = store.recommendation_frequency(bucket, since)
+        if trend.types:
+            console.print(f"\nЧастота рекомендаций ({bucket}): {', '.join(trend.types)}")
+            for start, counts in zip(trend.buckets[-limit:], trend.counts[-limit:]):
+                console.print(f"  {datetime.fromtimestamp(start).strftime('%Y-%m-%d %H:%M')}: "
+                              f"{' '.join(str(count) for count in counts)}")
+
+    except Exception:
+        raise typer.Exit(1)
+    finally:
+        store.close()
+
+@app.command()
+def plans(
+        history_path: str = typer.Argument(..., help="Файл истории планов (--history)"),
+        fingerprint: Optional[str] = typer.Option(None, "--fingerprint", help="Показать версии плана одного запроса"),
+        t1_env: Optional[str] = typer.Option("demo", "--t1-env", help="Окружение T1 Cloud (prod/stage/test)"),
+        limit: int = typer.Option(20, "--limit", "-n", help="Количество записей"),
+        days: Optional[float] = typer.Option(None, "--days", help="Смены планов за последние N дней")
+):
+    from .history import PlanHistory
+
+    history = PlanHistory(history_path)
+
+    try:
+        if fingerprint:
+            versions = history.versions(fingerprint, t1_env, limit)
+        else:
+            since = datetime.now().timestamp() - days * 86400 if days else None
+            versions = history.recent_changes(since, limit)
+
+        console = get_console()
+        for version in versions:
+            seen_at = datetime.fromtimestamp(version.seen_at).strftime('%Y-%m-%d %H:%M:%S')
+            cost = f"{version.total_cost:.2f}"
+            if version.previous_cost is not None:
+                cost = f"{version.previous_cost:.2f} -> {cost}"
+            console.print(f"{seen_at} {version.fingerprint} [{version.environment or '-'}] "
+                          f"{version.previous_hash or 'новый'} -> {version.plan_hash}: стоимость {cost}", markup=False)
+            for line in history.diff(version):
+                console.print(f"  {line}", markup=False)
+
+    except Exception:
+        raise typer.Exit(1)
+    finally:
+        history.close()
+
+@app.command()
+def compare(
+        clusters: List[str] = typer.Option(..., "--cluster", "-c", help="Кластер в формате имя=DSN (указывается несколько раз)"),
+        query: Optional[str] = typer.Option(None, "--query", "-q", help="SQL запрос для сравнения"),
+        file: Optional[str] = typer.Option(None, "--file", "-f", help="Файл с SQL запросами"),
+        directory: Optional[str] = typer.Option(None, "--dir", "-d", help="Каталог с файлами .sql (включая подкаталоги)"),
+        concurrency: int = typer.Option(4, "--concurrency", "-j", help="Количество одновременных EXPLAIN на каждый кластер"),
+        output: str = typer.Option("text", "--output", "-o", help="Формат вывода (text/json/md)"),
+        fail_on_drift: bool = typer.Option(False, "--fail-on-drift", help="Код возврата 1, если планы, стоимость или рекомендации различаются"),
+):
+    import asyncio
+    from .compare import (compare_clusters, compare_queries, comparison_rows, drift, parse_cluster, plan_diffs,
+                          render_comparison_json, render_comparison_markdown)
+    from .utils import read_sql_dir, split_statements
+
+    try:
+        targets = [parse_cluster(spec) for spec in clusters]
         if query:
-            queries = [query]
+            queries = split_statements(query)
         elif file:
             with open(file, 'r', encoding='utf-8') as f:
-                queries = [f.read()]
+                queries = split_statements(f.read())
+        elif directory:
+            queries = [statement.query for statement in read_sql_dir(directory)]
         else:
             raise typer.Exit(1)
 
-        reports = []
-        for i, q in enumerate(queries):
-            report = analyzer.analyze_query(q)
-            reports.append(report)
+        drifted = False
+        if output == "text":
+            from rich.table import Table
 
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            pdf_filename = f"reports/report_{timestamp}.pdf"
-            generate_pdf_report(report, pdf_filename)
+            async def stream():
+                nonlocal drifted
+                async for comparison in compare_queries(targets, queries, max(1, concurrency)):
+                    table = Table(title=f"#{comparison.index + 1}: {comparison.query[:100]}", title_justify="left")
+                    table.add_column("Показатель")
+                    for result in comparison.results:
+                        table.add_column(f"{result.cluster} ({result.elapsed * 1000:.0f} мс)")
+                    for row in comparison_rows(comparison):
+                        table.add_row(*row)
+                    get_console().print(table)
+                    messages = drift(comparison)
+                    drifted = drifted or bool(messages)
+                    for message in messages:
+                        get_console().print(f"  [yellow]{message}[/yellow]")
+                    for result in comparison.results:
+                        if result.error is not None:
+                            get_console().print(f"  [red]{result.cluster}: {result.error}[/red]")
+                    for diff in plan_diffs(comparison).values():
+                        get_console().print('\n'.join(f"  {line}" for line in diff), markup=False)
 
-            if report.is_critical or report.metrics.total_cost > max_cost:
-                raise typer.Exit(1)
+            asyncio.run(stream())
+        else:
+            comparisons = compare_clusters(targets, queries, max(1, concurrency))
+            drifted = any(drift(comparison) for comparison in comparisons)
+            renderers = {'json': render_comparison_json, 'md': render_comparison_markdown}
+            if output not in renderers:
+                raise ValueError(f"Неизвестный формат отчета: {output}")
+            typer.echo(renderers[output](comparisons))
+
+        if fail_on_drift and drifted:
+            raise typer.Exit(1)
+
+    except Exception:
+        raise typer.Exit(1)
+
+@app.command()
+def serve(
+        dsn: str = typer.Argument(DEFAULT_DSN.strip(), help="PostgreSQL DSN для T1 Cloud (поддерживается формат psql \"host=...\")"),
+        host: str = typer.Option("127.0.0.1", "--host", help="Адрес HTTP-сервера"),
+        port: int = typer.Option(8765, "--port", "-p", help="Порт HTTP-сервера"),
+        t1_env: Optional[str] = typer.Option("demo", "--t1-env", help="Окружение T1 Cloud (prod/stage/test)"),
+        concurrency: int = typer.Option(4, "--concurrency", "-j", help="Количество одновременных EXPLAIN (размер пула соединений)"),
+        cache_size: int = typer.Option(1024, "--cache-size", help="Размер кэша планов по отпечатку запроса (0 - отключить)"),
+        cache_ttl: float = typer.Option(300.0, "--cache-ttl", help="Время жизни записи кэша планов (сек)"),
+        history_path: Optional[str] = typer.Option(None, "--history", help="История структурных хэшей планов (SQLite) для обнаружения смены плана"),
+        catalog: bool = typer.Option(True, "--catalog/--no-catalog", help="Загрузить снимок каталога (индексы, статистика, внешние ключи) для уточнения рекомендаций"),
+):
+    from .analyzer import T1PgQueryAnalyzer
+    from .cache import PlanCache
+    from .catalog import CatalogSnapshot
+    from .history import PlanHistory
+    from .profiling import StageMetrics
+    from .server import AnalysisService, make_server
+
+    plan_history = PlanHistory(history_path) if history_path else None
+    plan_cache = PlanCache(cache_size, cache_ttl) if cache_size > 0 else None
+    analyzer = T1PgQueryAnalyzer(dsn, t1_env, plan_cache=plan_cache, plan_history=plan_history,
+                                 catalog=CatalogSnapshot() if catalog else None, stage_metrics=StageMetrics())
+
+    try:
+        analyzer.open_pool(max(1, concurrency))
+        server = make_server(AnalysisService(analyzer, max(1, concurrency)), host, port)
+        get_console().print(f"Сервер анализа: http://{host}:{server.server_port} (POST /analyze, GET /stats, GET /metrics, GET /health)")
+        server.serve_forever()
 
+    except KeyboardInterrupt:
+        pass
     except Exception:
         raise typer.Exit(1)
+    finally:
+        analyzer.close()
+        if plan_history is not None:
+            plan_history.close()
 
 @app.command()
 def list_services():
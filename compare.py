@@ -0,0 +1,234 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from .analyzer import T1PgQueryAnalyzer
+from .history import outline_diff
+from .models import ReportRecord, to_report
+from .utils import extract_query_info
+
+
+COST_DRIFT_RATIO = 2.0
+
+
+class Cluster(NamedTuple):
+    name: str
+    dsn: str
+
+
+class ClusterResult(NamedTuple):
+    cluster: str
+    report: Optional[ReportRecord]
+    outline: List[str]
+    elapsed: float
+    error: Optional[Exception]
+
+
+class QueryComparison(NamedTuple):
+    index: int
+    query: str
+    results: List[ClusterResult]
+
+
+def parse_cluster(spec: str) -> Cluster:
+    name, separator, dsn = spec.partition('=')
+    name = name.strip()
+    if not separator or not name or not dsn.strip() or ' ' in name:
+        raise ValueError(f"Ожидается кластер в формате имя=DSN: {spec}")
+    return Cluster(name, dsn.strip())
+
+
+def _analyze(analyzer: T1PgQueryAnalyzer, query: str) -> Tuple[ReportRecord, List[str]]:
+    query_info = extract_query_info(query)
+    plan = analyzer.get_explain_plan(query, query_info)
+    report = analyzer.build_report(plan, query, query_info)
+    return report, analyzer.build_plan_tree(plan).outline()
+
+
+async def _run_on_cluster(analyzer: T1PgQueryAnalyzer, semaphore: asyncio.Semaphore,
+                          executor: ThreadPoolExecutor, query: str) -> ClusterResult:
+    loop = asyncio.get_running_loop()
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            report, outline = await loop.run_in_executor(executor, _analyze, analyzer, query)
+        except Exception as e:
+            return ClusterResult(analyzer.t1_environment, None, [], time.perf_counter() - started, e)
+        return ClusterResult(analyzer.t1_environment, report, outline, time.perf_counter() - started, None)
+
+
+async def compare_queries(
+        clusters: List[Cluster],
+        queries: Iterable[str],
+        concurrency: int = 4,
+        max_pending: Optional[int] = None
+) -> AsyncIterator[QueryComparison]:
+    if concurrency < 1:
+        raise ValueError("Параллельность должна быть не меньше 1")
+    if len({cluster.name for cluster in clusters}) != len(clusters):
+        raise ValueError("Имена кластеров должны быть уникальными")
+    max_pending = max_pending or concurrency * 2
+    loop = asyncio.get_running_loop()
+    analyzers = [T1PgQueryAnalyzer(cluster.dsn, cluster.name) for cluster in clusters]
+    executor = ThreadPoolExecutor(max_workers=concurrency * len(clusters), thread_name_prefix="t1-compare")
+
+    try:
+        opened = await asyncio.gather(
+            *(loop.run_in_executor(executor, analyzer.open_pool, concurrency) for analyzer in analyzers),
+            return_exceptions=True
+        )
+        unavailable: Dict[str, Exception] = {
+            analyzer.t1_environment: error for analyzer, error in zip(analyzers, opened) if isinstance(error, Exception)
+        }
+        for name, error in unavailable.items():
+            analyzers[0].logger.warning("Кластер %s недоступен: %s", name, error)
+        semaphores = [asyncio.Semaphore(concurrency) for _ in analyzers]
+
+        async def compare(index: int, query: str) -> QueryComparison:
+            results = await asyncio.gather(*(
+                _run_on_cluster(analyzer, semaphore, executor, query)
+                for analyzer, semaphore in zip(analyzers, semaphores)
+                if analyzer.t1_environment not in unavailable
+            ))
+            by_name = {result.cluster: result for result in results}
+            return QueryComparison(index, query, [
+                by_name.get(cluster.name) or ClusterResult(cluster.name, None, [], 0.0, unavailable[cluster.name])
+                for cluster in clusters
+            ])
+
+        pending: Set[asyncio.Task] = set()
+        for index, query in enumerate(queries):
+            if len(pending) >= max_pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+            pending.add(asyncio.ensure_future(compare(index, query)))
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        executor.shutdown(wait=True)
+        for analyzer in analyzers:
+            analyzer.close()
+
+
+def compare_clusters(clusters: List[Cluster], queries: Iterable[str], concurrency: int = 4) -> List[QueryComparison]:
+    async def collect() -> List[QueryComparison]:
+        return [comparison async for comparison in compare_queries(clusters, queries, concurrency)]
+
+    return sorted(asyncio.run(collect()), key=lambda comparison: comparison.index)
+
+
+def _baseline(comparison: QueryComparison) -> Optional[ClusterResult]:
+    return next((result for result in comparison.results if result.report is not None), None)
+
+
+def drift(comparison: QueryComparison) -> List[str]:
+    reports = [result for result in comparison.results if result.report is not None]
+    messages = []
+    failed = [result.cluster for result in comparison.results if result.error is not None]
+    if failed:
+        messages.append(f"Ошибка анализа на {', '.join(failed)}")
+    if len(reports) < 2:
+        return messages
+
+    hashes = {result.report.plan_hash for result in reports}
+    if len(hashes) > 1:
+        messages.append(f"Планы различаются: {len(hashes)} варианта(ов)")
+    costs = [result.report.metrics.total_cost for result in reports]
+    if min(costs) > 0 and max(costs) / min(costs) >= COST_DRIFT_RATIO:
+        messages.append(f"Стоимость различается в {max(costs) / min(costs):.1f} раз "
+                        f"({min(costs):,.2f} - {max(costs):,.2f})")
+    kinds = {frozenset(rec.type for rec in result.report.recommendations) for result in reports}
+    if len(kinds) > 1:
+        messages.append("Рекомендации различаются")
+    return messages
+
+
+def plan_diffs(comparison: QueryComparison) -> Dict[str, List[str]]:
+    baseline = _baseline(comparison)
+    if baseline is None:
+        return {}
+    return {
+        result.cluster: outline_diff(baseline.outline, result.outline, baseline.cluster, result.cluster)
+        for result in comparison.results
+        if result.report is not None and result.report.plan_hash != baseline.report.plan_hash
+    }
+
+
+def _cell(result: ClusterResult, field: str) -> str:
+    if result.report is None:
+        return "ошибка" if field == 'cost' else ""
+    report = result.report
+    if field == 'cost':
+        return f"{report.metrics.total_cost:,.2f}"
+    if field == 'time':
+        return f"{report.metrics.max_execution_time:,.2f}"
+    if field == 'score':
+        return f"{report.score}/100"
+    if field == 'plan':
+        return report.plan_hash or ""
+    if field == 'hot_node':
+        if not report.hot_nodes:
+            return ""
+        node = report.hot_nodes[0]
+        return f"{node.node_type}{f' ({node.relation})' if node.relation else ''}"
+    return ', '.join(sorted({rec.type for rec in report.recommendations})) or "-"
+
+
+COMPARISON_ROWS = (
+    ('cost', "Стоимость"),
+    ('time', "Оценочное время, мс"),
+    ('score', "Оценка"),
+    ('plan', "Хэш плана"),
+    ('hot_node', "Самый затратный узел"),
+    ('recommendations', "Рекомендации"),
+)
+
+
+def comparison_rows(comparison: QueryComparison) -> List[List[str]]:
+    return [[title] + [_cell(result, field) for result in comparison.results] for field, title in COMPARISON_ROWS]
+
+
+def render_comparison_markdown(comparisons: Iterable[QueryComparison]) -> str:
+    lines = ["# PGQueryGuard — сравнение окружений", ""]
+    for comparison in comparisons:
+        names = [result.cluster for result in comparison.results]
+        lines.extend([
+            f"## Запрос #{comparison.index + 1}",
+            "",
+            "```sql",
+            comparison.query,
+            "```",
+            "",
+            "| Показатель | " + " | ".join(names) + " |",
+            "|---|" + "---|" * len(names),
+        ] + ["| " + " | ".join(row) + " |" for row in comparison_rows(comparison)] + [""])
+        lines.extend(f"- {message}" for message in drift(comparison))
+        lines.extend(f"- {result.cluster}: {result.error}" for result in comparison.results if result.error is not None)
+        for diff in plan_diffs(comparison).values():
+            lines.extend(["", "```diff"] + diff + ["```"])
+        lines.append("")
+    return '\n'.join(lines)
+
+
+def render_comparison_json(comparisons: Iterable[QueryComparison]) -> str:
+    return json.dumps([
+        {
+            'query': comparison.query,
+            'drift': drift(comparison),
+            'plan_diffs': plan_diffs(comparison),
+            'clusters': {
+                result.cluster: {
+                    'elapsed': result.elapsed,
+                    'error': str(result.error) if result.error is not None else None,
+                    'report': to_report(result.report).model_dump(mode='json') if result.report is not None else None,
+                }
+                for result in comparison.results
+            },
+        }
+        for comparison in comparisons
+    ], ensure_ascii=False, indent=2)
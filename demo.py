@@ -1,5 +1,6 @@
 import random
 from datetime import datetime
+from typing import Any, Dict, List, Optional
 from .models import QueryMetric, Recommendation, AnalysisReport, Priority, T1CloudService
 from .pdf_report import generate_pdf_report
 
@@ -35,38 +36,39 @@ WARNINGS = [
     "Отсутствует ORDER BY при использовании LIMIT"
 ]
 
-def generate_random_query():
-    query_type = random.choice(["SELECT", "UPDATE", "DELETE", "INSERT"])
-    tables = random.sample(TABLES, k=random.randint(1, 3))
+def generate_random_query(rng: random.Random = random):
+    query_type = rng.choice(["SELECT", "UPDATE", "DELETE", "INSERT"])
+    tables = rng.sample(TABLES, k=rng.randint(1, 3))
     main_table = tables[0]
 
     if query_type == "SELECT":
-        select_fields = "*" if random.random() > 0.5 else ", ".join(random.sample(COLUMNS, k=random.randint(1, 3)))
+        select_fields = "*" if rng.random() > 0.5 else ", ".join(rng.sample(COLUMNS, k=rng.randint(1, 3)))
         where_clause = ""
-        if random.random() > 0.3:
-            where_clause = " WHERE " + " AND ".join(random.sample(FILTERS, k=random.randint(1, 2)))
+        if rng.random() > 0.3:
+            where_clause = " WHERE " + " AND ".join(rng.sample(FILTERS, k=rng.randint(1, 2)))
         join_clause = ""
         if len(tables) > 1:
             join_table = tables[1]
-            join_condition = random.choice(JOIN_CONDITIONS).replace("o.", f"{main_table[0]}.").replace("c.", f"{join_table[0]}.")
+            join_condition = rng.choice(JOIN_CONDITIONS).replace("o.", f"{main_table[0]}.").replace("c.", f"{join_table[0]}.")
             join_clause = f" JOIN {join_table} {join_table[0]} ON {join_condition}"
         order_clause = ""
-        if random.random() > 0.5:
-            order_clause = " ORDER BY " + random.choice(SORTS)
+        if rng.random() > 0.5:
+            order_clause = " ORDER BY " + rng.choice(SORTS)
         limit_clause = ""
-        if random.random() > 0.7:
-            limit_clause = " LIMIT " + str(random.choice([10, 50, 100, 1000]))
+        if rng.random() > 0.7:
+            limit_clause = " LIMIT " + str(rng.choice([10, 50, 100, 1000]))
         query = f"SELECT {select_fields} FROM {main_table} {main_table[0]}{join_clause}{where_clause}{order_clause}{limit_clause}"
     elif query_type == "UPDATE":
-        set_clause = f"SET {random.choice(COLUMNS)} = {random.choice(['NULL', '0', "'updated'"])}"
-        where_clause = " WHERE " + random.choice(FILTERS) if random.random() > 0.3 else ""
+        value = rng.choice(['NULL', '0', "'updated'"])
+        set_clause = f"SET {rng.choice(COLUMNS)} = {value}"
+        where_clause = " WHERE " + rng.choice(FILTERS) if rng.random() > 0.3 else ""
         query = f"UPDATE {main_table} {set_clause}{where_clause}"
     elif query_type == "DELETE":
-        where_clause = " WHERE " + random.choice(FILTERS) if random.random() > 0.3 else ""
+        where_clause = " WHERE " + rng.choice(FILTERS) if rng.random() > 0.3 else ""
         query = f"DELETE FROM {main_table}{where_clause}"
     else:  # INSERT
-        columns = random.sample(COLUMNS, k=random.randint(2, 4))
-        values = ", ".join([f"'value{i}'" if random.random() > 0.5 else str(random.randint(1, 100)) for i in range(len(columns))])
+        columns = rng.sample(COLUMNS, k=rng.randint(2, 4))
+        values = ", ".join([f"'value{i}'" if rng.random() > 0.5 else str(rng.randint(1, 100)) for i in range(len(columns))])
         query = f"INSERT INTO {main_table} ({', '.join(columns)}) VALUES ({values})"
 
     return query.strip(), query_type, tables
@@ -148,6 +150,97 @@ def generate_random_warnings(query_type, has_limit, has_order_by):
     return warnings
 
 
+PLAN_SHAPES = ("deep_join", "partitions", "sorts", "mixed")
+JOIN_NODES = ["Hash Join", "Nested Loop", "Merge Join"]
+SORT_METHODS = ["quicksort", "top-N heapsort", "external merge", "external"]
+
+
+def _plan_node(node_type: str, children: List[Dict[str, Any]], rows: int, own_cost: float,
+               **fields: Any) -> Dict[str, Any]:
+    startup = max((child["Total Cost"] for child in children), default=0.0)
+    total = sum(child["Total Cost"] for child in children) + own_cost
+    node = {
+        "Node Type": node_type,
+        "Parallel Aware": False,
+        "Startup Cost": round(startup, 2),
+        "Total Cost": round(total, 2),
+        "Plan Rows": rows,
+        "Plan Width": 8 * max(1, len(children)) + 24,
+    }
+    node.update(fields)
+    if children:
+        node["Plans"] = children
+    return node
+
+
+def generate_scan_node(rng: random.Random, relation: str) -> Dict[str, Any]:
+    rows = int(rng.choice([10, 1000, 50000, 2000000]) * rng.uniform(0.5, 1.5))
+    column = rng.choice(COLUMNS)
+    if rng.random() > 0.4:
+        return _plan_node(
+            "Seq Scan", [], rows, rows * 0.01 + 10, **{"Relation Name": relation, "Schema": "public",
+                                                      "Alias": relation[0], "Filter": f"({column} > 0)"}
+        )
+    return _plan_node(
+        "Index Scan", [], max(1, rows // 1000), 8.45, **{"Relation Name": relation, "Schema": "public",
+                                                         "Alias": relation[0], "Index Name": f"{relation}_{column}_idx",
+                                                         "Index Cond": f"({column} = $1)"}
+    )
+
+
+def _join(rng: random.Random, outer: Dict[str, Any], inner: Dict[str, Any]) -> Dict[str, Any]:
+    node_type = rng.choice(JOIN_NODES)
+    rows = max(1, int(max(outer["Plan Rows"], inner["Plan Rows"]) * rng.uniform(0.1, 1.2)))
+    if node_type == "Hash Join":
+        inner = _plan_node("Hash", [inner], inner["Plan Rows"], inner["Plan Rows"] * 0.02)
+    return _plan_node(node_type, [outer, inner], rows, rows * 0.015, **{"Join Type": "Inner"})
+
+
+def _sort(rng: random.Random, child: Dict[str, Any]) -> Dict[str, Any]:
+    rows = child["Plan Rows"]
+    return _plan_node("Sort", [child], rows, rows * 0.05 + 1, **{"Sort Key": [rng.choice(SORTS)],
+                                                                "Sort Method": rng.choice(SORT_METHODS)})
+
+
+def generate_random_plan(shape: str = "mixed", size: int = 50, seed: Optional[int] = None) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    relation = lambda i: f"{TABLES[i % len(TABLES)]}_{i}"
+
+    if shape == "deep_join":
+        root = generate_scan_node(rng, relation(0))
+        for i in range(1, size + 1):
+            root = _join(rng, root, generate_scan_node(rng, relation(i)))
+    elif shape == "partitions":
+        parts = [generate_scan_node(rng, f"orders_p{i}") for i in range(size)]
+        append = _plan_node("Append", parts, sum(p["Plan Rows"] for p in parts), size * 0.5)
+        root = _plan_node("Aggregate", [append], 1, append["Plan Rows"] * 0.01, **{"Strategy": "Plain"})
+    elif shape == "sorts":
+        root = generate_scan_node(rng, relation(0))
+        for i in range(size):
+            root = _sort(rng, root)
+            if i % 2:
+                root = _plan_node("Subquery Scan", [root], root["Plan Rows"], 1.0, **{"Alias": f"s{i}"})
+    elif shape == "mixed":
+        nodes = [generate_scan_node(rng, relation(i)) for i in range(size)]
+        while len(nodes) > 1:
+            outer = nodes.pop(rng.randrange(len(nodes)))
+            inner = nodes.pop(rng.randrange(len(nodes)))
+            node = _join(rng, outer, inner)
+            if rng.random() > 0.7:
+                node = _sort(rng, node)
+            nodes.append(node)
+        root = nodes[0]
+    else:
+        raise ValueError(f"Неизвестная форма плана: {shape}")
+
+    return [{"Plan": root, "Planning Time": round(rng.uniform(0.1, 5.0), 3)}]
+
+
+def generate_query_corpus(count: int = 1000, seed: Optional[int] = None) -> List[str]:
+    rng = random.Random(seed)
+    return [generate_random_query(rng)[0] for _ in range(count)]
+
+
 def demo_analysis():
     query, query_type, tables = generate_random_query()
     has_join = "JOIN" in query
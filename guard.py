@@ -0,0 +1,195 @@
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, NamedTuple, Optional, Set
+from .analyzer import T1PgQueryAnalyzer, logger
+from .cache import PlanCache
+from .lexer import scan_query
+from .models import Priority, ReportRecord
+from .pgss import EXPLAINABLE_TYPES
+from .utils import is_single_statement
+
+
+GUARD_MODES = ('log', 'block')
+
+
+class Verdict(NamedTuple):
+    violation: bool
+    total_cost: float
+    is_critical: bool
+    reason: Optional[str]
+
+
+PASS = Verdict(False, 0.0, False, None)
+
+
+class QueryBlocked(Exception):
+    def __init__(self, query: str, verdict: Verdict):
+        super().__init__(f"Запрос заблокирован T1 PgQueryGuard: {verdict.reason}")
+        self.query = query
+        self.verdict = verdict
+
+
+class QueryGuard:
+    def __init__(self, analyzer: T1PgQueryAnalyzer, max_cost: float = 5000.0, mode: str = 'log',
+                 block_critical: bool = True, sample_rate: float = 1.0, background: bool = False,
+                 cache_size: int = 4096, cache_ttl: Optional[float] = 300.0,
+                 on_violation: Optional[Callable[[str, Verdict], None]] = None):
+        if mode not in GUARD_MODES:
+            raise ValueError(f"Неизвестный режим защиты: {mode}")
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError("Доля выборки должна быть от 0 до 1")
+        self.analyzer = analyzer
+        self.max_cost = max_cost
+        self.mode = mode
+        self.block_critical = block_critical
+        self.sample_rate = sample_rate
+        self.background = background
+        self.on_violation = on_violation
+        self.verdicts = PlanCache(cache_size, cache_ttl)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="t1-guard") if background else None
+        self._lock = threading.Lock()
+        self._scheduled: Set[str] = set()
+        self.checks = 0
+        self.skipped = 0
+        self.multi_statement = 0
+        self.sampled_out = 0
+        self.analyzed = 0
+        self.violations = 0
+        self.errors = 0
+
+    def verdict(self, report: ReportRecord) -> Verdict:
+        reasons = []
+        if report.metrics.total_cost > self.max_cost:
+            reasons.append(f"стоимость {report.metrics.total_cost:.2f} > {self.max_cost:.2f}")
+        if self.block_critical and report.is_critical:
+            critical = sorted({rec.type for rec in report.recommendations if rec.priority == Priority.HIGH})
+            reasons.append(f"критичные рекомендации: {', '.join(critical)}")
+        return Verdict(bool(reasons), report.metrics.total_cost, report.is_critical, '; '.join(reasons) or None)
+
+    def _analyze(self, statement: str, fingerprint: str) -> Verdict:
+        try:
+            verdict = self.verdict(self.analyzer.analyze_query(statement, validate=False))
+            with self._lock:
+                self.analyzed += 1
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            logger.debug("T1 PgQueryGuard: не удалось проверить запрос: %s", e)
+            verdict = PASS
+        self.verdicts.put(('fingerprint', fingerprint), verdict)
+        return verdict
+
+    def _analyze_background(self, statement: str, fingerprint: str, key: Any):
+        try:
+            self.verdicts.put(key, self._analyze(statement, fingerprint))
+        finally:
+            with self._lock:
+                self._scheduled.discard(fingerprint)
+
+    def _miss(self, key: Any, query: Any, vars: Any, cursor: Any) -> Verdict:
+        if key is None:
+            key = query = query.as_string(cursor)
+            verdict = self.verdicts.get(key)
+            if verdict is not None:
+                return verdict
+        if isinstance(query, bytes):
+            query = query.decode(cursor.connection.encoding if cursor is not None else 'utf-8')
+        info = scan_query(query)
+        if info.type not in EXPLAINABLE_TYPES:
+            with self._lock:
+                self.skipped += 1
+            self.verdicts.put(key, PASS)
+            return PASS
+        if not is_single_statement(query):
+            with self._lock:
+                self.multi_statement += 1
+            self.verdicts.put(key, PASS)
+            return PASS
+
+        verdict = self.verdicts.get(('fingerprint', info.fingerprint))
+        if verdict is not None:
+            self.verdicts.put(key, verdict)
+            return verdict
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            with self._lock:
+                self.sampled_out += 1
+            self.verdicts.put(key, PASS)
+            return PASS
+
+        statement = query
+        if vars is not None and cursor is not None:
+            statement = cursor.mogrify(query, vars).decode(cursor.connection.encoding)
+        if self._executor is not None:
+            with self._lock:
+                scheduled = info.fingerprint in self._scheduled
+                self._scheduled.add(info.fingerprint)
+            if not scheduled:
+                self._executor.submit(self._analyze_background, statement, info.fingerprint, key)
+            return PASS
+
+        verdict = self._analyze(statement, info.fingerprint)
+        self.verdicts.put(key, verdict)
+        return verdict
+
+    def check(self, query: Any, vars: Any = None, cursor: Any = None) -> Verdict:
+        key = query if isinstance(query, (str, bytes)) else None
+        if key is None and cursor is None:
+            raise ValueError("Для проверки составного запроса (psycopg2.sql.Composed) нужен курсор")
+        with self._lock:
+            self.checks += 1
+        verdict = self.verdicts.get(key) if key is not None else None
+        if verdict is None:
+            verdict = self._miss(key, query, vars, cursor)
+        if verdict.violation:
+            with self._lock:
+                self.violations += 1
+            self._violation(query, verdict)
+        return verdict
+
+    def _violation(self, query: Any, verdict: Verdict):
+        text = query if isinstance(query, str) else str(query)
+        if self.on_violation is not None:
+            self.on_violation(text, verdict)
+        if self.mode == 'block':
+            raise QueryBlocked(text, verdict)
+        logger.warning("T1 PgQueryGuard: %s: %s", verdict.reason, text[:200])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                'checks': self.checks,
+                'skipped': self.skipped,
+                'multi_statement': self.multi_statement,
+                'sampled_out': self.sampled_out,
+                'analyzed': self.analyzed,
+                'violations': self.violations,
+                'errors': self.errors,
+            }
+        stats['cache'] = self.verdicts.stats()
+        return stats
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+def guarded_cursor_factory(guard: QueryGuard, base: Optional[type] = None) -> type:
+    import psycopg2.extensions
+
+    class GuardedCursor(base or psycopg2.extensions.cursor):
+        def execute(self, query, vars=None):
+            guard.check(query, vars, self)
+            return super().execute(query, vars)
+
+        def executemany(self, query, vars_list):
+            vars_list = list(vars_list)
+            guard.check(query, vars_list[0] if vars_list else None, self)
+            return super().executemany(query, vars_list)
+
+    return GuardedCursor
+
+
+def guard_connection(connection: Any, guard: QueryGuard) -> Any:
+    connection.cursor_factory = guarded_cursor_factory(guard, connection.cursor_factory)
+    return connection
@@ -0,0 +1,146 @@
+import difflib
+import sqlite3
+import threading
+import time
+from typing import List, NamedTuple, Optional
+from .models import PlanChangeRecord
+from .plan_tree import structural_hash
+
+
+HISTORY_SCHEMA = """
+PRAGMA journal_mode = WAL;
+PRAGMA synchronous = NORMAL;
+CREATE TABLE IF NOT EXISTS plan (
+    hash TEXT PRIMARY KEY,
+    outline TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS plan_current (
+    fingerprint TEXT NOT NULL,
+    environment TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    total_cost REAL NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    seen INTEGER NOT NULL,
+    PRIMARY KEY (fingerprint, environment)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS plan_version (
+    id INTEGER PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    environment TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    previous_hash TEXT,
+    total_cost REAL NOT NULL,
+    previous_cost REAL,
+    seen_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS plan_version_query ON plan_version (fingerprint, environment, id);
+CREATE INDEX IF NOT EXISTS plan_version_seen ON plan_version (seen_at);
+"""
+
+
+class PlanVersion(NamedTuple):
+    fingerprint: str
+    environment: str
+    plan_hash: str
+    previous_hash: Optional[str]
+    total_cost: float
+    previous_cost: Optional[float]
+    seen_at: float
+
+
+def outline_diff(old: List[str], new: List[str], old_label: str = 'было', new_label: str = 'стало') -> List[str]:
+    return list(difflib.unified_diff(old, new, old_label, new_label, lineterm='', n=1))
+
+
+class PlanHistory:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=30.0)
+        self.connection.executescript(HISTORY_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+    def _outline(self, plan_hash: str) -> List[str]:
+        row = self.connection.execute("SELECT outline FROM plan WHERE hash = ?", (plan_hash,)).fetchone()
+        return row[0].split('\n') if row else []
+
+    def outline(self, plan_hash: str) -> List[str]:
+        with self._lock:
+            return self._outline(plan_hash)
+
+    def record(self, fingerprint: str, environment: Optional[str], outline: List[str],
+               total_cost: float, plan_hash: Optional[str] = None) -> Optional[PlanChangeRecord]:
+        plan_hash = plan_hash or structural_hash(outline)
+        environment = environment or ''
+        now = time.time()
+
+        with self._lock, self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            current = self.connection.execute(
+                "SELECT hash, total_cost, last_seen FROM plan_current WHERE fingerprint = ? AND environment = ?",
+                (fingerprint, environment)
+            ).fetchone()
+
+            if current is not None and current[0] == plan_hash:
+                self.connection.execute(
+                    "UPDATE plan_current SET total_cost = ?, last_seen = ?, seen = seen + 1 "
+                    "WHERE fingerprint = ? AND environment = ?",
+                    (total_cost, now, fingerprint, environment)
+                )
+                return None
+
+            self.connection.execute(
+                "INSERT OR IGNORE INTO plan (hash, outline) VALUES (?, ?)", (plan_hash, '\n'.join(outline))
+            )
+            self.connection.execute(
+                "INSERT OR REPLACE INTO plan_current "
+                "(fingerprint, environment, hash, total_cost, first_seen, last_seen, seen) VALUES (?, ?, ?, ?, ?, ?, 1)",
+                (fingerprint, environment, plan_hash, total_cost, now, now)
+            )
+            previous_hash, previous_cost, previous_seen = current if current is not None else (None, None, None)
+            self.connection.execute(
+                "INSERT INTO plan_version "
+                "(fingerprint, environment, hash, previous_hash, total_cost, previous_cost, seen_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (fingerprint, environment, plan_hash, previous_hash, total_cost, previous_cost, now)
+            )
+            if current is None:
+                return None
+            previous_outline = self._outline(previous_hash)
+
+        return PlanChangeRecord(
+            previous_hash=previous_hash,
+            plan_hash=plan_hash,
+            previous_cost=previous_cost,
+            cost_delta=total_cost - previous_cost,
+            cost_delta_pct=(total_cost - previous_cost) / previous_cost * 100 if previous_cost else None,
+            previous_seen_at=previous_seen,
+            diff=outline_diff(previous_outline, outline)
+        )
+
+    def versions(self, fingerprint: str, environment: Optional[str] = None, limit: int = 20) -> List[PlanVersion]:
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT fingerprint, environment, hash, previous_hash, total_cost, previous_cost, seen_at "
+                "FROM plan_version WHERE fingerprint = ? AND environment = ? ORDER BY id DESC LIMIT ?",
+                (fingerprint, environment or '', limit)
+            ).fetchall()
+        return [PlanVersion(*row) for row in rows]
+
+    def recent_changes(self, since: Optional[float] = None, limit: int = 20) -> List[PlanVersion]:
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT fingerprint, environment, hash, previous_hash, total_cost, previous_cost, seen_at "
+                "FROM plan_version WHERE previous_hash IS NOT NULL AND seen_at >= ? ORDER BY seen_at DESC LIMIT ?",
+                (since or 0.0, limit)
+            ).fetchall()
+        return [PlanVersion(*row) for row in rows]
+
+    def diff(self, version: PlanVersion) -> List[str]:
+        if version.previous_hash is None:
+            return []
+        return outline_diff(self.outline(version.previous_hash), self.outline(version.plan_hash))
@@ -0,0 +1,257 @@
+import hashlib
+import re
+from typing import Dict, List, NamedTuple
+
+
+# Every pattern applied to the full query text starts with a literal or a character
+# class, so the regex engine skips uninteresting characters in C instead of trying
+# each alternative at every position.
+_PROTECTED = re.compile(r"""'[^']*(?:''[^']*)*'?|"[^"]*(?:""[^"]*)*"?|--[^\n]*|/\*|\$(?:[A-Za-z_]\w*)?\$""")
+_ESTRING = re.compile(r"""[Ee]'[^'\\]*(?:(?:\\.|'')[^'\\]*)*'?""", re.S)
+_ESTRING_START = re.compile(r"""E(?<![\w$]E)'|e(?<![\w$]e)'""")
+_PARAM = re.compile(r'\$(\d+)')
+_NUMBER = re.compile(r'[0-9](?<![\w$.][0-9])[0-9]*(?:\.[0-9]*)?(?:[Ee][+-]?[0-9]+)?')
+_IN_LIST_START = re.compile(r'in(?<![\w$]in)\s*\(')
+_VALUES_START = re.compile(r'values(?<![\w$]values)\s*\(')
+_LITERAL_CHARS = '0123456789?$,.+-e \t\n\r\f\v'
+_PLACEHOLDER = re.compile(r'"q([a-z]+)"')
+
+_IDENT = r'(?:"q[a-z]+"|[a-z_][\w$]*)'
+_IDENT_RE = re.compile(_IDENT)
+_QUALIFIED = rf'{_IDENT}(?: ?\. ?{_IDENT}){{0,2}}'
+_FROM_ITEM_TAIL = r'(?: ?\([^()]*\))?(?: (?:as )?[a-z_][\w$]*)?'
+_FROM_LIST = re.compile(
+    rf'from(?<![\w$]from)(?<!distinct from) ?(?:(?:only|lateral) )?({_QUALIFIED})'
+    rf'({_FROM_ITEM_TAIL}(?: ?, ?(?:(?:only|lateral) )?{_QUALIFIED}{_FROM_ITEM_TAIL})*)'
+)
+_NEXT_RELATION = re.compile(rf', ?(?:(?:only|lateral) )?({_QUALIFIED})')
+_RELATION_REFS = (
+    _FROM_LIST,
+    re.compile(rf'join(?<![\w$]join) ?(?:(?:only|lateral) )?({_QUALIFIED})'),
+    re.compile(rf'into(?<![\w$]into) ({_QUALIFIED})'),
+    re.compile(rf'update(?<![\w$]update) (?:only )?({_QUALIFIED})'),
+)
+_CALL_FROM = re.compile(rf'(?:extract|substring|trim|overlay) ?\([^()]*?from ?({_IDENT})')
+_STATEMENT = re.compile(r'(?:s(?<![\w$]s)elect|i(?<![\w$]i)nsert|u(?<![\w$]u)pdate|d(?<![\w$]d)elete|m(?<![\w$]m)erge)(?![\w$])')
+_LEADING_WORD = re.compile(r'[( ]*([a-z]+)')
+_CTE_FIRST = re.compile(rf' ?(?:recursive )?({_IDENT})')
+_CTE_NEXT = re.compile(rf'\) ?, ?({_IDENT}) ?(?:\([^()]*\) ?)?as(?![\w$])')
+_OPERATIONS = (
+    ('FILTER', re.compile(r'where(?<![\w$]where)(?![\w$])')),
+    ('SORT', re.compile(r'order(?<![\w$]order) by(?![\w$])')),
+    ('AGGREGATE', re.compile(r'group(?<![\w$]group) by(?![\w$])')),
+    ('JOIN', re.compile(r'join(?<![\w$]join)(?![\w$])')),
+    ('LIMIT', re.compile(r'limit(?<![\w$]limit)(?![\w$])')),
+)
+
+_NOT_RELATIONS = frozenset(('select', 'values', 'with', 'lateral', 'only', 'set', 'default', 'table', 'of', 'nowait', 'skip'))
+
+
+class QueryInfo(NamedTuple):
+    type: str
+    tables: List[str]
+    ctes: List[str]
+    operations: List[str]
+    fingerprint: str
+    normalized: str
+    max_param: int
+
+
+def skip_block_comment(sql: str, pos: int) -> int:
+    depth = 1
+    while depth:
+        close = sql.find('*/', pos)
+        if close < 0:
+            return len(sql)
+        opened = sql.find('/*', pos, close)
+        if opened >= 0:
+            depth += 1
+            pos = opened + 2
+        else:
+            depth -= 1
+            pos = close + 2
+    return pos
+
+
+def normalize_identifier(ident: str) -> str:
+    if ident.startswith('"'):
+        return ident[1:-1].replace('""', '"')
+    return ident.lower()
+
+
+def _placeholder(index: int) -> str:
+    letters = []
+    while True:
+        index, rest = divmod(index, 26)
+        letters.append(chr(97 + rest))
+        if not index:
+            return '"q%s"' % ''.join(letters)
+
+
+def _placeholder_index(letters: str) -> int:
+    index = 0
+    for letter in reversed(letters):
+        index = index * 26 + ord(letter) - 97
+    return index
+
+
+def _mask_protected(sql: str, idents: List[str]) -> str:
+    if not ('"' in sql or '$' in sql or '--' in sql or '/*' in sql or
+            ("e'" in sql or "E'" in sql) and _ESTRING_START.search(sql)):
+        if "'" not in sql:
+            return sql
+        # Only standard strings are left: every even piece between quotes is SQL text,
+        # and doubled quotes inside a literal leave adjacent placeholders to merge.
+        pieces = sql.split("'")
+        text = '?'.join(pieces[0::2])
+        if not len(pieces) % 2:
+            text += '?'
+        while '??' in text:
+            text = text.replace('??', '?')
+        return text
+
+    parts = []
+    pos = 0
+    while True:
+        match = _PROTECTED.search(sql, pos)
+        if match is None:
+            break
+        start, end = match.span()
+        token = match.group()
+        first = token[0]
+        if first == "'" and start and sql[start - 1] in 'Ee' and (start < 2 or not (sql[start - 2].isalnum() or sql[start - 2] in '_$')):
+            start -= 1
+            end = _ESTRING.match(sql, start).end()
+            first = 'E'
+        parts.append(sql[pos:start])
+
+        if first == '"':
+            parts.append(_placeholder(len(idents)))
+            idents.append(token)
+        elif first == '-':
+            parts.append(' ')
+        elif first == '/':
+            end = skip_block_comment(sql, end)
+            parts.append(' ')
+        elif first == '$':
+            close = sql.find(token, end)
+            end = len(sql) if close < 0 else close + len(token)
+            parts.append('?')
+        else:
+            parts.append('?')
+        pos = end
+
+    parts.append(sql[pos:])
+    return ''.join(parts)
+
+
+def _fold_literal_lists(text: str) -> str:
+    parts = []
+    pos = 0
+    starts = list(_IN_LIST_START.finditer(text))
+    if 'values' in text:
+        starts.extend(_VALUES_START.finditer(text))
+        starts.sort(key=lambda match: match.start())
+
+    for match in starts:
+        start, opened = match.start(), match.end()
+        if start < pos:
+            continue
+        if text[start] == 'i':
+            end = text.find(')', opened) + 1
+            if not end or text[opened:end - 1].strip(_LITERAL_CHARS):
+                continue
+            replacement = 'in (?)'
+        else:
+            tail = text[opened - 1:]
+            end = opened - 1 + len(tail) - len(tail.lstrip(_LITERAL_CHARS + '()'))
+            end = text.rfind(')', opened, end) + 1
+            if not end or text.count('(', opened, end) + 1 != text.count(')', opened, end):
+                continue
+            replacement = 'values (?)'
+        parts.append(text[pos:start])
+        parts.append(replacement)
+        pos = end
+
+    if not parts:
+        return text
+    parts.append(text[pos:])
+    return ''.join(parts)
+
+
+def _depth(text: str, end: int, start: int = 0) -> int:
+    return text.count('(', start, end) - text.count(')', start, end)
+
+
+def scan_query(sql: str) -> QueryInfo:
+    idents: List[str] = []
+    text = _mask_protected(sql, idents)
+
+    max_param = 0
+    if '$' in text:
+        max_param = max(map(int, _PARAM.findall(text)), default=0)
+    text = _fold_literal_lists(text.lower())
+    if '$' in text:
+        text = _PARAM.sub('?', text)
+    text = _NUMBER.sub('?', text)
+    if '  ' in text or '\n' in text or '\t' in text or '\r' in text or '\f' in text or '\v' in text:
+        text = ' '.join(text.split())
+    text = text.strip().rstrip(';').rstrip()
+
+    names: Dict[str, str] = {}
+
+    def relation_name(ref: str) -> str:
+        name = names.get(ref)
+        if name is None:
+            name = names[ref] = '.'.join(
+                normalize_identifier(idents[_placeholder_index(part[2:-1])] if part.startswith('"') else part)
+                for part in _IDENT_RE.findall(ref)
+            )
+        return name
+
+    statement_type = 'UNKNOWN'
+    ctes: Dict[str, None] = {}
+    leading = _LEADING_WORD.match(text)
+    first_word = leading.group(1) if leading else ''
+    if first_word == 'with':
+        cte = _CTE_FIRST.match(text, leading.end())
+        if cte:
+            ctes[relation_name(cte.group(1))] = None
+        depth = 0
+        last = leading.end()
+        for statement in _STATEMENT.finditer(text, leading.end()):
+            depth += _depth(text, statement.start(), last)
+            last = statement.start()
+            if depth == 0:
+                for cte in _CTE_NEXT.finditer(text, leading.end(), statement.start()):
+                    ctes[relation_name(cte.group(1))] = None
+                statement_type = statement.group().upper()
+                break
+    elif first_word in ('select', 'insert', 'update', 'delete', 'merge'):
+        statement_type = first_word.upper()
+
+    targets: Dict[str, None] = {}
+    for target, tail in dict.fromkeys(_FROM_LIST.findall(text)):
+        targets[target] = None
+        if ',' in tail:
+            targets.update(dict.fromkeys(_NEXT_RELATION.findall(tail)))
+    for pattern in _RELATION_REFS[1:]:
+        targets.update(dict.fromkeys(pattern.findall(text)))
+    if any(name in text for name in ('extract', 'substring', 'trim', 'overlay')):
+        for target in _CALL_FROM.findall(text):
+            targets.pop(target, None)
+    relations = dict.fromkeys(relation_name(target) for target in targets if target not in _NOT_RELATIONS)
+
+    operations = [operation for operation, pattern in _OPERATIONS if pattern.search(text)]
+    if idents:
+        text = _PLACEHOLDER.sub(lambda m: idents[_placeholder_index(m.group(1))], text)
+
+    return QueryInfo(
+        type=statement_type,
+        tables=[name for name in relations if name not in ctes],
+        ctes=list(ctes),
+        operations=operations,
+        fingerprint=hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest(),
+        normalized=text,
+        max_param=max_param,
+    )
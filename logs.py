@@ -0,0 +1,222 @@
+import csv
+import gzip
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Any, Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+
+MAX_ENTRY_BYTES = 32 * 1024 * 1024
+CHECKPOINT_BYTES = 1024 * 1024
+CSVLOG_MESSAGE_FIELD = 13
+
+_PLAN_MARKER = re.compile(r'duration: ([0-9.]+) ms {1,2}plan:\s*')
+_PLAN_MARKER_BYTES = re.compile(rb'duration: ([0-9.]+) ms {1,2}plan:')
+
+
+class LogPlan(NamedTuple):
+    source: str
+    offset: int
+    duration: Optional[float]
+    query: str
+    plan: Any
+
+
+def detect_format(path: str) -> str:
+    name = os.path.basename(path).lower()
+    if '.csv' in name:
+        return 'csvlog'
+    if '.json' in name:
+        return 'jsonlog'
+    return 'stderr'
+
+
+def open_log(path: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def log_identity(path: str) -> Optional[str]:
+    with open_log(path) as f:
+        first_line = f.readline(4096)
+    if not first_line.endswith(b'\n'):
+        return None
+    return hashlib.blake2b(first_line, digest_size=8).hexdigest()
+
+
+def parse_plan_message(message: str) -> Optional[Tuple[Optional[float], str, Any]]:
+    match = _PLAN_MARKER.search(message)
+    if match is None:
+        return None
+    try:
+        document = json.loads(message[match.end():])
+    except ValueError:
+        return None
+    if not isinstance(document, dict) or not isinstance(document.get('Plan'), dict):
+        return None
+    return float(match.group(1)), document.get('Query Text', ''), [document]
+
+
+def _iter_records(f, offset: int, log_format: str) -> Iterator[Tuple[int, bytes]]:
+    record = []
+    size = 0
+    quotes = 0
+    for line in f:
+        offset += len(line)
+        if log_format == 'csvlog':
+            size += len(line)
+            if size <= MAX_ENTRY_BYTES:
+                record.append(line)
+            quotes += line.count(b'"')
+            if quotes % 2 == 0:
+                if size <= MAX_ENTRY_BYTES:
+                    yield offset, b''.join(record)
+                record = []
+                size = 0
+                quotes = 0
+        elif line.endswith(b'\n'):
+            yield offset, line
+
+
+def _iter_stderr_plans(records: Iterable[Tuple[int, bytes]], checkpoint: int) -> Iterator[Tuple[int, Optional[str]]]:
+    entry = None
+    size = 0
+    indented = False
+    last_offset = checkpoint
+    for offset, line in records:
+        if entry is not None and indented and not line.startswith(b'\t'):
+            yield last_offset, b''.join(entry).decode('utf-8', errors='replace')
+            entry = None
+
+        marker = _PLAN_MARKER_BYTES.search(line)
+        if marker is not None:
+            entry = [line[marker.start():]]
+            size = len(line)
+            indented = False
+            last_offset = offset
+            continue
+        last_offset = offset
+        if entry is None:
+            if offset - checkpoint >= CHECKPOINT_BYTES:
+                checkpoint = offset
+                yield offset, None
+            continue
+
+        if len(entry) == 1:
+            if not line.strip():
+                continue
+            indented = line.startswith(b'\t')
+        if indented:
+            line = line[1:]
+        if len(entry) == 1 and not line.lstrip().startswith(b'{'):
+            entry = None
+            continue
+
+        entry.append(line)
+        size += len(line)
+        if size > MAX_ENTRY_BYTES:
+            entry = None
+        elif line.startswith(b'}') or len(entry) == 2 and line.rstrip().endswith(b'}'):
+            yield offset, b''.join(entry).decode('utf-8', errors='replace')
+            entry = None
+
+
+def iter_log_messages(f, offset: int, log_format: str) -> Iterator[Tuple[int, Optional[str]]]:
+    records = _iter_records(f, offset, log_format)
+    if log_format == 'stderr':
+        yield from _iter_stderr_plans(records, offset)
+        return
+
+    checkpoint = offset
+    for end, record in records:
+        if b'plan:' not in record:
+            if end - checkpoint >= CHECKPOINT_BYTES:
+                checkpoint = end
+                yield end, None
+            continue
+        text = record.decode('utf-8', errors='replace')
+        if log_format == 'csvlog':
+            row = next(csv.reader([text]), None)
+            if row and len(row) > CSVLOG_MESSAGE_FIELD:
+                yield end, row[CSVLOG_MESSAGE_FIELD]
+        else:
+            try:
+                yield end, json.loads(text).get('message', '')
+            except ValueError:
+                continue
+
+
+class LogState:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.offsets: Dict[str, int] = {}
+
+    def load(self) -> 'LogState':
+        if self.path and os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.offsets = json.load(f).get('offsets', {})
+        return self
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'offsets': self.offsets}, f)
+        os.replace(tmp_path, self.path)
+
+
+def _read_log(path: str, identity: str, state: LogState, follow: bool,
+              poll_interval: float) -> Iterator[LogPlan]:
+    log_format = detect_format(path[:-3] if path.endswith('.gz') else path)
+    offset = state.offsets.get(identity, 0)
+
+    with open_log(path) as f:
+        if offset:
+            f.seek(offset)
+        inode = os.fstat(f.fileno()).st_ino
+
+        rotated = False
+        while True:
+            for end, message in iter_log_messages(f, offset, log_format):
+                parsed = parse_plan_message(message) if message is not None else None
+                if parsed is not None:
+                    duration, query, plan = parsed
+                    yield LogPlan(path, end, duration, query, plan)
+                offset = state.offsets[identity] = end
+
+            if not follow or rotated:
+                return
+            try:
+                rotated = os.stat(path).st_ino != inode
+            except FileNotFoundError:
+                rotated = True
+            if not rotated:
+                time.sleep(poll_interval)
+            f.seek(offset)
+
+
+def iter_log_plans(path: str, state: LogState, follow: bool = False,
+                   poll_interval: float = 1.0) -> Iterator[LogPlan]:
+    follow = follow and not path.endswith('.gz')
+    while True:
+        identity = log_identity(path) if os.path.exists(path) else None
+        if identity is not None:
+            yield from _read_log(path, identity, state, follow, poll_interval)
+        if not follow:
+            return
+        if identity is None:
+            time.sleep(poll_interval)
+
+
+def iter_logs(paths: Iterable[str], state: LogState, follow: bool = False,
+              poll_interval: float = 1.0) -> Iterator[LogPlan]:
+    paths = sorted(paths, key=lambda p: os.stat(p).st_mtime)
+    for index, path in enumerate(paths):
+        try:
+            yield from iter_log_plans(path, state, follow and index == len(paths) - 1, poll_interval)
+        finally:
+            state.save()
@@ -1,9 +1,9 @@
 import sys
 from .cli import app
-from .demo import demo_analysis
 
 if __name__ == "__main__":
     if len(sys.argv) == 1:
+        from .demo import demo_analysis
         demo_analysis()
     else:
         app()
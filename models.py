@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import List, Optional
+from typing import Any, List, NamedTuple, Optional, Union
 from pydantic import BaseModel, Field
 from datetime import datetime
 
@@ -30,6 +30,37 @@ class QueryMetric(BaseModel):
     startup_cost: float = Field(..., description="Стоимость запуска")
     total_workers: int = Field(0, description="Общее количество воркеров")
     parallel_workers: int = Field(0, description="Количество параллельных воркеров")
+    execution_time: Optional[float] = Field(None, description="Фактическое время выполнения (мс, EXPLAIN ANALYZE)")
+    actual_rows: Optional[int] = Field(None, description="Фактическое количество строк (EXPLAIN ANALYZE)")
+    misestimated_nodes: int = Field(0, description="Узлы с ошибкой оценки строк в 10 раз и более")
+
+class NodeActual(BaseModel):
+    node_type: str = Field(..., description="Тип узла")
+    relation: Optional[str] = Field(None, description="Таблица узла")
+    depth: int = Field(..., description="Глубина узла в плане")
+    estimated_rows: int = Field(..., description="Оценка строк планировщиком (на цикл)")
+    actual_rows: float = Field(..., description="Фактическое количество строк (на цикл)")
+    loops: int = Field(..., description="Количество циклов")
+    row_error: float = Field(..., description="Во сколько раз ошиблась оценка строк")
+    exclusive_time: float = Field(..., description="Собственное время узла без дочерних (мс)")
+    time_share: float = Field(..., description="Доля узла во времени выполнения (0-1)")
+    shared_hit_blocks: int = Field(0, description="Блоки из кэша")
+    shared_read_blocks: int = Field(0, description="Блоки с диска")
+
+class NodeCost(BaseModel):
+    node_index: int = Field(..., description="Номер узла в порядке обхода плана")
+    node_type: str = Field(..., description="Тип узла")
+    relation: Optional[str] = Field(None, description="Таблица узла")
+    index_name: Optional[str] = Field(None, description="Индекс узла")
+    depth: int = Field(..., description="Глубина узла в плане")
+    total_cost: float = Field(..., description="Стоимость узла вместе с дочерними")
+    exclusive_cost: float = Field(..., description="Собственная стоимость узла без дочерних")
+    cost_share: float = Field(..., description="Доля узла в стоимости плана (0-1)")
+    plan_rows: int = Field(0, description="Оценочное количество строк узла")
+    exclusive_time: Optional[float] = Field(None, description="Собственное время узла (мс, EXPLAIN ANALYZE)")
+    time_share: Optional[float] = Field(None, description="Доля узла во времени выполнения (0-1, EXPLAIN ANALYZE)")
+    shared_hit_blocks: int = Field(0, description="Собственные блоки из кэша")
+    shared_read_blocks: int = Field(0, description="Собственные блоки с диска")
 
 class Recommendation(BaseModel):
     type: str = Field(..., description="Тип рекомендации")
@@ -41,6 +72,27 @@ class Recommendation(BaseModel):
     t1_service: Optional[T1CloudService] = Field(None, description="Связанный сервис T1 Cloud")
     impact_score: int = Field(..., description="Влияние на производительность (1-10)")
 
+class IndexSuggestion(BaseModel):
+    table: str = Field(..., description="Таблица")
+    columns: List[str] = Field(..., description="Ключевые столбцы индекса")
+    include: List[str] = Field(default_factory=list, description="Неключевые столбцы (INCLUDE)")
+    definition: str = Field(..., description="Команда создания индекса")
+    size_bytes: int = Field(..., description="Размер индекса после построения (байт)")
+    benefit: float = Field(..., description="Снижение суммарной стоимости нагрузки с учетом частоты запросов")
+    queries: int = Field(..., description="Запросов, для которых предложен индекс")
+    improved_queries: int = Field(..., description="Запросов, план которых стал дешевле")
+    cost_before: float = Field(..., description="Суммарная стоимость затронутых запросов без индекса")
+    cost_after: float = Field(..., description="Суммарная стоимость затронутых запросов с индексом")
+
+class PlanChange(BaseModel):
+    previous_hash: str = Field(..., description="Структурный хэш предыдущего плана")
+    plan_hash: str = Field(..., description="Структурный хэш текущего плана")
+    previous_cost: float = Field(..., description="Стоимость предыдущего плана")
+    cost_delta: float = Field(..., description="Изменение стоимости")
+    cost_delta_pct: Optional[float] = Field(None, description="Изменение стоимости (%)")
+    previous_seen_at: Optional[float] = Field(None, description="Когда предыдущий план встречался последний раз (unix time)")
+    diff: List[str] = Field(default_factory=list, description="Разница структуры планов (unified diff)")
+
 class AnalysisReport(BaseModel):
     query: str = Field(..., description="Анализируемый запрос")
     metrics: QueryMetric = Field(..., description="Метрики производительности")
@@ -53,3 +105,93 @@ class AnalysisReport(BaseModel):
     tables_affected: List[str] = Field(..., description="Затронутые таблицы")
     indexes_used: List[str] = Field(..., description="Используемые индексы")
     warnings: List[str] = Field(..., description="Предупреждения")
+    node_actuals: List[NodeActual] = Field(default_factory=list, description="Фактические показатели узлов (EXPLAIN ANALYZE)")
+    hot_nodes: List[NodeCost] = Field(default_factory=list, description="Самые затратные узлы плана по собственной стоимости/времени")
+    plan_hash: Optional[str] = Field(None, description="Структурный хэш плана (типы узлов, таблицы, индексы, порядок соединений)")
+    plan_change: Optional[PlanChange] = Field(None, description="Изменение плана относительно истории")
+
+
+class MetricRecord(NamedTuple):
+    total_cost: float
+    planning_time: Optional[float]
+    max_execution_time: float
+    shared_hit_blocks: int
+    shared_read_blocks: int
+    plan_width: int
+    total_rows: int
+    node_types: List[str]
+    startup_cost: float
+    total_workers: int
+    parallel_workers: int
+    execution_time: Optional[float]
+    actual_rows: Optional[int]
+    misestimated_nodes: int
+
+class NodeActualRecord(NamedTuple):
+    node_type: str
+    relation: Optional[str]
+    depth: int
+    estimated_rows: int
+    actual_rows: float
+    loops: int
+    row_error: float
+    exclusive_time: float
+    time_share: float
+    shared_hit_blocks: int
+    shared_read_blocks: int
+
+class NodeCostRecord(NamedTuple):
+    node_index: int
+    node_type: str
+    relation: Optional[str]
+    index_name: Optional[str]
+    depth: int
+    total_cost: float
+    exclusive_cost: float
+    cost_share: float
+    plan_rows: int
+    exclusive_time: Optional[float]
+    time_share: Optional[float]
+    shared_hit_blocks: int
+    shared_read_blocks: int
+
+class RecommendationRecord(NamedTuple):
+    type: str
+    description: str
+    priority: Priority
+    estimated_improvement: str
+    suggested_action: str
+    affected_components: List[str]
+    t1_service: Optional[T1CloudService]
+    impact_score: int
+
+class PlanChangeRecord(NamedTuple):
+    previous_hash: str
+    plan_hash: str
+    previous_cost: float
+    cost_delta: float
+    cost_delta_pct: Optional[float]
+    previous_seen_at: Optional[float]
+    diff: List[str]
+
+class ReportRecord(NamedTuple):
+    query: str
+    metrics: MetricRecord
+    recommendations: List[RecommendationRecord]
+    is_critical: bool
+    score: int
+    analyzed_at: datetime
+    t1_environment: Optional[str]
+    query_type: str
+    tables_affected: List[str]
+    indexes_used: List[str]
+    warnings: List[str]
+    node_actuals: List[NodeActualRecord]
+    hot_nodes: List[NodeCostRecord]
+    plan_hash: Optional[str] = None
+    plan_change: Optional[PlanChangeRecord] = None
+
+def to_report(report: Union[AnalysisReport, ReportRecord, Any]) -> AnalysisReport:
+    if isinstance(report, AnalysisReport):
+        return report
+    return AnalysisReport.model_validate(report, from_attributes=True)
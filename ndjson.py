@@ -0,0 +1,195 @@
+import gzip
+import queue
+import sys
+import threading
+from typing import IO, Any, Callable, Dict, List, NamedTuple, Optional, Union, get_args, get_type_hints
+from pydantic import BaseModel
+from pydantic_core import to_json
+from .models import AnalysisReport, ReportRecord
+
+
+QUEUE_SIZE = 256
+GZIP_LEVEL = 1
+BUFFER_BYTES = 1024 * 1024
+
+FieldTree = Optional[Dict[str, Any]]
+
+
+def _nested_model(annotation: Any) -> Optional[type]:
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    for arg in get_args(annotation):
+        model = _nested_model(arg)
+        if model is not None:
+            return model
+    return None
+
+
+def field_tree(fields: List[str]) -> FieldTree:
+    if not fields:
+        return None
+    tree: Dict[str, Any] = {}
+    for field in fields:
+        model, node = AnalysisReport, tree
+        parts = field.strip().split('.')
+        for position, part in enumerate(parts):
+            if model is None or part not in model.model_fields:
+                raise ValueError(f"Неизвестное поле отчета: {field}")
+            last = position == len(parts) - 1
+            if last:
+                node[part] = None
+            elif node.get(part, {}) is None:
+                break
+            else:
+                node = node.setdefault(part, {})
+            model = _nested_model(model.model_fields[part].annotation)
+    return tree
+
+
+class _RecordFields(NamedTuple):
+    nested: List[int]
+    floats: List[int]
+    ints: List[int]
+    names: Dict[str, int]
+
+
+_RECORD_FIELDS: Dict[type, _RecordFields] = {}
+
+
+def _is_record(annotation: Any) -> bool:
+    if isinstance(annotation, type) and issubclass(annotation, tuple) and hasattr(annotation, '_fields'):
+        return True
+    return any(_is_record(arg) for arg in get_args(annotation))
+
+
+def _numeric_type(annotation: Any) -> Optional[type]:
+    if annotation in (int, float):
+        return annotation
+    args = [arg for arg in get_args(annotation) if arg is not type(None)]
+    return args[0] if len(args) == 1 and args[0] in (int, float) else None
+
+
+def _record_fields(cls: type) -> _RecordFields:
+    fields = _RECORD_FIELDS.get(cls)
+    if fields is None:
+        hints = get_type_hints(cls)
+        annotations = [hints[name] for name in cls._fields]
+        fields = _RECORD_FIELDS[cls] = _RecordFields(
+            [i for i, annotation in enumerate(annotations) if _is_record(annotation)],
+            [i for i, annotation in enumerate(annotations) if _numeric_type(annotation) is float],
+            [i for i, annotation in enumerate(annotations) if _numeric_type(annotation) is int],
+            {name: i for i, name in enumerate(cls._fields)},
+        )
+    return fields
+
+
+def _coerce(data: List[Any], fields: _RecordFields):
+    for i in fields.floats:
+        if type(data[i]) is int:
+            data[i] = float(data[i])
+    for i in fields.ints:
+        item = data[i]
+        if type(item) is float and item.is_integer():
+            data[i] = int(item)
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+    cls = type(value)
+    if not hasattr(cls, '_fields'):
+        return value
+    fields = _record_fields(cls)
+    data = list(value)
+    _coerce(data, fields)
+    for i in fields.nested:
+        if data[i] is not None:
+            data[i] = _plain(data[i])
+    return dict(zip(cls._fields, data))
+
+
+def _project(value: Any, tree: FieldTree) -> Any:
+    if tree is None:
+        return _plain(value)
+    if isinstance(value, list):
+        return [_project(item, tree) for item in value]
+    if value is None:
+        return None
+    if not hasattr(type(value), '_fields'):
+        return {name: _project(getattr(value, name), subtree) for name, subtree in tree.items()}
+    fields = _record_fields(type(value))
+    data = list(value)
+    _coerce(data, fields)
+    return {name: _project(data[fields.names[name]], subtree) for name, subtree in tree.items()}
+
+
+def _dumps() -> Callable[[Any], bytes]:
+    try:
+        import orjson
+    except ImportError:
+        return to_json
+    return orjson.dumps
+
+
+dumps = _dumps()
+
+
+def encode_report(report: Union[AnalysisReport, ReportRecord], fields: FieldTree = None) -> bytes:
+    if fields is None and isinstance(report, AnalysisReport):
+        return report.model_dump_json().encode('utf-8') + b'\n'
+    return dumps(_project(report, fields)) + b'\n'
+
+
+def open_output(path: Optional[str], compresslevel: int = GZIP_LEVEL) -> IO[bytes]:
+    if path is None or path == '-':
+        return sys.stdout.buffer
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wb', compresslevel=compresslevel)
+    return open(path, 'wb', buffering=BUFFER_BYTES)
+
+
+class NdjsonWriter:
+    def __init__(self, path: Optional[str] = None, fields: Optional[List[str]] = None,
+                 compresslevel: int = GZIP_LEVEL, queue_size: int = QUEUE_SIZE):
+        self.path = path
+        self.fields = field_tree(fields or [])
+        self.stream = open_output(path, compresslevel)
+        self.written = 0
+        self.error: Optional[BaseException] = None
+        self._queue: "queue.Queue[Optional[Union[AnalysisReport, ReportRecord]]]" = queue.Queue(queue_size)
+        self._thread = threading.Thread(target=self._run, name="t1-ndjson", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        stream, fields, reports = self.stream, self.fields, self._queue
+        interactive = stream is sys.stdout.buffer
+        while True:
+            report = reports.get()
+            if report is None:
+                break
+            if self.error is not None:
+                continue
+            try:
+                stream.write(encode_report(report, fields))
+                self.written += 1
+                if interactive and reports.empty():
+                    stream.flush()
+            except BaseException as e:
+                self.error = e
+
+    def write(self, report: Union[AnalysisReport, ReportRecord]):
+        if self.error is not None:
+            raise self.error
+        self._queue.put(report)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        try:
+            if self.stream is sys.stdout.buffer:
+                self.stream.flush()
+            else:
+                self.stream.close()
+        finally:
+            if self.error is not None:
+                raise self.error
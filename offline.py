@@ -0,0 +1,167 @@
+import json
+import os
+import re
+import tarfile
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+from .analyzer import T1PgQueryAnalyzer
+from .models import AnalysisReport, ReportRecord
+
+
+PLAN_EXTENSIONS = ('.json', '.log', '.txt')
+QUERY_EXTENSION = '.sql'
+
+_PLAN_START = re.compile(r'\[\s*\{\s*"Plan"|\{\s*"(?:Query Text|Plan)"')
+
+
+class OfflineResult(NamedTuple):
+    source: str
+    index: int
+    report: Optional[Union[AnalysisReport, ReportRecord]]
+    error: Optional[str]
+
+
+def extract_plans(text: str, errors: Optional[List[Tuple[int, str]]] = None) -> List[Tuple[str, Any]]:
+    decoder = json.JSONDecoder()
+    plans = []
+    pos = 0
+    while True:
+        match = _PLAN_START.search(text, pos)
+        if match is None:
+            break
+        try:
+            document, pos = decoder.raw_decode(text, match.start())
+        except ValueError as e:
+            if errors is not None and text[match.start()] == '{':
+                errors.append((match.start(), str(e)))
+            pos = match.start() + 1
+            continue
+
+        for item in document if isinstance(document, list) else [document]:
+            if isinstance(item, dict) and isinstance(item.get('Plan'), dict):
+                plans.append((item.get('Query Text', ''), [item]))
+    return plans
+
+
+def split_plan_texts(text: str) -> List[Tuple[int, str]]:
+    starts = [match.start() for match in _PLAN_START.finditer(text)]
+    return [(start, text[start:end]) for start, end in zip(starts, starts[1:] + [len(text)])]
+
+
+def _read_text(path: str) -> str:
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+
+def _iter_directory(path: str) -> Iterator[Tuple[str, str, str]]:
+    for root, _, files in os.walk(path):
+        for filename in sorted(files):
+            stem, ext = os.path.splitext(filename)
+            if ext.lower() not in PLAN_EXTENSIONS:
+                continue
+            query_path = os.path.join(root, stem + QUERY_EXTENSION)
+            query = _read_text(query_path) if os.path.exists(query_path) else ''
+            yield os.path.join(root, filename), _read_text(os.path.join(root, filename)), query
+
+
+def _iter_tarball(path: str) -> Iterator[Tuple[str, str, str]]:
+    with tarfile.open(path, 'r:*') as tar:
+        queries = {
+            os.path.splitext(member.name)[0]: tar.extractfile(member).read().decode('utf-8', errors='replace')
+            for member in tar
+            if member.isfile() and member.name.lower().endswith(QUERY_EXTENSION)
+        }
+    with tarfile.open(path, 'r:*') as tar:
+        for member in tar:
+            stem, ext = os.path.splitext(member.name)
+            if member.isfile() and ext.lower() in PLAN_EXTENSIONS:
+                text = tar.extractfile(member).read().decode('utf-8', errors='replace')
+                yield member.name, text, queries.get(stem, '')
+
+
+def iter_plan_documents(source: str) -> Iterator[Tuple[str, str, str]]:
+    if os.path.isdir(source):
+        return _iter_directory(source)
+    if not os.path.isfile(source):
+        raise ValueError(f"Источник планов не найден: {source}")
+    if tarfile.is_tarfile(source):
+        return _iter_tarball(source)
+    query_path = os.path.splitext(source)[0] + QUERY_EXTENSION
+    query = _read_text(query_path) if os.path.exists(query_path) else ''
+    return iter([(source, _read_text(source), query)])
+
+
+_worker_analyzer: Optional[T1PgQueryAnalyzer] = None
+
+
+def _init_worker(t1_environment: Optional[str], history_path: Optional[str] = None):
+    global _worker_analyzer
+    plan_history = None
+    if history_path:
+        from .history import PlanHistory
+        plan_history = PlanHistory(history_path)
+    _worker_analyzer = T1PgQueryAnalyzer(None, t1_environment, plan_history=plan_history)
+
+
+def _analyze_chunk(chunk: List[Tuple[str, int, int, str, str]]) -> List[OfflineResult]:
+    results = []
+    for name, index, offset, text, query in chunk:
+        try:
+            errors = []
+            for plan_query, plan in extract_plans(text, errors):
+                report = _worker_analyzer.build_report(plan, plan_query or query)
+                results.append(OfflineResult(name, index, report, None))
+            for start, error in errors:
+                results.append(OfflineResult(name, index, None, f"некорректный JSON плана (смещение {offset + start}): {error}"))
+        except Exception as e:
+            results.append(OfflineResult(name, index, None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def _chunks(documents: Iterable[Tuple[str, str, str]], chunk_size: int) -> Iterator[List[Tuple[str, int, int, str, str]]]:
+    chunk = []
+    for name, text, query in documents:
+        for index, (offset, plan_text) in enumerate(split_plan_texts(text)):
+            chunk.append((name, index, offset, plan_text, query.strip()))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def analyze_offline(
+        source: str,
+        workers: Optional[int] = None,
+        chunk_size: int = 16,
+        t1_environment: Optional[str] = None,
+        history_path: Optional[str] = None
+) -> Iterator[OfflineResult]:
+    if chunk_size < 1:
+        raise ValueError("Размер пакета должен быть не меньше 1")
+    workers = workers or os.cpu_count() or 1
+    chunks = _chunks(iter_plan_documents(source), chunk_size)
+
+    if workers == 1:
+        _init_worker(t1_environment, history_path)
+        for chunk in chunks:
+            yield from _analyze_chunk(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(t1_environment, history_path)) as executor:
+        pending: Dict[Future, None] = {}
+
+        def drain():
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                del pending[future]
+                yield from future.result()
+
+        for chunk in chunks:
+            if len(pending) >= workers * 2:
+                yield from drain()
+            pending[executor.submit(_analyze_chunk, chunk)] = None
+
+        while pending:
+            yield from drain()
@@ -0,0 +1,113 @@
+import json
+import os
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from .lexer import scan_query
+
+
+PGSS_ORDER_COLUMNS = {
+    'total': 4,
+    'mean': 5,
+    'calls': 3,
+}
+
+PGSS_TOP_SQL = """
+SELECT queryid, min(query), sum(calls)::bigint,
+       sum({total})::float8, (sum({total}) / nullif(sum(calls), 0))::float8
+FROM pg_stat_statements
+WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+  AND queryid IS NOT NULL
+GROUP BY queryid
+ORDER BY {order} DESC NULLS LAST
+LIMIT %s
+"""
+
+EXPLAINABLE_TYPES = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'MERGE')
+
+
+class StatementStat(NamedTuple):
+    queryid: str
+    query: str
+    calls: int
+    total_time: float
+    mean_time: float
+
+
+def fetch_top_statements(connection, limit: int = 50, order_by: str = 'total') -> List[StatementStat]:
+    if order_by not in PGSS_ORDER_COLUMNS:
+        raise ValueError(f"Неизвестная сортировка pg_stat_statements: {order_by}")
+    total_column = 'total_exec_time' if connection.server_version >= 130000 else 'total_time'
+    order = PGSS_ORDER_COLUMNS[order_by]
+
+    with connection.cursor() as cur:
+        cur.execute(PGSS_TOP_SQL.format(total=total_column, order=order), (limit,))
+        rows = cur.fetchall()
+
+    return [
+        StatementStat(str(queryid), query, calls or 0, total_time or 0.0, mean_time or 0.0)
+        for queryid, query, calls, total_time, mean_time in rows
+    ]
+
+
+def is_explainable(stat: StatementStat) -> bool:
+    if not stat.query or stat.query.startswith('<'):
+        return False
+    return scan_query(stat.query).type in EXPLAINABLE_TYPES
+
+
+class StatementState:
+    def __init__(self, path: str):
+        self.path = path
+        self.baselines: Dict[str, Dict[str, float]] = {}
+        self.taken_at: Optional[float] = None
+
+    def load(self) -> 'StatementState':
+        if not os.path.exists(self.path):
+            return self
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.baselines = data.get('statements', {})
+        self.taken_at = data.get('taken_at')
+        return self
+
+    def save(self, current: List[StatementStat]):
+        known = {stat.queryid for stat in current}
+        data = {
+            'taken_at': time.time(),
+            'statements': {queryid: baseline for queryid, baseline in self.baselines.items() if queryid in known},
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def mark_analyzed(self, stat: StatementStat):
+        self.baselines[stat.queryid] = {
+            'calls': stat.calls,
+            'total_time': stat.total_time,
+            'mean_time': stat.mean_time,
+        }
+
+    def change_reason(self, stat: StatementStat, min_calls: int, min_time: float) -> Optional[str]:
+        baseline = self.baselines.get(stat.queryid)
+        if baseline is None:
+            return 'new'
+
+        calls_delta = stat.calls - baseline['calls']
+        time_delta = stat.total_time - baseline['total_time']
+        if calls_delta < 0 or time_delta < 0:
+            return 'reset'
+        if calls_delta >= min_calls:
+            return 'calls'
+        if time_delta >= min_time:
+            return 'time'
+        return None
+
+    def select_changed(self, current: List[StatementStat], min_calls: int = 100,
+                       min_time: float = 1000.0) -> List[Tuple[StatementStat, str]]:
+        changed = []
+        for stat in current:
+            reason = self.change_reason(stat, min_calls, min_time)
+            if reason is not None:
+                changed.append((stat, reason))
+        return changed
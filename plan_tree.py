@@ -0,0 +1,125 @@
+import hashlib
+from typing import Any, Dict, Iterator, List, Optional
+
+
+STRUCTURAL_KEYS = ('Join Type', 'Strategy', 'Partial Mode', 'Scan Direction', 'Parent Relationship')
+
+
+def node_outline(node: Dict[str, Any]) -> str:
+    line = node.get('Node Type', 'unknown')
+    details = [str(node[key]) for key in STRUCTURAL_KEYS if node.get(key) is not None]
+    if details:
+        line += f" ({', '.join(details)})"
+    if node.get('Index Name'):
+        line += f" using {node['Index Name']}"
+    if node.get('Relation Name'):
+        line += f" on {node['Relation Name']}"
+    for key in ('CTE Name', 'Subplan Name', 'Function Name'):
+        if node.get(key):
+            line += f" [{node[key]}]"
+    return line
+
+
+def structural_hash(outline: List[str]) -> str:
+    return hashlib.blake2b('\n'.join(outline).encode('utf-8'), digest_size=8).hexdigest()
+
+
+class PlanTree:
+    __slots__ = ('nodes', 'parents', 'children', 'depths', '_by_type', '_by_relation', '_by_depth')
+
+    def __init__(self, root: Dict[str, Any]):
+        self.nodes: List[Dict[str, Any]] = []
+        self.parents: List[int] = []
+        self.children: List[List[int]] = []
+        self.depths: List[int] = []
+        self._by_type: Dict[str, List[int]] = {}
+        self._by_relation: Dict[str, List[int]] = {}
+        self._by_depth: List[List[int]] = []
+
+        stack = [(root, -1, 0)]
+        while stack:
+            node, parent, depth = stack.pop()
+            index = len(self.nodes)
+            self.nodes.append(node)
+            self.parents.append(parent)
+            self.children.append([])
+            self.depths.append(depth)
+            if parent >= 0:
+                self.children[parent].append(index)
+
+            node_type = node.get('Node Type')
+            if node_type is not None:
+                self._by_type.setdefault(node_type, []).append(index)
+            relation = node.get('Relation Name')
+            if relation is not None:
+                self._by_relation.setdefault(relation, []).append(index)
+            if depth == len(self._by_depth):
+                self._by_depth.append([])
+            self._by_depth[depth].append(index)
+
+            plans = node.get('Plans')
+            if plans:
+                for child in reversed(plans):
+                    stack.append((child, index, depth + 1))
+
+    @classmethod
+    def from_explain(cls, plan: Any) -> 'PlanTree':
+        return cls(plan[0]['Plan'])
+
+    @property
+    def root(self) -> Dict[str, Any]:
+        return self.nodes[0]
+
+    @property
+    def max_depth(self) -> int:
+        return len(self._by_depth) - 1
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.nodes)
+
+    def node_types(self) -> List[str]:
+        return list(self._by_type)
+
+    def relations(self) -> List[str]:
+        return list(self._by_relation)
+
+    def count(self, node_type: str) -> int:
+        return len(self._by_type.get(node_type, ()))
+
+    def indexes_of_type(self, *node_types: str) -> List[int]:
+        if len(node_types) == 1:
+            return list(self._by_type.get(node_types[0], ()))
+        return sorted(i for t in node_types for i in self._by_type.get(t, ()))
+
+    def nodes_of_type(self, *node_types: str) -> List[Dict[str, Any]]:
+        return [self.nodes[i] for i in self.indexes_of_type(*node_types)]
+
+    def nodes_for_relation(self, relation: str) -> List[Dict[str, Any]]:
+        return [self.nodes[i] for i in self._by_relation.get(relation, ())]
+
+    def nodes_at_depth(self, depth: int) -> List[Dict[str, Any]]:
+        if depth >= len(self._by_depth):
+            return []
+        return [self.nodes[i] for i in self._by_depth[depth]]
+
+    def outline(self) -> List[str]:
+        return ['  ' * depth + node_outline(node) for node, depth in zip(self.nodes, self.depths)]
+
+    def exclusive(self, index: int, key: str) -> float:
+        value = self.nodes[index].get(key, 0)
+        return max(0, value - sum(self.nodes[child].get(key, 0) for child in self.children[index]))
+
+    def exclusive_values(self, key: str) -> List[float]:
+        values = [node.get(key, 0) for node in self.nodes]
+        exclusive = values[:]
+        for index, parent in enumerate(self.parents):
+            if parent >= 0:
+                exclusive[parent] -= values[index]
+        return [value if value > 0 else 0 for value in exclusive]
+
+    def parent_of(self, index: int) -> Optional[Dict[str, Any]]:
+        parent = self.parents[index]
+        return self.nodes[parent] if parent >= 0 else None
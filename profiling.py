@@ -0,0 +1,235 @@
+import bisect
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional
+
+
+STAGE_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SAMPLE_WINDOW = 10000
+PROMETHEUS_METRIC = "t1_pg_analyzer_stage_seconds"
+PROCESS_WIDE_PROFILER = sys.version_info >= (3, 12)
+
+NO_STAGE = nullcontext()
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Span(NamedTuple):
+    thread: str
+    stage: str
+    started: float
+    finished: float
+
+
+class StageHistogram:
+    __slots__ = ('counts', 'count', 'total', 'samples')
+
+    def __init__(self):
+        self.counts = [0] * (len(STAGE_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.samples: Deque[float] = deque(maxlen=SAMPLE_WINDOW)
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(STAGE_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.samples.append(seconds)
+
+    def summary(self) -> Dict[str, float]:
+        samples = list(self.samples)
+        return {
+            'count': self.count,
+            'total_ms': self.total * 1000,
+            'p50_ms': percentile(samples, 0.5) * 1000,
+            'p95_ms': percentile(samples, 0.95) * 1000,
+            'p99_ms': percentile(samples, 0.99) * 1000,
+            'max_ms': max(samples, default=0.0) * 1000,
+        }
+
+
+class StageTimer:
+    __slots__ = ('metrics', 'name', 'started')
+
+    def __init__(self, metrics: "StageMetrics", name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.started, self.started)
+        return False
+
+
+class StageMetrics:
+    def __init__(self, record_spans: bool = False):
+        self.record_spans = record_spans
+        self.stages: Dict[str, StageHistogram] = {}
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def stage(self, name: str) -> StageTimer:
+        return StageTimer(self, name)
+
+    def observe(self, name: str, seconds: float, started: Optional[float] = None):
+        with self._lock:
+            histogram = self.stages.get(name)
+            if histogram is None:
+                histogram = self.stages[name] = StageHistogram()
+            histogram.observe(seconds)
+            if self.record_spans and started is not None:
+                self.spans.append(Span(threading.current_thread().name, name, started, started + seconds))
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {name: histogram.summary() for name, histogram in self.stages.items()}
+
+    def prometheus(self, metric: str = PROMETHEUS_METRIC) -> str:
+        lines = [f"# HELP {metric} Длительность этапов анализа запросов",
+                 f"# TYPE {metric} histogram"]
+        with self._lock:
+            for name, histogram in sorted(self.stages.items()):
+                cumulative = 0
+                for bound, count in zip(STAGE_BUCKETS, histogram.counts):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{stage="{name}",le="+Inf"}} {histogram.count}')
+                lines.append(f'{metric}_sum{{stage="{name}"}} {histogram.total}')
+                lines.append(f'{metric}_count{{stage="{name}"}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def speedscope(self, name: str = "T1 PgQueryAnalyzer") -> Dict[str, Any]:
+        with self._lock:
+            spans = list(self.spans)
+        frames: Dict[str, int] = {}
+        by_thread: Dict[str, List[Span]] = {}
+        for span in spans:
+            frames.setdefault(span.stage, len(frames))
+            by_thread.setdefault(span.thread, []).append(span)
+        origin = min((span.started for span in spans), default=0.0)
+
+        profiles = []
+        for thread, thread_spans in sorted(by_thread.items()):
+            events = []
+            stack: List[Span] = []
+            for span in sorted(thread_spans, key=lambda s: (s.started, -s.finished)):
+                while stack and stack[-1].finished <= span.started:
+                    closed = stack.pop()
+                    events.append({'type': 'C', 'frame': frames[closed.stage], 'at': closed.finished - origin})
+                finished = min(span.finished, stack[-1].finished) if stack else span.finished
+                events.append({'type': 'O', 'frame': frames[span.stage], 'at': span.started - origin})
+                stack.append(span._replace(finished=finished))
+            while stack:
+                closed = stack.pop()
+                events.append({'type': 'C', 'frame': frames[closed.stage], 'at': closed.finished - origin})
+            profiles.append({
+                'type': 'evented',
+                'name': thread,
+                'unit': 'seconds',
+                'startValue': 0.0,
+                'endValue': max((event['at'] for event in events), default=0.0),
+                'events': events,
+            })
+
+        return {
+            '$schema': "https://www.speedscope.app/file-format-schema.json",
+            'name': name,
+            'exporter': "t1-pg-query-analyzer",
+            'activeProfileIndex': 0,
+            'shared': {'frames': [{'name': stage} for stage in frames]},
+            'profiles': profiles,
+        }
+
+    def reset(self):
+        with self._lock:
+            self.stages.clear()
+            self.spans.clear()
+
+
+class ThreadProfiler:
+    def __init__(self, process_wide: bool = PROCESS_WIDE_PROFILER):
+        self.process_wide = process_wide
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._active = 0
+        self.profiles: List[cProfile.Profile] = [cProfile.Profile()] if process_wide else []
+
+    def _profile(self) -> cProfile.Profile:
+        profile = getattr(self._local, 'profile', None)
+        if profile is None:
+            profile = self._local.profile = cProfile.Profile()
+            with self._lock:
+                self.profiles.append(profile)
+        return profile
+
+    def enable(self):
+        if not self.process_wide:
+            self._profile().enable()
+            return
+        with self._lock:
+            self._active += 1
+            if self._active == 1:
+                self.profiles[0].enable()
+
+    def disable(self):
+        if not self.process_wide:
+            self._profile().disable()
+            return
+        with self._lock:
+            self._active -= 1
+            if self._active == 0:
+                self.profiles[0].disable()
+
+    def wrap(self, func: Callable) -> Callable:
+        def profiled(*args, **kwargs):
+            self.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.disable()
+        return profiled
+
+    def stats(self) -> pstats.Stats:
+        with self._lock:
+            profiles = list(self.profiles)
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+
+def write_profile(path: str, profiler: ThreadProfiler, stage_metrics: StageMetrics):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if path.endswith(".speedscope.json"):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(stage_metrics.speedscope(), f, ensure_ascii=False)
+    else:
+        profiler.stats().dump_stats(path)
+
+
+def write_stage_metrics(path: str, stage_metrics: StageMetrics):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        if path.endswith(".prom"):
+            f.write(stage_metrics.prometheus())
+        else:
+            json.dump(stage_metrics.summary(), f, ensure_ascii=False, indent=2)
@@ -0,0 +1,362 @@
+import html
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List
+from .models import AnalysisReport, NodeActual, NodeCost
+
+HTML_STYLE = """
+    body { font-family: Arial, sans-serif; margin: 40px; }
+    h1, h2, h3 { color: #2c3e50; }
+    .report { page-break-after: always; }
+    .report:last-of-type { page-break-after: auto; }
+    .header { background-color: #3498db; color: white; padding: 10px; border-radius: 5px; }
+    .section { margin: 20px 0; padding: 15px; border: 1px solid #bdc3c7; border-radius: 5px; }
+    .metric-row { display: flex; justify-content: space-between; margin: 5px 0; }
+    .metric-label { font-weight: bold; color: #34495e; }
+    .recommendation { margin: 15px 0; padding: 10px; border-left: 5px solid #e74c3c; background-color: #fdf2f2; }
+    .recommendation.medium { border-left-color: #f39c12; background-color: #fef9e7; }
+    .recommendation.low { border-left-color: #27ae60; background-color: #e8f8f5; }
+    .warning { color: #e67e22; font-weight: bold; }
+    .score-high { color: #27ae60; font-weight: bold; }
+    .score-medium { color: #f39c12; font-weight: bold; }
+    .score-low { color: #e74c3c; font-weight: bold; }
+    pre { background-color: #f5f5f5; padding: 10px; border-radius: 5px; overflow-x: auto; white-space: pre-wrap; }
+    table { width: 100%; border-collapse: collapse; font-size: 0.9em; }
+    th, td { border: 1px solid #bdc3c7; padding: 4px 6px; text-align: left; }
+    .footer { margin-top: 40px; font-size: 0.9em; color: #7f8c8d; text-align: center; }
+"""
+
+HTML_DOCUMENT = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>PGQueryGuard Report</title>
+    <style>{style}</style>
+</head>
+<body>
+{reports}
+    <div class="footer">
+        Сгенерировано с помощью PGQueryGuard for T1 Cloud — {date}
+    </div>
+</body>
+</html>
+"""
+
+HTML_REPORT = """
+<div class="report">
+    <div class="header">
+        <h1>PGQueryGuard — Анализ SQL-запроса</h1>
+        <p><strong>Дата анализа:</strong> {analyzed_at}</p>
+        <p><strong>Окружение T1 Cloud:</strong> {environment}</p>
+    </div>
+
+    <div class="section">
+        <h2>Информация о запросе</h2>
+        <pre>{query}</pre>
+        <div class="metric-row"><span class="metric-label">Тип запроса:</span> <span>{query_type}</span></div>
+        <div class="metric-row"><span class="metric-label">Затронутые таблицы:</span> <span>{tables}</span></div>
+        <div class="metric-row"><span class="metric-label">Используемые индексы:</span> <span>{indexes}</span></div>
+    </div>
+
+    <div class="section">
+        <h2>Метрики производительности</h2>
+        <div class="metric-row"><span class="metric-label">Общая стоимость:</span> <span>{total_cost:.2f}</span></div>
+        <div class="metric-row"><span class="metric-label">Оценочное время выполнения:</span> <span>{execution_time:.2f} ms</span></div>
+        <div class="metric-row"><span class="metric-label">Оценочное количество строк:</span> <span>{total_rows:,}</span></div>
+        <div class="metric-row"><span class="metric-label">Блоков с диска:</span> <span>{read_blocks}</span></div>
+        <div class="metric-row"><span class="metric-label">Параллельные воркеры:</span> <span>{parallel_workers}</span></div>
+        <div class="metric-row"><span class="metric-label">Типы узлов плана:</span> <span>{node_types}</span></div>
+{actual_metrics}
+    </div>
+{hot_nodes}
+{node_actuals}
+    <div class="section">
+        <h2>Рекомендации по оптимизации</h2>
+{recommendations}
+    </div>
+{warnings}
+    <div class="section">
+        <h2>Итоговая оценка</h2>
+        <p class="{score_class}">{emoji} <strong>Оценка качества:</strong> {score}/100</p>
+        <p><strong>Критичность:</strong> {critical}</p>
+        <p><strong>Количество рекомендаций:</strong> {recommendation_count}</p>
+        <p><strong>Количество предупреждений:</strong> {warning_count}</p>
+    </div>
+</div>
+"""
+
+HTML_RECOMMENDATION = """
+        <div class="recommendation {priority}">
+            <h3>Рекомендация #{index}: {description}</h3>
+            <p><strong>Тип:</strong> {type}</p>
+            <p><strong>Приоритет:</strong> {priority}</p>
+            <p><strong>Влияние:</strong> {impact_score}/10</p>
+            <p><strong>Ожидаемое улучшение:</strong> {improvement}</p>
+            <p><strong>Рекомендуемое действие:</strong> {action}</p>
+            <p><strong>Сервис T1 Cloud:</strong> {service}</p>
+        </div>
+"""
+
+HTML_ACTUAL_METRICS = """
+        <div class="metric-row"><span class="metric-label">Фактическое время выполнения:</span> <span>{execution_time:.2f} ms</span></div>
+        <div class="metric-row"><span class="metric-label">Фактическое количество строк:</span> <span>{actual_rows:,}</span></div>
+        <div class="metric-row"><span class="metric-label">Узлов с ошибкой оценки строк:</span> <span>{misestimated_nodes}</span></div>
+"""
+
+HTML_NODE_ACTUALS = """
+    <div class="section">
+        <h2>Фактическое выполнение по узлам</h2>
+        <table>
+            <tr><th>Узел</th><th>Таблица</th><th>Строки (оценка / факт)</th><th>Циклы</th><th>Время, мс</th><th>Доля</th><th>Блоки (кэш / диск)</th></tr>
+{rows}
+        </table>
+    </div>
+"""
+
+HTML_NODE_ACTUAL_ROW = """            <tr><td>{node_type}</td><td>{relation}</td><td>{estimated_rows:,} / {actual_rows:,.0f}</td><td>{loops}</td><td>{exclusive_time:.2f}</td><td>{time_share:.0%}</td><td>{shared_hit_blocks} / {shared_read_blocks}</td></tr>
+"""
+
+HTML_HOT_NODES = """
+    <div class="section">
+        <h2>Самые затратные узлы плана</h2>
+        <table>
+            <tr><th>Узел</th><th>Таблица / индекс</th><th>Стоимость (собственная / общая)</th><th>Доля</th><th>Время, мс</th><th>Блоки (кэш / диск)</th></tr>
+{rows}
+        </table>
+    </div>
+"""
+
+HTML_HOT_NODE_ROW = """            <tr><td>{node_type}</td><td>{target}</td><td>{exclusive_cost:,.2f} / {total_cost:,.2f}</td><td>{share:.0%}</td><td>{time}</td><td>{shared_hit_blocks} / {shared_read_blocks}</td></tr>
+"""
+
+MAX_NODE_ACTUALS = 20
+
+HTML_WARNINGS = """
+    <div class="section">
+        <h2>Предупреждения</h2>
+{items}
+    </div>
+"""
+
+HTML_PLAN_CHANGE = """
+    <div class="section">
+        <h2>Изменение плана</h2>
+        <p>{previous_hash} &rarr; {plan_hash}: стоимость {previous_cost:,.2f} &rarr; {total_cost:,.2f}</p>
+        <pre>{diff}</pre>
+    </div>
+"""
+
+
+def _score_grade(score: int) -> str:
+    return "high" if score >= 80 else "medium" if score >= 60 else "low"
+
+
+def top_node_actuals(report: AnalysisReport) -> List[NodeActual]:
+    return sorted(report.node_actuals, key=lambda node: -node.exclusive_time)[:MAX_NODE_ACTUALS]
+
+
+def hot_node_fields(node: NodeCost, quote: Callable[[str], str] = str) -> Dict[str, Any]:
+    target = node.relation or ''
+    if node.index_name:
+        target = f"{target} ({node.index_name})" if target else node.index_name
+    return {
+        'target': quote(target),
+        'share': node.time_share if node.time_share is not None else node.cost_share,
+        'time': f"{node.exclusive_time:.2f}" if node.exclusive_time is not None else '-',
+    }
+
+
+def render_html_fragment(report: AnalysisReport) -> str:
+    escape = html.escape
+    recommendations = ''.join(
+        HTML_RECOMMENDATION.format(
+            index=i,
+            priority=rec.priority.value,
+            description=escape(rec.description),
+            type=escape(rec.type),
+            impact_score=rec.impact_score,
+            improvement=escape(rec.estimated_improvement),
+            action=escape(rec.suggested_action),
+            service=rec.t1_service.value if rec.t1_service else 'N/A',
+        )
+        for i, rec in enumerate(report.recommendations, 1)
+    )
+    warnings = ''
+    if report.warnings:
+        warnings = HTML_WARNINGS.format(
+            items='\n'.join(f"        <p class='warning'>• {escape(w)}</p>" for w in report.warnings)
+        )
+    if report.plan_change is not None:
+        warnings += HTML_PLAN_CHANGE.format(
+            previous_hash=report.plan_change.previous_hash,
+            plan_hash=report.plan_change.plan_hash,
+            previous_cost=report.plan_change.previous_cost,
+            total_cost=report.metrics.total_cost,
+            diff=escape('\n'.join(report.plan_change.diff)),
+        )
+    actual_metrics = ''
+    hot_nodes = ''
+    node_actuals = ''
+    if report.hot_nodes:
+        hot_nodes = HTML_HOT_NODES.format(rows=''.join(
+            HTML_HOT_NODE_ROW.format(**{**node.model_dump(), **hot_node_fields(node, escape)})
+            for node in report.hot_nodes
+        ))
+    if report.metrics.execution_time is not None:
+        actual_metrics = HTML_ACTUAL_METRICS.format(
+            execution_time=report.metrics.execution_time,
+            actual_rows=report.metrics.actual_rows or 0,
+            misestimated_nodes=report.metrics.misestimated_nodes,
+        )
+    if report.node_actuals:
+        node_actuals = HTML_NODE_ACTUALS.format(rows=''.join(
+            HTML_NODE_ACTUAL_ROW.format(**{**node.model_dump(), 'relation': escape(node.relation or '')})
+            for node in top_node_actuals(report)
+        ))
+    grade = _score_grade(report.score)
+
+    return HTML_REPORT.format(
+        analyzed_at=report.analyzed_at.strftime('%Y-%m-%d %H:%M:%S'),
+        environment=escape(report.t1_environment or 'N/A'),
+        query=escape(report.query),
+        query_type=report.query_type,
+        tables=escape(', '.join(report.tables_affected)) if report.tables_affected else 'Нет',
+        indexes=escape(', '.join(report.indexes_used)) if report.indexes_used else 'Нет',
+        total_cost=report.metrics.total_cost,
+        execution_time=report.metrics.max_execution_time,
+        total_rows=report.metrics.total_rows,
+        read_blocks=report.metrics.shared_read_blocks,
+        parallel_workers=report.metrics.parallel_workers,
+        node_types=escape(', '.join(report.metrics.node_types)),
+        actual_metrics=actual_metrics,
+        hot_nodes=hot_nodes,
+        node_actuals=node_actuals,
+        recommendations=recommendations,
+        warnings=warnings,
+        score_class=f"score-{grade}",
+        emoji={"high": "✅", "medium": "⚠️", "low": "❌"}[grade],
+        score=report.score,
+        critical='Да' if report.is_critical else 'Нет',
+        recommendation_count=len(report.recommendations),
+        warning_count=len(report.warnings),
+    )
+
+
+def render_html_document(reports: Iterable[AnalysisReport]) -> str:
+    return HTML_DOCUMENT.format(
+        style=HTML_STYLE,
+        reports=''.join(render_html_fragment(report) for report in reports),
+        date=datetime.now().strftime('%Y-%m-%d'),
+    )
+
+
+def render_html(report: AnalysisReport) -> str:
+    return render_html_document([report])
+
+
+def render_markdown(report: AnalysisReport) -> str:
+    metrics = report.metrics
+    lines = [
+        "# PGQueryGuard — анализ SQL-запроса",
+        "",
+        f"- Дата анализа: {report.analyzed_at.strftime('%Y-%m-%d %H:%M:%S')}",
+        f"- Окружение T1 Cloud: {report.t1_environment or 'N/A'}",
+        f"- Тип запроса: {report.query_type}",
+        f"- Затронутые таблицы: {', '.join(report.tables_affected) or 'Нет'}",
+        f"- Используемые индексы: {', '.join(report.indexes_used) or 'Нет'}",
+        "",
+        "```sql",
+        report.query,
+        "```",
+        "",
+        "## Метрики производительности",
+        "",
+        "| Метрика | Значение |",
+        "|---|---|",
+        f"| Общая стоимость | {metrics.total_cost:.2f} |",
+        f"| Оценочное время выполнения | {metrics.max_execution_time:.2f} ms |",
+        f"| Оценочное количество строк | {metrics.total_rows:,} |",
+        f"| Блоков с диска | {metrics.shared_read_blocks} |",
+        f"| Параллельные воркеры | {metrics.parallel_workers} |",
+        f"| Типы узлов плана | {', '.join(metrics.node_types)} |",
+        "",
+    ]
+    if metrics.execution_time is not None:
+        lines[-1:-1] = [
+            f"| Фактическое время выполнения | {metrics.execution_time:.2f} ms |",
+            f"| Фактическое количество строк | {metrics.actual_rows or 0:,} |",
+            f"| Узлов с ошибкой оценки строк | {metrics.misestimated_nodes} |",
+        ]
+    if report.hot_nodes:
+        lines.extend([
+            "## Самые затратные узлы плана",
+            "",
+            "| Узел | Таблица / индекс | Стоимость (собственная / общая) | Доля | Время, мс | Блоки (кэш / диск) |",
+            "|---|---|---|---|---|---|",
+        ] + [
+            "| {node_type} | {target} | {exclusive_cost:,.2f} / {total_cost:,.2f} | {share:.0%} | {time} | "
+            "{shared_hit_blocks} / {shared_read_blocks} |".format(**node.model_dump(), **hot_node_fields(node))
+            for node in report.hot_nodes
+        ] + [""])
+    if report.node_actuals:
+        lines.extend([
+            "## Фактическое выполнение по узлам",
+            "",
+            "| Узел | Таблица | Строки (оценка / факт) | Циклы | Время, мс | Доля | Блоки (кэш / диск) |",
+            "|---|---|---|---|---|---|---|",
+        ] + [
+            f"| {node.node_type} | {node.relation or ''} | {node.estimated_rows:,} / {node.actual_rows:,.0f} | {node.loops} | "
+            f"{node.exclusive_time:.2f} | {node.time_share:.0%} | {node.shared_hit_blocks} / {node.shared_read_blocks} |"
+            for node in top_node_actuals(report)
+        ] + [""])
+    lines += [
+        "## Рекомендации по оптимизации",
+        "",
+    ]
+    for i, rec in enumerate(report.recommendations, 1):
+        lines.extend([
+            f"### {i}. {rec.description}",
+            "",
+            f"- Тип: {rec.type}",
+            f"- Приоритет: {rec.priority.value}",
+            f"- Влияние: {rec.impact_score}/10",
+            f"- Ожидаемое улучшение: {rec.estimated_improvement}",
+            f"- Рекомендуемое действие: {rec.suggested_action}",
+            "",
+        ])
+    if report.warnings:
+        lines.extend(["## Предупреждения", ""] + [f"- {w}" for w in report.warnings] + [""])
+    if report.plan_change is not None:
+        change = report.plan_change
+        lines.extend([
+            "## Изменение плана",
+            "",
+            f"{change.previous_hash} -> {change.plan_hash}: стоимость {change.previous_cost:,.2f} -> {metrics.total_cost:,.2f}",
+            "",
+            "```diff",
+        ] + change.diff + ["```", ""])
+    lines.extend([
+        "## Итоговая оценка",
+        "",
+        f"- Оценка качества: {report.score}/100",
+        f"- Критичность: {'Да' if report.is_critical else 'Нет'}",
+        "",
+    ])
+    return '\n'.join(lines)
+
+
+def render_json(report: AnalysisReport) -> str:
+    return report.model_dump_json(indent=2)
+
+
+RENDERERS: Dict[str, Callable[[AnalysisReport], str]] = {
+    'html': render_html,
+    'md': render_markdown,
+    'json': render_json,
+}
+
+
+def render_report(report: AnalysisReport, output_format: str) -> str:
+    renderer = RENDERERS.get(output_format)
+    if renderer is None:
+        raise ValueError(f"Неизвестный формат отчета: {output_format}")
+    return renderer(report)
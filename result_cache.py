@@ -0,0 +1,143 @@
+import hashlib
+import sqlite3
+import time
+from typing import NamedTuple, Optional, Union
+from .catalog import RELATIONS_SQL
+from .models import AnalysisReport, ReportRecord, to_report
+
+
+RESULT_CACHE_VERSION = 2
+PRUNE_DAYS = 30.0
+COMMIT_ROWS = 1000
+
+CATALOG_VERSION_SQL = """
+SELECT current_setting('server_version_num'), md5(coalesce(string_agg(item, E'\\n' ORDER BY item), ''))
+FROM (
+    SELECT format('r %I.%I %s', n.nspname, c.relname, c.relkind) AS item
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE c.relkind IN ('r', 'p', 'v', 'm', 'f')
+      AND n.nspname NOT IN ('pg_catalog', 'information_schema') AND n.nspname NOT LIKE 'pg\\_toast%%'
+    UNION ALL
+    SELECT format('c %I.%I.%I %s %s %s', n.nspname, c.relname, a.attname,
+                  format_type(a.atttypid, a.atttypmod), a.attnotnull, a.attstattarget)
+    FROM pg_attribute a
+    JOIN pg_class c ON c.oid = a.attrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE a.attnum > 0 AND NOT a.attisdropped AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+      AND n.nspname NOT IN ('pg_catalog', 'information_schema') AND n.nspname NOT LIKE 'pg\\_toast%%'
+    UNION ALL
+    SELECT 'i ' || pg_get_indexdef(i.indexrelid) || ' ' || i.indisvalid
+    FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname NOT IN ('pg_catalog', 'information_schema') AND n.nspname NOT LIKE 'pg\\_toast%%'
+    UNION ALL
+    SELECT format('k %I.%I %s', n.nspname, c.relname, pg_get_constraintdef(k.oid))
+    FROM pg_constraint k
+    JOIN pg_class c ON c.oid = k.conrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname NOT IN ('pg_catalog', 'information_schema')
+) catalog
+"""
+
+RESULT_CACHE_SCHEMA = """
+PRAGMA journal_mode = WAL;
+PRAGMA synchronous = NORMAL;
+CREATE TABLE IF NOT EXISTS result (
+    statement TEXT NOT NULL,
+    catalog TEXT NOT NULL,
+    report TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL,
+    PRIMARY KEY (statement, catalog)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS result_used ON result (used_at);
+"""
+
+
+class CacheSummary(NamedTuple):
+    hits: int
+    analyzed: int
+    pruned: int
+    entries: int
+
+
+def statement_hash(query: str) -> str:
+    return hashlib.blake2b(query.strip().encode('utf-8'), digest_size=16).hexdigest()
+
+
+def catalog_version(analyzer, conn) -> str:
+    with conn.cursor() as cur:
+        cur.execute(CATALOG_VERSION_SQL)
+        server_version, catalog = cur.fetchone()
+        cur.execute(RELATIONS_SQL)
+        statistics = hashlib.blake2b(repr(sorted(cur.fetchall())).encode('utf-8'), digest_size=16).hexdigest()
+    model = analyzer.time_model
+    parts = (
+        str(RESULT_CACHE_VERSION), server_version, catalog, statistics, *analyzer.get_session_settings(conn),
+        analyzer.t1_environment or '', str(bool(analyzer.explain_analyze)), str(analyzer.catalog is not None),
+        model.created_at or '' if model is not None else '',
+    )
+    return hashlib.blake2b('\n'.join(parts).encode('utf-8'), digest_size=16).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, path: str, prune_days: float = PRUNE_DAYS):
+        self.path = path
+        self.prune_days = prune_days
+        self.catalog: Optional[str] = None
+        self.connection = sqlite3.connect(path, timeout=30.0)
+        self.connection.executescript(RESULT_CACHE_SCHEMA)
+        self._pending = 0
+        self.hits = 0
+        self.analyzed = 0
+        self.pruned = 0
+
+    def _maybe_commit(self):
+        self._pending += 1
+        if self._pending >= COMMIT_ROWS:
+            self.connection.commit()
+            self._pending = 0
+
+    def get(self, query: str) -> Optional[AnalysisReport]:
+        if self.catalog is None:
+            raise ValueError("Версия каталога для кэша результатов не задана")
+        key = (statement_hash(query), self.catalog)
+        row = self.connection.execute(
+            "SELECT report FROM result WHERE statement = ? AND catalog = ?", key
+        ).fetchone()
+        if row is None:
+            return None
+        self.connection.execute("UPDATE result SET used_at = ? WHERE statement = ? AND catalog = ?",
+                                (time.time(), *key))
+        self._maybe_commit()
+        self.hits += 1
+        return AnalysisReport.model_validate_json(row[0])
+
+    def put(self, query: str, report: Union[AnalysisReport, ReportRecord]):
+        if self.catalog is None:
+            raise ValueError("Версия каталога для кэша результатов не задана")
+        now = time.time()
+        self.connection.execute(
+            "INSERT OR REPLACE INTO result (statement, catalog, report, created_at, used_at) VALUES (?, ?, ?, ?, ?)",
+            (statement_hash(query), self.catalog, to_report(report).model_dump_json(), now, now)
+        )
+        self._maybe_commit()
+        self.analyzed += 1
+
+    def prune(self) -> int:
+        cursor = self.connection.execute("DELETE FROM result WHERE used_at < ?",
+                                         (time.time() - self.prune_days * 86400,))
+        self.connection.commit()
+        self._pending = 0
+        self.pruned += cursor.rowcount
+        return cursor.rowcount
+
+    def summary(self) -> CacheSummary:
+        entries = self.connection.execute("SELECT count(*) FROM result").fetchone()[0]
+        return CacheSummary(self.hits, self.analyzed, self.pruned, entries)
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
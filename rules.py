@@ -0,0 +1,298 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+from .advisor import join_columns
+from .models import NodeActualRecord, NodeCostRecord, Priority, RecommendationRecord, T1CloudService
+from .plan_tree import PlanTree
+
+
+logger = logging.getLogger("T1PgQueryAnalyzer")
+
+HOT_NODE_SHARE = 0.3
+HOT_NODE_MIN_COST = 1000.0
+
+HOT_NODE_ACTIONS = {
+    'Seq Scan': "Добавить индекс по условиям фильтра или сократить читаемый диапазон",
+    'Bitmap Heap Scan': "Сделать индекс более селективным или покрывающим",
+    'Index Scan': "Проверить селективность индекса, рассмотреть покрывающий индекс (INCLUDE)",
+    'Sort': "Добавить индекс, соответствующий ORDER BY, или увеличить work_mem",
+    'Incremental Sort': "Добавить индекс, соответствующий ORDER BY, или увеличить work_mem",
+    'Hash Join': "Сократить входные наборы соединения фильтрами до JOIN",
+    'Hash': "Сократить строящуюся хэш-таблицу или увеличить work_mem",
+    'Merge Join': "Добавить индексы по ключам соединения, чтобы избежать сортировки",
+    'Nested Loop': "Добавить индекс по ключу соединения внутренней таблицы",
+    'Aggregate': "Сократить агрегируемый набор или использовать материализованное представление",
+    'Materialize': "Проверить порядок соединений: материализация повторяется для каждого цикла",
+}
+
+
+class RuleContext:
+    __slots__ = ('analyzer', 'plan', 'query', 'tree', 'query_info', 'node_actuals', 'node_costs',
+                 'covered', 'recommendations', 'warnings')
+
+    def __init__(self, analyzer, plan: Any, query: str, tree: PlanTree, query_info: Dict[str, Any],
+                 node_actuals: List[NodeActualRecord], node_costs: List[NodeCostRecord]):
+        self.analyzer = analyzer
+        self.plan = plan
+        self.query = query
+        self.tree = tree
+        self.query_info = query_info
+        self.node_actuals = node_actuals
+        self.node_costs = node_costs
+        self.covered: Set[int] = set()
+        self.recommendations: List[RecommendationRecord] = []
+        self.warnings: List[str] = []
+
+    @property
+    def catalog(self):
+        catalog = self.analyzer.catalog
+        return catalog if catalog is not None and catalog.loaded else None
+
+    def recommend(self, recommendation: RecommendationRecord, index: Optional[int] = None):
+        self.recommendations.append(recommendation)
+        if index is not None:
+            self.covered.add(index)
+
+    def warn(self, message: str):
+        self.warnings.append(message)
+
+
+class Rule(NamedTuple):
+    name: str
+    func: Callable
+    node_types: Optional[Tuple[str, ...]]
+
+
+class RuleStat(NamedTuple):
+    name: str
+    node_types: Optional[Tuple[str, ...]]
+    calls: int
+    seconds: float
+    errors: int
+
+
+class RuleRegistry:
+    def __init__(self):
+        self.rules: List[Rule] = []
+        self._lock = threading.Lock()
+        self._calls: Dict[str, int] = {}
+        self._seconds: Dict[str, float] = {}
+        self._errors: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def __contains__(self, name: str) -> bool:
+        return any(rule.name == name for rule in self.rules)
+
+    def add(self, name: str, func: Callable, node_types: Optional[Tuple[str, ...]] = None):
+        if name in self:
+            raise ValueError(f"Правило {name} уже зарегистрировано")
+        self.rules.append(Rule(name, func, tuple(node_types) if node_types is not None else None))
+
+    def rule(self, name: str, node_types: Optional[Tuple[str, ...]] = None) -> Callable[[Callable], Callable]:
+        def register(func: Callable) -> Callable:
+            self.add(name, func, node_types)
+            return func
+        return register
+
+    def remove(self, name: str):
+        self.rules = [rule for rule in self.rules if rule.name != name]
+
+    def copy(self) -> 'RuleRegistry':
+        registry = RuleRegistry()
+        registry.rules = list(self.rules)
+        return registry
+
+    def run(self, context: RuleContext) -> RuleContext:
+        clock = time.perf_counter
+        tree = context.tree
+        timings: List[Tuple[str, int, float, int]] = []
+
+        for rule in self.rules:
+            calls = errors = 0
+            started = clock()
+            if rule.node_types is None:
+                calls = 1
+                try:
+                    rule.func(context)
+                except Exception as e:
+                    errors = 1
+                    logger.warning("Правило %s завершилось с ошибкой: %s", rule.name, e)
+            else:
+                for index in tree.indexes_of_type(*rule.node_types):
+                    calls += 1
+                    try:
+                        rule.func(context, index, tree.nodes[index])
+                    except Exception as e:
+                        errors += 1
+                        logger.warning("Правило %s завершилось с ошибкой: %s", rule.name, e)
+            timings.append((rule.name, calls, clock() - started, errors))
+
+        with self._lock:
+            for name, calls, seconds, errors in timings:
+                self._calls[name] = self._calls.get(name, 0) + calls
+                self._seconds[name] = self._seconds.get(name, 0.0) + seconds
+                if errors:
+                    self._errors[name] = self._errors.get(name, 0) + errors
+        return context
+
+    def stats(self) -> List[RuleStat]:
+        with self._lock:
+            rows = [RuleStat(rule.name, rule.node_types, self._calls.get(rule.name, 0),
+                             self._seconds.get(rule.name, 0.0), self._errors.get(rule.name, 0))
+                    for rule in self.rules]
+        return sorted(rows, key=lambda row: -row.seconds)
+
+    def reset_stats(self):
+        with self._lock:
+            self._calls.clear()
+            self._seconds.clear()
+            self._errors.clear()
+
+
+registry = RuleRegistry()
+
+
+@registry.rule("missing_index", ('Seq Scan',))
+def missing_index(context: RuleContext, index: int, node: Dict[str, Any]):
+    if node['Plan Rows'] > 10000 and 'Filter' in node:
+        context.recommend(context.analyzer.index_recommendation(node), index)
+
+
+@registry.rule("unindexed_foreign_key")
+def unindexed_foreign_key(context: RuleContext):
+    catalog = context.catalog
+    if catalog is None:
+        return
+    tree = context.tree
+    scans: Dict[str, List[int]] = {}
+    for index in tree.indexes_of_type('Seq Scan'):
+        node = tree.nodes[index]
+        if node.get('Relation Name'):
+            scans.setdefault(node.get('Alias') or node['Relation Name'], []).append(index)
+    if not scans:
+        return
+
+    for index, columns in join_columns(tree, scans).items():
+        node = tree.nodes[index]
+        relation = catalog.relation(node['Relation Name'], node.get('Schema'))
+        if relation is None:
+            continue
+        for fk in catalog.unindexed_foreign_keys(relation):
+            if not set(fk.columns) <= set(columns):
+                continue
+            keys = ', '.join(fk.columns)
+            context.recommend(RecommendationRecord(
+                type="unindexed_foreign_key",
+                description=(f"Внешний ключ {fk.name} ({relation.name}.{keys} -> {fk.referenced}) "
+                             f"используется в соединении, но не проиндексирован"),
+                priority=Priority.MEDIUM,
+                estimated_improvement="Ускорение соединения и каскадных операций на 50-90%",
+                suggested_action=f"Создать индекс на {relation.name}({keys})",
+                affected_components=[relation.name],
+                t1_service=T1CloudService.POSTGRESQL,
+                impact_score=7
+            ), index)
+
+
+@registry.rule("disk_sort", ('Sort',))
+def disk_sort(context: RuleContext, index: int, node: Dict[str, Any]):
+    if (node.get('Sort Method') or '').startswith('external'):
+        context.recommend(RecommendationRecord(
+            type="disk_sort",
+            description="Сортировка выполняется на диске (медленно)",
+            priority=Priority.MEDIUM,
+            estimated_improvement="Ускорение на 50-70%",
+            suggested_action="Увеличить work_mem или оптимизировать ORDER BY",
+            affected_components=["PostgreSQL Configuration"],
+            t1_service=T1CloudService.POSTGRESQL,
+            impact_score=6
+        ), index)
+
+
+@registry.rule("inefficient_join", ('Nested Loop',))
+def inefficient_join(context: RuleContext, index: int, node: Dict[str, Any]):
+    if node['Plan Rows'] > 1000:
+        context.recommend(RecommendationRecord(
+            type="inefficient_join",
+            description="Неэффективное вложенное соединение для большого набора данных",
+            priority=Priority.MEDIUM,
+            estimated_improvement="Ускорение на 30-60%",
+            suggested_action="Рассмотреть Hash Join или Merge Join, добавить индексы",
+            affected_components=["Join Operations"],
+            t1_service=T1CloudService.POSTGRESQL,
+            impact_score=7
+        ), index)
+
+
+@registry.rule("hot_node")
+def hot_node(context: RuleContext):
+    node = context.node_costs[0] if context.node_costs else None
+    if node is None or node.node_index in context.covered:
+        return
+    share = context.analyzer.node_share(node)
+    if share < HOT_NODE_SHARE or context.tree.root.get('Total Cost', 0.0) < HOT_NODE_MIN_COST:
+        return
+    target = f"{node.node_type} по {node.relation}" if node.relation else node.node_type
+    measure = "времени выполнения" if node.time_share is not None else "стоимости плана"
+    context.recommend(RecommendationRecord(
+        type="hot_node",
+        description=f"Узел {target} занимает {share:.0%} {measure} (собственная стоимость {node.exclusive_cost:.2f})",
+        priority=Priority.LOW,
+        estimated_improvement=f"До {share:.0%} времени запроса",
+        suggested_action=HOT_NODE_ACTIONS.get(
+            node.node_type, f"Оптимизировать узел {node.node_type}: он определяет стоимость запроса"),
+        affected_components=[node.relation or node.node_type],
+        t1_service=T1CloudService.POSTGRESQL,
+        impact_score=max(1, min(10, round(share * 10)))
+    ))
+
+
+@registry.rule("row_misestimate")
+def row_misestimate(context: RuleContext):
+    misestimated = {}
+    for node in context.node_actuals:
+        if context.analyzer.is_misestimated(node):
+            misestimated.setdefault(node.relation, node)
+    for relation, node in misestimated.items():
+        target = relation or node.node_type
+        context.recommend(RecommendationRecord(
+            type="row_misestimate",
+            description=(f"Ошибка оценки строк в {target}: ожидалось {node.estimated_rows:,}, "
+                         f"получено {int(node.actual_rows):,} (в {node.row_error:.0f} раз)"),
+            priority=Priority.MEDIUM,
+            estimated_improvement="Более точный выбор плана соединений и доступа",
+            suggested_action=(f"Выполнить ANALYZE {relation} или увеличить default_statistics_target" if relation
+                              else "Создать расширенную статистику (CREATE STATISTICS) по коррелирующим столбцам условий"),
+            affected_components=[target],
+            t1_service=T1CloudService.POSTGRESQL,
+            impact_score=6
+        ))
+
+
+@registry.rule("cartesian_product")
+def cartesian_product(context: RuleContext):
+    if context.tree.count('Nested Loop') > 2:
+        context.warn("Возможное Cartesian product в JOIN операциях")
+
+
+@registry.rule("unbounded_result")
+def unbounded_result(context: RuleContext):
+    query_info = context.query_info
+    if (query_info['type'] == 'SELECT' and 'LIMIT' not in query_info['operations'] and
+            context.tree.root['Plan Rows'] > 10000):
+        context.warn("Большая выборка без LIMIT - риск высокой нагрузки")
+
+
+@registry.rule("slow_actual_node")
+def slow_actual_node(context: RuleContext):
+    for node in sorted(context.node_actuals, key=lambda n: -n.exclusive_time):
+        if node.time_share < HOT_NODE_SHARE:
+            break
+        target = f" по {node.relation}" if node.relation else ""
+        context.warn(
+            f"Узел {node.node_type}{target} занимает {node.time_share:.0%} времени выполнения "
+            f"({node.exclusive_time:.1f} мс, циклов: {node.loops})"
+        )
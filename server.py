@@ -0,0 +1,194 @@
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict
+from .analyzer import T1PgQueryAnalyzer, logger
+from .models import to_report
+from .profiling import percentile
+from .utils import MultipleStatementsError, split_statements
+
+
+MAX_BODY_BYTES = 1024 * 1024
+LATENCY_WINDOW = 10000
+UNAVAILABLE_SQLSTATES = ('08', '53', '57P')
+
+
+def is_unavailable(error: BaseException) -> bool:
+    import psycopg2
+    from psycopg2.pool import PoolError
+
+    while error is not None:
+        if isinstance(error, (psycopg2.InterfaceError, PoolError)):
+            return True
+        if isinstance(error, psycopg2.OperationalError):
+            if error.pgcode is None or error.pgcode.startswith(UNAVAILABLE_SQLSTATES):
+                return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class AnalysisService:
+    def __init__(self, analyzer: T1PgQueryAnalyzer, concurrency: int = 4):
+        if concurrency < 1:
+            raise ValueError("Параллельность должна быть не меньше 1")
+        self.analyzer = analyzer
+        self.concurrency = concurrency
+        self.started_at = time.time()
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.requests = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def analyze(self, query: str) -> bytes:
+        query = query.strip()
+        started = time.perf_counter()
+        with self._lock:
+            self.requests += 1
+            future = self._inflight.get(query)
+            owner = future is None
+            if owner:
+                future = self._inflight[query] = Future()
+            else:
+                self.coalesced += 1
+
+        if owner:
+            try:
+                with self._slots:
+                    report = self.analyzer.analyze_query(query, validate=False)
+                with self.analyzer.stage('serialize'):
+                    body = to_report(report).model_dump_json().encode('utf-8')
+                future.set_result(body)
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    del self._inflight[query]
+
+        try:
+            return future.result()
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            latency = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self._latencies.append(latency)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = list(self._latencies)
+            in_flight = len(self._inflight)
+        plan_cache = self.analyzer.plan_cache
+        return {
+            'uptime': time.time() - self.started_at,
+            'concurrency': self.concurrency,
+            'requests': self.requests,
+            'coalesced': self.coalesced,
+            'errors': self.errors,
+            'in_flight': in_flight,
+            'latency_ms': {
+                'p50': percentile(latencies, 0.5),
+                'p95': percentile(latencies, 0.95),
+                'p99': percentile(latencies, 0.99),
+                'max': max(latencies, default=0.0),
+            },
+            'plan_cache': plan_cache.stats() if plan_cache is not None else None,
+            'rules': [stat._asdict() for stat in self.analyzer.rules.stats()],
+            'stages': self.analyzer.stage_metrics.summary() if self.analyzer.stage_metrics is not None else None,
+        }
+
+
+class AnalysisRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: "AnalysisServer"
+
+    def log_message(self, format: str, *args):
+        logger.debug("%s %s", self.address_string(), format % args)
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json; charset=utf-8"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, data: Any):
+        self._send(status, json.dumps(data, ensure_ascii=False).encode('utf-8'))
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {'status': 'ok'})
+        elif self.path == "/stats":
+            self._send_json(200, self.server.service.stats())
+        elif self.path == "/metrics":
+            stage_metrics = self.server.service.analyzer.stage_metrics
+            body = stage_metrics.prometheus() if stage_metrics is not None else ""
+            self._send(200, body.encode('utf-8'), "text/plain; version=0.0.4; charset=utf-8")
+        else:
+            self._send_json(404, {'error': f"Неизвестный путь: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/analyze":
+            self._send_json(404, {'error': f"Неизвестный путь: {self.path}"})
+            return
+
+        header = self.headers.get("Content-Length")
+        if header is None:
+            self.close_connection = True
+            self._send_json(411, {'error': "Требуется заголовок Content-Length"})
+            return
+        try:
+            length = int(header)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True
+            self._send_json(400, {'error': f"Некорректный заголовок Content-Length: {header}"})
+            return
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            self._send_json(413, {'error': f"Тело запроса больше {MAX_BODY_BYTES} байт"})
+            return
+        body = self.rfile.read(length).decode('utf-8', errors='replace')
+
+        query = body
+        if (self.headers.get("Content-Type") or "").startswith("application/json"):
+            try:
+                query = json.loads(body).get('query') or ''
+            except (ValueError, AttributeError):
+                query = None
+            if not isinstance(query, str):
+                self._send_json(400, {'error': "Ожидается JSON вида {\"query\": \"...\"}"})
+                return
+        statements = split_statements(query)
+        if not statements:
+            self._send_json(400, {'error': "Пустой запрос"})
+            return
+        if len(statements) != 1:
+            self._send_json(400, {'error': str(MultipleStatementsError(len(statements)))})
+            return
+
+        try:
+            self._send(200, self.server.service.analyze(query))
+        except Exception as e:
+            self._send_json(503 if is_unavailable(e) else 422, {'error': str(e)})
+
+
+class AnalysisServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service: AnalysisService):
+        self.service = service
+        super().__init__(address, AnalysisRequestHandler)
+
+
+def make_server(service: AnalysisService, host: str = "127.0.0.1", port: int = 8765) -> AnalysisServer:
+    return AnalysisServer((host, port), service)
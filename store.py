@@ -0,0 +1,305 @@
+import array
+import sqlite3
+import sys
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from .lexer import scan_query
+from .models import AnalysisReport
+
+
+FLOAT_COLUMNS = ('analyzed_at', 'total_cost', 'max_execution_time', 'execution_time',
+                 'total_rows', 'shared_read_blocks', 'score')
+CODE_COLUMNS = ('fingerprint', 'query_type', 'environment', 'critical')
+LIST_COLUMNS = ('table', 'recommendation')
+DICTIONARIES = ('fingerprint', 'query_type', 'environment', 'table', 'recommendation')
+FLUSH_ROWS = 10000
+FLUSH_INTERVAL = 60.0
+BUCKET_SECONDS = {'hour': 3600, 'day': 86400, 'week': 7 * 86400}
+
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dictionary (
+    kind TEXT NOT NULL,
+    code INTEGER NOT NULL,
+    value TEXT NOT NULL,
+    sample TEXT,
+    PRIMARY KEY (kind, code)
+);
+CREATE TABLE IF NOT EXISTS chunk (
+    id INTEGER PRIMARY KEY,
+    rows INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunk_column (
+    chunk INTEGER NOT NULL REFERENCES chunk(id),
+    name TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (chunk, name)
+);
+"""
+
+
+class FingerprintCost(NamedTuple):
+    fingerprint: str
+    query: str
+    reports: int
+    p50: float
+    p95: float
+    max_cost: float
+
+
+class TableLoad(NamedTuple):
+    table: str
+    reports: int
+    critical: int
+    total_cost: float
+
+
+class RecommendationTrend(NamedTuple):
+    buckets: List[float]
+    types: List[str]
+    counts: List[List[int]]
+
+
+def _buffers() -> Dict[str, array.array]:
+    columns = {name: array.array('d') for name in FLOAT_COLUMNS}
+    columns.update({name: array.array('i') for name in CODE_COLUMNS})
+    for name in LIST_COLUMNS:
+        columns[name] = array.array('i')
+        columns[f"{name}_count"] = array.array('i')
+    return columns
+
+
+class ReportStore:
+    def __init__(self, path: str, flush_rows: int = FLUSH_ROWS, flush_interval: float = FLUSH_INTERVAL):
+        self.path = path
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self._flushed_at = time.monotonic()
+        self.connection = sqlite3.connect(path, timeout=30.0)
+        self.connection.executescript(STORE_SCHEMA)
+        self.codes: Dict[str, Dict[str, int]] = {kind: {} for kind in DICTIONARIES}
+        self.values: Dict[str, List[str]] = {kind: [] for kind in DICTIONARIES}
+        self.samples: Dict[int, str] = {}
+        self._pending: Dict[str, Dict[str, int]] = {kind: {} for kind in DICTIONARIES}
+        self._new_codes: List[Tuple[str, str, Optional[str]]] = []
+        self._buffer = _buffers()
+        self._buffered = 0
+        self._load_dictionary()
+
+    def _load_dictionary(self):
+        for kind in DICTIONARIES:
+            rows = self.connection.execute(
+                "SELECT code, value, sample FROM dictionary WHERE kind = ? AND code >= ? ORDER BY code",
+                (kind, len(self.values[kind]))
+            )
+            for code, value, sample in rows:
+                self.codes[kind][value] = code
+                self.values[kind].append(value)
+                if sample is not None:
+                    self.samples[code] = sample
+
+    def __len__(self) -> int:
+        stored = self.connection.execute("SELECT coalesce(sum(rows), 0) FROM chunk").fetchone()[0]
+        return stored + self._buffered
+
+    def _code(self, kind: str, value: str, sample: Optional[str] = None) -> int:
+        code = self.codes[kind].get(value)
+        if code is None:
+            pending = self._pending[kind]
+            code = pending.get(value)
+            if code is None:
+                code = pending[value] = -1 - len(self._new_codes)
+                self._new_codes.append((kind, value, sample))
+        return code
+
+    def add(self, report: AnalysisReport):
+        info = scan_query(report.query)
+        metrics = report.metrics
+        buffer = self._buffer
+        buffer['analyzed_at'].append(report.analyzed_at.timestamp())
+        buffer['total_cost'].append(metrics.total_cost)
+        buffer['max_execution_time'].append(metrics.max_execution_time)
+        buffer['execution_time'].append(metrics.execution_time if metrics.execution_time is not None else float('nan'))
+        buffer['total_rows'].append(metrics.total_rows)
+        buffer['shared_read_blocks'].append(metrics.shared_read_blocks)
+        buffer['score'].append(report.score)
+        buffer['fingerprint'].append(self._code('fingerprint', info.fingerprint, info.normalized[:1000]))
+        buffer['query_type'].append(self._code('query_type', report.query_type))
+        buffer['environment'].append(self._code('environment', report.t1_environment or ''))
+        buffer['critical'].append(int(report.is_critical))
+
+        tables = {self._code('table', table) for table in report.tables_affected}
+        buffer['table'].extend(sorted(tables))
+        buffer['table_count'].append(len(tables))
+        recommendations = [self._code('recommendation', rec.type) for rec in report.recommendations]
+        buffer['recommendation'].extend(recommendations)
+        buffer['recommendation_count'].append(len(recommendations))
+
+        self._buffered += 1
+        if self._buffered >= self.flush_rows or time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def _allocate_codes(self) -> Tuple[List[int], List[Tuple[str, int, str, Optional[str]]]]:
+        next_codes = {kind: len(values) for kind, values in self.values.items()}
+        codes: List[int] = []
+        rows: List[Tuple[str, int, str, Optional[str]]] = []
+        for kind, value, sample in self._new_codes:
+            code = self.codes[kind].get(value)
+            if code is None:
+                code = next_codes[kind]
+                next_codes[kind] += 1
+                rows.append((kind, code, value, sample))
+            codes.append(code)
+        return codes, rows
+
+    def _resolve_codes(self, codes: List[int]) -> Dict[str, array.array]:
+        columns = dict(self._buffer)
+        for kind in DICTIONARIES:
+            columns[kind] = array.array('i', [code if code >= 0 else codes[-1 - code] for code in columns[kind]])
+        return columns
+
+    def flush(self):
+        self._flushed_at = time.monotonic()
+        if not self._buffered and not self._new_codes:
+            return
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self._load_dictionary()
+            codes, rows = self._allocate_codes()
+            self.connection.executemany(
+                "INSERT INTO dictionary (kind, code, value, sample) VALUES (?, ?, ?, ?)", rows
+            )
+            if self._buffered:
+                columns = self._resolve_codes(codes)
+                chunk = self.connection.execute("INSERT INTO chunk (rows) VALUES (?)", (self._buffered,)).lastrowid
+                self.connection.executemany(
+                    "INSERT INTO chunk_column (chunk, name, data) VALUES (?, ?, ?)",
+                    [(chunk, name, self._to_bytes(column)) for name, column in columns.items()]
+                )
+        for kind, code, value, sample in rows:
+            self.codes[kind][value] = code
+            self.values[kind].append(value)
+            if sample is not None:
+                self.samples[code] = sample
+        self._pending = {kind: {} for kind in DICTIONARIES}
+        self._new_codes = []
+        self._buffer = _buffers()
+        self._buffered = 0
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.connection.close()
+
+    @staticmethod
+    def _to_bytes(column: array.array) -> bytes:
+        if sys.byteorder == 'big':
+            column = array.array(column.typecode, column)
+            column.byteswap()
+        return column.tobytes()
+
+    def columns(self) -> Dict[str, Any]:
+        import numpy as np
+
+        self.flush()
+        parts: Dict[str, List[Any]] = {name: [] for name in _buffers()}
+        rows = self.connection.execute("SELECT name, data FROM chunk_column ORDER BY chunk")
+        for name, data in rows:
+            if name in parts:
+                dtype = '<f8' if name in FLOAT_COLUMNS else '<i4'
+                parts[name].append(np.frombuffer(data, dtype=dtype))
+        self._load_dictionary()
+
+        columns = {}
+        for name, chunks in parts.items():
+            dtype = np.float64 if name in FLOAT_COLUMNS else np.int32
+            columns[name] = np.concatenate(chunks).astype(dtype, copy=False) if chunks else np.empty(0, dtype)
+        return columns
+
+    @staticmethod
+    def _select(columns: Dict[str, Any], since: Optional[float]) -> Any:
+        import numpy as np
+
+        if since is None:
+            return np.ones(len(columns['analyzed_at']), dtype=bool)
+        return columns['analyzed_at'] >= since
+
+    @staticmethod
+    def _expand(columns: Dict[str, Any], name: str, mask: Any) -> Tuple[Any, Any]:
+        import numpy as np
+
+        counts = columns[f"{name}_count"]
+        rows = np.repeat(np.arange(len(counts)), counts)
+        keep = mask[rows]
+        return columns[name][keep], rows[keep]
+
+    def cost_percentiles(self, limit: int = 20, since: Optional[float] = None) -> List[FingerprintCost]:
+        import numpy as np
+
+        columns = self.columns()
+        mask = self._select(columns, since)
+        codes = columns['fingerprint'][mask]
+        costs = columns['total_cost'][mask]
+        if not len(codes):
+            return []
+
+        order = np.lexsort((costs, codes))
+        codes, costs = codes[order], costs[order]
+        groups, starts, counts = np.unique(codes, return_index=True, return_counts=True)
+
+        def percentile(q: float):
+            position = starts + q * (counts - 1)
+            low = np.floor(position).astype(np.int64)
+            high = np.ceil(position).astype(np.int64)
+            return costs[low] + (costs[high] - costs[low]) * (position - low)
+
+        p50, p95 = percentile(0.5), percentile(0.95)
+        maximum = costs[starts + counts - 1]
+        top = np.argsort(-p95, kind='stable')[:limit]
+        fingerprints = self.values['fingerprint']
+        return [
+            FingerprintCost(fingerprints[groups[i]], self.samples.get(int(groups[i]), ''), int(counts[i]),
+                            float(p50[i]), float(p95[i]), float(maximum[i]))
+            for i in top
+        ]
+
+    def top_tables(self, limit: int = 20, since: Optional[float] = None) -> List[TableLoad]:
+        import numpy as np
+
+        columns = self.columns()
+        tables, rows = self._expand(columns, 'table', self._select(columns, since))
+        if not len(tables):
+            return []
+
+        size = len(self.values['table'])
+        reports = np.bincount(tables, minlength=size)
+        critical = np.bincount(tables, weights=columns['critical'][rows], minlength=size)
+        total_cost = np.bincount(tables, weights=columns['total_cost'][rows], minlength=size)
+        top = np.argsort(-total_cost, kind='stable')[:limit]
+        return [
+            TableLoad(self.values['table'][i], int(reports[i]), int(critical[i]), float(total_cost[i]))
+            for i in top if reports[i]
+        ]
+
+    def recommendation_frequency(self, bucket: str = 'day', since: Optional[float] = None) -> RecommendationTrend:
+        import numpy as np
+
+        if bucket not in BUCKET_SECONDS:
+            raise ValueError(f"Неизвестный интервал группировки: {bucket}")
+        columns = self.columns()
+        types, rows = self._expand(columns, 'recommendation', self._select(columns, since))
+        if not len(types):
+            return RecommendationTrend([], [], [])
+
+        width = BUCKET_SECONDS[bucket]
+        slots = (columns['analyzed_at'][rows] // width).astype(np.int64)
+        first = slots.min()
+        size = len(self.values['recommendation'])
+        counts = np.bincount((slots - first) * size + types).astype(np.int64)
+        counts = np.pad(counts, (0, (-len(counts)) % size)).reshape(-1, size)
+        used = np.flatnonzero(counts.sum(axis=0))
+        return RecommendationTrend(
+            [float((first + i) * width) for i in range(len(counts))],
+            [self.values['recommendation'][i] for i in used],
+            counts[:, used].tolist()
+        )
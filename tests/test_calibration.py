@@ -0,0 +1,63 @@
+import pytest
+from ..calibration import ExecutionTimeModel, node_actual_times, node_loops, parallel_processes, plan_samples
+from ..plan_tree import PlanTree
+
+
+def law(cost: float, rows: float) -> float:
+    return 0.01 * cost + 0.001 * rows
+
+
+def nested_loop(outer_rows: int, analyze: bool = True):
+    outer_cost = 1 + 0.01 * outer_rows
+    inner = {'Node Type': 'Index Scan', 'Parent Relationship': 'Inner', 'Relation Name': 'items',
+             'Total Cost': 4.0, 'Plan Rows': 1, 'Plan Width': 8}
+    outer = {'Node Type': 'Seq Scan', 'Parent Relationship': 'Outer', 'Relation Name': 'orders',
+             'Total Cost': outer_cost, 'Plan Rows': outer_rows, 'Plan Width': 8}
+    root = {'Node Type': 'Nested Loop', 'Total Cost': outer_cost + 4.0 * outer_rows + 0.01 * outer_rows,
+            'Plan Rows': outer_rows, 'Plan Width': 16, 'Plans': [outer, inner]}
+    if analyze:
+        inner.update({'Actual Total Time': law(4.0, 1), 'Actual Loops': outer_rows})
+        outer.update({'Actual Total Time': law(outer_cost, outer_rows), 'Actual Loops': 1})
+        root.update({'Actual Total Time': outer['Actual Total Time'] + outer_rows * inner['Actual Total Time'] +
+                     law(0.01 * outer_rows, outer_rows), 'Actual Loops': 1})
+    return [{'Plan': root}]
+
+
+def test_samples_cover_all_loops():
+    samples = {node_type: (features, actual) for node_type, features, actual in plan_samples(nested_loop(100))}
+
+    features, actual = samples['Index Scan']
+    assert features[1:3] == [400.0, 100.0]
+    assert actual == pytest.approx(100 * law(4.0, 1))
+    features, actual = samples['Nested Loop']
+    assert features[1] == pytest.approx(1.0)
+    assert actual == pytest.approx(law(1.0, 100))
+
+
+def test_estimated_loops_follow_nested_loop_outer_rows():
+    assert node_loops(PlanTree.from_explain(nested_loop(50, analyze=False))) == [1.0, 1.0, 50.0]
+
+
+def test_parallel_time_is_per_process():
+    plan = [{'Plan': {
+        'Node Type': 'Gather', 'Total Cost': 100.0, 'Plan Rows': 300, 'Plan Width': 8,
+        'Actual Total Time': 10.0, 'Actual Loops': 1,
+        'Plans': [{'Node Type': 'Seq Scan', 'Total Cost': 90.0, 'Plan Rows': 100, 'Plan Width': 8,
+                   'Actual Total Time': 9.0, 'Actual Loops': 3}],
+    }}]
+    tree = PlanTree.from_explain(plan)
+
+    assert parallel_processes(tree) == [1, 3]
+    assert node_loops(tree) == [1.0, 1.0]
+    assert node_actual_times(tree) == [pytest.approx(1.0), pytest.approx(9.0)]
+
+
+def test_fitted_model_predicts_total_time():
+    samples = [sample for rows in range(10, 200, 10) for sample in plan_samples(nested_loop(rows))]
+    model = ExecutionTimeModel.fit(samples, 'test')
+
+    assert set(model.coefficients) == {'Index Scan', 'Nested Loop', 'Seq Scan'}
+    expected = nested_loop(250)[0]['Plan']['Actual Total Time']
+    assert model.predict(PlanTree.from_explain(nested_loop(250, analyze=False))) == pytest.approx(expected, rel=1e-6)
+    assert ExecutionTimeModel.from_dict(model.to_dict()).predict_node('Seq Scan', [1.0, 10.0, 100.0, 1.0]) == \
+        pytest.approx(model.predict_node('Seq Scan', [1.0, 10.0, 100.0, 1.0]))
@@ -0,0 +1,28 @@
+from ..analyzer import T1PgQueryAnalyzer
+from ..compare import ClusterResult, QueryComparison, drift
+
+
+PLAN = [{'Plan': {'Node Type': 'Seq Scan', 'Relation Name': 't', 'Startup Cost': 0.0, 'Total Cost': 100.0,
+                  'Plan Rows': 10, 'Plan Width': 4}}]
+
+
+def result(cluster: str, error: bool = False) -> ClusterResult:
+    if error:
+        return ClusterResult(cluster, None, [], 0.0, ConnectionError("connection refused"))
+    return ClusterResult(cluster, T1PgQueryAnalyzer(None, 'test').build_report(PLAN, "SELECT * FROM t"), [], 0.0, None)
+
+
+def comparison(*results: ClusterResult) -> QueryComparison:
+    return QueryComparison(0, "SELECT * FROM t", list(results))
+
+
+def test_same_plans_do_not_drift():
+    assert drift(comparison(result('a'), result('b'))) == []
+
+
+def test_failed_cluster_drifts():
+    assert drift(comparison(result('a'), result('b', error=True))) == ["Ошибка анализа на b"]
+
+
+def test_all_clusters_failed_drifts():
+    assert drift(comparison(result('a', error=True), result('b', error=True))) == ["Ошибка анализа на a, b"]
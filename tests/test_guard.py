@@ -0,0 +1,64 @@
+import threading
+import time
+import pytest
+from psycopg2 import sql
+from ..analyzer import T1PgQueryAnalyzer
+from ..guard import QueryBlocked, QueryGuard
+
+
+def seq_scan(cost: float):
+    return [{'Plan': {'Node Type': 'Seq Scan', 'Relation Name': 'orders', 'Startup Cost': 0, 'Total Cost': cost,
+                      'Plan Rows': 100, 'Plan Width': 8}}]
+
+
+def analyzer(cost: float = 10.0, delay: float = 0.0):
+    analyzer = T1PgQueryAnalyzer(None, 'test')
+    analyzer.explained = 0
+
+    def explain(query, query_info=None):
+        analyzer.explained += 1
+        time.sleep(delay)
+        return seq_scan(cost)
+
+    analyzer.get_explain_plan = explain
+    return analyzer
+
+
+def test_block_mode_raises_on_expensive_query():
+    guard = QueryGuard(analyzer(cost=10000.0), max_cost=5000.0, mode='block', block_critical=False)
+
+    with pytest.raises(QueryBlocked):
+        guard.check("SELECT * FROM orders")
+    with pytest.raises(QueryBlocked):
+        guard.check("select *  from orders")
+    assert guard.stats()['analyzed'] == 1
+    assert guard.stats()['violations'] == 2
+
+
+def test_composed_query_requires_cursor():
+    guard = QueryGuard(analyzer())
+
+    with pytest.raises(ValueError):
+        guard.check(sql.SQL("SELECT * FROM {}").format(sql.Identifier('orders')))
+    assert guard.stats()['checks'] == 0
+
+
+def test_background_analysis_is_scheduled_once():
+    source = analyzer(delay=0.05)
+    guard = QueryGuard(source, background=True)
+    threads = [
+        threading.Thread(target=lambda i=i: [guard.check(f"SELECT * FROM orders WHERE id = {i * 100 + j}")
+                                             for j in range(50)])
+        for i in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    guard.close()
+
+    stats = guard.stats()
+    assert stats['checks'] == 400
+    assert stats['analyzed'] == source.explained == 1
+    assert guard.check("SELECT * FROM orders WHERE id = 1").violation is False
+    assert guard.stats()['analyzed'] == 1
@@ -0,0 +1,37 @@
+from ..history import PlanHistory
+
+
+SEQ_SCAN = ['Seq Scan on orders']
+INDEX_SCAN = ['Index Scan on orders using orders_customer_idx']
+
+
+def test_plan_change_is_recorded(tmp_path):
+    history = PlanHistory(str(tmp_path / 'history.db'))
+
+    assert history.record('fp', 'prod', SEQ_SCAN, 1000.0) is None
+    assert history.record('fp', 'prod', SEQ_SCAN, 1100.0) is None
+    change = history.record('fp', 'prod', INDEX_SCAN, 10.0)
+
+    assert change is not None
+    assert change.previous_cost == 1100.0
+    assert change.cost_delta == -1090.0
+    assert '-Seq Scan on orders' in change.diff and '+' + INDEX_SCAN[0] in change.diff
+    versions = history.versions('fp', 'prod')
+    assert [version.previous_hash is None for version in versions] == [False, True]
+    assert history.recent_changes() == versions[:1]
+    assert history.diff(versions[0]) == change.diff
+    history.close()
+
+
+def test_environments_are_independent(tmp_path):
+    path = str(tmp_path / 'history.db')
+    history = PlanHistory(path)
+    history.record('fp', 'prod', SEQ_SCAN, 1000.0)
+    history.close()
+
+    history = PlanHistory(path)
+    assert history.record('fp', 'stage', INDEX_SCAN, 10.0) is None
+    assert history.record('fp', None, INDEX_SCAN, 10.0) is None
+    assert history.record('fp', 'prod', INDEX_SCAN, 10.0) is not None
+    assert history.recent_changes(limit=5)[0].environment == 'prod'
+    history.close()
@@ -0,0 +1,58 @@
+import pytest
+from ..bench import LEXER_SHAPES, generate_large_query, legacy_extract_query_info
+from ..lexer import scan_query
+
+
+def test_literals_and_lists_are_folded():
+    first = scan_query("SELECT * FROM orders WHERE id IN (1, 2, 3) ORDER BY created_at LIMIT 10")
+    second = scan_query("select *  from orders\nwhere id in (4,5) order by created_at limit 20;")
+
+    assert first.normalized == "select * from orders where id in (?) order by created_at limit ?"
+    assert first.fingerprint == second.fingerprint
+    assert first.operations == ['FILTER', 'SORT', 'LIMIT']
+    assert scan_query("INSERT INTO items (a, b) VALUES (1, 'x'), (2, 'y')").normalized == \
+        "insert into items (a, b) values (?)"
+
+
+def test_ctes_and_quoted_relations():
+    info = scan_query(
+        'WITH recent AS (SELECT * FROM public.orders o WHERE o.ts > now()) '
+        'SELECT c.name FROM recent r JOIN "Sales"."Customers" c ON c.id = r.customer_id GROUP BY c.name'
+    )
+
+    assert info.type == 'SELECT'
+    assert info.ctes == ['recent']
+    assert info.tables == ['public.orders', 'Sales.Customers']
+    assert info.operations == ['FILTER', 'AGGREGATE', 'JOIN']
+    assert '"Sales"."Customers"' in info.normalized
+
+
+@pytest.mark.parametrize('query, tables, normalized', [
+    ("UPDATE accounts SET note = E'it\\'s -- not a comment' WHERE id = $1 AND tenant = $12",
+     ['accounts'], "update accounts set note = ? where id = ? and tenant = ?"),
+    ("SELECT $tag$ FROM fake $tag$, extract(year from ts) FROM a, b /* FROM c /* nested */ FROM d */ -- FROM e\n",
+     ['a', 'b'], "select ?, extract(year from ts) from a, b"),
+    ("SELECT name FROM t WHERE note = 'O''Brien'", ['t'], "select name from t where note = ?"),
+    ("select 1 from tablee'x'", ['tablee'], "select ? from tablee?"),
+])
+def test_protected_text_is_masked(query, tables, normalized):
+    info = scan_query(query)
+
+    assert info.tables == tables
+    assert info.normalized == normalized
+
+
+def test_max_param():
+    assert scan_query("SELECT * FROM t WHERE a = $1 AND b = $12").max_param == 12
+    assert scan_query("SELECT '$5' FROM t").max_param == 0
+
+
+@pytest.mark.parametrize('shape', LEXER_SHAPES)
+def test_matches_legacy_on_benchmark_queries(shape):
+    query = generate_large_query(shape, 200)
+    info = scan_query(query)
+    legacy = legacy_extract_query_info(query)
+
+    assert info.type == legacy['type']
+    assert sorted(info.tables) == sorted(table.lower() for table in legacy['tables'])
+    assert info.operations == legacy['operations']
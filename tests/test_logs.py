@@ -0,0 +1,91 @@
+import os
+import pytest
+from .. import logs
+from ..logs import LogState, iter_log_messages, iter_log_plans, parse_plan_message
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+SAMPLES = [
+    ('postgresql.log', 'stderr'),
+    ('postgresql.csv', 'csvlog'),
+    ('postgresql.json', 'jsonlog'),
+]
+
+
+def fixture(name: str) -> str:
+    return os.path.join(FIXTURES, name)
+
+
+def read_plans(name: str, log_format: str):
+    with open(fixture(name), 'rb') as f:
+        messages = [message for _, message in iter_log_messages(f, 0, log_format) if message is not None]
+    return [parsed for parsed in map(parse_plan_message, messages) if parsed is not None]
+
+
+@pytest.mark.parametrize('name, log_format', SAMPLES)
+def test_iter_log_messages(name, log_format):
+    plans = read_plans(name, log_format)
+
+    assert [(duration, query) for duration, query, _ in plans] == [
+        (12.345, "SELECT * FROM orders WHERE customer_id = 42;"),
+        (0.812, "SELECT count(*) FROM customers;"),
+    ]
+    first, second = plans[0][2][0]['Plan'], plans[1][2][0]['Plan']
+    assert first['Node Type'] == 'Seq Scan'
+    assert first['Filter'] == "(customer_id = 42)"
+    assert second['Node Type'] == 'Aggregate'
+    assert second['Plans'][0]['Relation Name'] == 'customers'
+
+
+def test_stderr_plan_closed_by_next_log_line(tmp_path):
+    path = tmp_path / 'postgresql.log'
+    path.write_bytes(
+        b"2024-05-14 10:15:02.123 UTC [4242] LOG:  duration: 1.500 ms  plan:\n"
+        b"\t{\"Query Text\": \"SELECT 1;\", \"Plan\": {\"Node Type\": \"Result\",\n"
+        b"\t  \"Plan Rows\": 1}}\n"
+        b"2024-05-14 10:15:02.480 UTC [4243] LOG:  statement: SELECT 2;\n"
+    )
+    plans = read_plans(str(path), 'stderr')
+
+    assert [(duration, query) for duration, query, _ in plans] == [(1.5, "SELECT 1;")]
+
+
+def test_stderr_plan_without_tabs(tmp_path):
+    with open(fixture('postgresql.log'), 'rb') as f:
+        content = f.read().replace(b'\n\t', b'\n')
+    path = tmp_path / 'postgresql.log'
+    path.write_bytes(content)
+
+    assert [query for _, query, _ in read_plans(str(path), 'stderr')] == [
+        "SELECT * FROM orders WHERE customer_id = 42;",
+        "SELECT count(*) FROM customers;",
+    ]
+
+
+@pytest.mark.parametrize('name, log_format', SAMPLES)
+def test_iter_log_plans_resumes_from_offset(tmp_path, name, log_format):
+    state = LogState(str(tmp_path / 'state.json'))
+    plans = list(iter_log_plans(fixture(name), state))
+
+    assert [plan.query for plan in plans] == [
+        "SELECT * FROM orders WHERE customer_id = 42;",
+        "SELECT count(*) FROM customers;",
+    ]
+    assert plans[0].offset < plans[1].offset
+    assert list(iter_log_plans(fixture(name), state)) == []
+
+
+def test_csvlog_record_over_limit_is_skipped(tmp_path, monkeypatch):
+    monkeypatch.setattr(logs, 'MAX_ENTRY_BYTES', 4096)
+    with open(fixture('postgresql.csv'), 'rb') as f:
+        content = f.read().replace(b'  ""Plan"": {\n    ""Node Type"": ""Seq Scan""',
+                                   b'  ""Plan"": {\n' + b'    \n' * 8192 + b'    ""Node Type"": ""Seq Scan""')
+    path = tmp_path / 'postgresql.csv'
+    path.write_bytes(content)
+
+    with open(path, 'rb') as f:
+        records = [record for _, record in logs._iter_records(f, 0, 'csvlog')]
+    assert len(records) == 2
+    assert max(map(len, records)) <= 4096
+    assert [query for _, query, _ in read_plans(str(path), 'csvlog')] == ["SELECT count(*) FROM customers;"]
@@ -0,0 +1,46 @@
+import json
+from ..analyzer import T1PgQueryAnalyzer
+from ..models import to_report
+from ..ndjson import encode_report, field_tree
+
+
+PLAN = [{
+    'Plan': {
+        'Node Type': 'Hash Join', 'Join Type': 'Inner', 'Startup Cost': 0, 'Total Cost': 20000,
+        'Plan Rows': 50000, 'Plan Width': 16,
+        'Plans': [
+            {'Node Type': 'Seq Scan', 'Relation Name': 'orders', 'Startup Cost': 0, 'Total Cost': 15000,
+             'Plan Rows': 50000, 'Plan Width': 8, 'Filter': '(amount > 10)'},
+            {'Node Type': 'Hash', 'Startup Cost': 3000, 'Total Cost': 3000, 'Plan Rows': 1000, 'Plan Width': 8,
+             'Plans': [{'Node Type': 'Seq Scan', 'Relation Name': 'customers', 'Startup Cost': 0,
+                        'Total Cost': 2500.0, 'Plan Rows': 1000.0, 'Plan Width': 8}]},
+        ],
+    },
+}]
+QUERY = "SELECT * FROM orders o JOIN customers c ON c.id = o.customer_id WHERE o.amount > 10"
+
+
+def typed(value):
+    if isinstance(value, dict):
+        return {key: typed(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [typed(item) for item in value]
+    return type(value).__name__, value
+
+
+def test_record_and_model_encode_identically():
+    record = T1PgQueryAnalyzer(None, 'test').build_report(PLAN, QUERY)
+
+    encoded = json.loads(encode_report(record))
+    assert typed(encoded) == typed(json.loads(encode_report(to_report(record))))
+    assert encoded['metrics']['total_cost'] == 20000.0
+    assert isinstance(encoded['metrics']['startup_cost'], float)
+    assert isinstance(encoded['metrics']['total_rows'], int)
+
+
+def test_projected_fields_keep_model_types():
+    record = T1PgQueryAnalyzer(None, 'test').build_report(PLAN, QUERY)
+    fields = ['score', 'metrics.total_cost', 'metrics.startup_cost', 'hot_nodes.total_cost']
+
+    tree = field_tree(fields)
+    assert typed(json.loads(encode_report(record, tree))) == typed(json.loads(encode_report(to_report(record), tree)))
@@ -0,0 +1,42 @@
+import json
+import pytest
+from ..offline import analyze_offline, extract_plans, iter_plan_documents, split_plan_texts
+
+
+PLAN = {"Query Text": "SELECT 1;", "Plan": {"Node Type": "Result", "Total Cost": 0.01, "Plan Rows": 1, "Plan Width": 4}}
+
+
+def test_extract_plans_from_array():
+    text = json.dumps([{"Plan": PLAN["Plan"]}, {"Plan": PLAN["Plan"]}])
+    errors = []
+
+    assert len(extract_plans(text, errors)) == 2
+    assert errors == []
+    assert sum(len(extract_plans(chunk, errors)) for _, chunk in split_plan_texts(text)) == 2
+    assert errors == []
+
+
+def test_extract_plans_reports_broken_document():
+    broken = '{"Query Text": "SELECT 2;", "Plan": {"Node Type": '
+    text = "LOG: plan:\n" + json.dumps(PLAN) + "\nLOG: plan:\n" + broken
+    errors = []
+
+    assert [query for query, _ in extract_plans(text, errors)] == ["SELECT 1;"]
+    assert [start for start, _ in errors] == [text.index(broken)]
+
+
+def test_analyze_offline_reports_offset(tmp_path):
+    broken = '{"Plan": {"Node Type": "Result",'
+    text = json.dumps(PLAN) + "\n" + broken
+    path = tmp_path / 'plans.json'
+    path.write_text(text)
+
+    results = list(analyze_offline(str(path), workers=1))
+
+    assert [result.error is None for result in results] == [True, False]
+    assert f"смещение {text.index(broken)}" in results[1].error
+
+
+def test_missing_source(tmp_path):
+    with pytest.raises(ValueError):
+        iter_plan_documents(str(tmp_path / 'missing.tar.gz'))
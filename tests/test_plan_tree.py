@@ -0,0 +1,16 @@
+from ..plan_tree import PlanTree, structural_hash
+
+
+def plan(verbose: bool):
+    scan = {'Node Type': 'Index Scan', 'Scan Direction': 'Forward', 'Index Name': 'orders_pkey',
+            'Relation Name': 'orders', 'Alias': 'orders', 'Total Cost': 8.45, 'Plan Rows': 1}
+    if verbose:
+        scan.update({'Schema': 'public', 'Output': ['id', 'amount']})
+    return [{'Plan': scan}]
+
+
+def test_outline_ignores_verbose_schema():
+    plain, verbose = PlanTree.from_explain(plan(False)), PlanTree.from_explain(plan(True))
+
+    assert plain.outline() == verbose.outline() == ["Index Scan (Forward) using orders_pkey on orders"]
+    assert structural_hash(plain.outline()) == structural_hash(verbose.outline())
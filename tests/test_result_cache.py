@@ -0,0 +1,47 @@
+import pytest
+from ..analyzer import T1PgQueryAnalyzer
+from ..result_cache import ResultCache
+
+
+PLAN = [{'Plan': {'Node Type': 'Seq Scan', 'Relation Name': 'orders', 'Startup Cost': 0, 'Total Cost': 1834.0,
+                  'Plan Rows': 12, 'Plan Width': 64}}]
+QUERY = "SELECT * FROM orders"
+
+
+def test_cache_requires_catalog(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache.db'))
+    with pytest.raises(ValueError):
+        cache.get(QUERY)
+    cache.close()
+
+
+def test_cache_is_keyed_by_statement_and_catalog(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    record = T1PgQueryAnalyzer(None, 'test').build_report(PLAN, QUERY)
+    cache = ResultCache(path)
+    cache.catalog = 'v1'
+    cache.put(QUERY, record)
+    cache.close()
+
+    cache = ResultCache(path)
+    cache.catalog = 'v1'
+    report = cache.get("  " + QUERY + "\n")
+    assert report is not None and report.metrics.total_cost == 1834.0
+    assert cache.get(QUERY + " WHERE id = 1") is None
+    cache.catalog = 'v2'
+    assert cache.get(QUERY) is None
+    assert cache.summary() == (1, 0, 0, 1)
+    cache.close()
+
+
+def test_prune_removes_unused_entries(tmp_path):
+    record = T1PgQueryAnalyzer(None, 'test').build_report(PLAN, QUERY)
+    cache = ResultCache(str(tmp_path / 'cache.db'), prune_days=1.0)
+    cache.catalog = 'v1'
+    cache.put(QUERY, record)
+
+    assert cache.prune() == 0
+    cache.prune_days = -1.0
+    assert cache.prune() == 1
+    assert cache.summary() == (0, 1, 1, 0)
+    cache.close()
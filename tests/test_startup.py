@@ -0,0 +1,10 @@
+from .. import bench
+from ..bench import STARTUP_BUDGET_MS, STARTUP_FORBIDDEN_MODULES, measure_startup
+
+
+def test_cli_startup_budget():
+    total, modules = min((measure_startup() for _ in range(3)), key=lambda run: run[0])
+
+    assert f"{bench.__package__}.cli" in modules
+    assert [name for name in STARTUP_FORBIDDEN_MODULES if name in modules] == []
+    assert total <= STARTUP_BUDGET_MS
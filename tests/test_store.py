@@ -0,0 +1,66 @@
+import pytest
+from ..analyzer import T1PgQueryAnalyzer
+from ..models import to_report
+from ..store import ReportStore
+
+
+def seq_scan(table: str, cost: float):
+    return [{'Plan': {'Node Type': 'Seq Scan', 'Relation Name': table, 'Startup Cost': 0, 'Total Cost': cost,
+                      'Plan Rows': 1000, 'Plan Width': 8}}]
+
+
+def report(table: str, cost: float):
+    return to_report(T1PgQueryAnalyzer(None, 'test').build_report(seq_scan(table, cost), f"SELECT * FROM {table}"))
+
+
+def test_reports_survive_reopen(tmp_path):
+    path = str(tmp_path / 'store.db')
+    store = ReportStore(path)
+    for cost in (100.0, 200.0, 300.0):
+        store.add(report('orders', cost))
+    store.add(report('customers', 50.0))
+    store.close()
+
+    store = ReportStore(path)
+    assert len(store) == 4
+    assert [(load.table, load.reports, load.total_cost) for load in store.top_tables()] == [
+        ('orders', 3, 600.0), ('customers', 1, 50.0)
+    ]
+    costs = {cost.query: (cost.reports, cost.p50, cost.max_cost) for cost in store.cost_percentiles()}
+    assert costs["select * from orders"] == (3, 200.0, 300.0)
+    store.close()
+
+
+def test_writers_share_dictionary(tmp_path):
+    path = str(tmp_path / 'store.db')
+    first, second = ReportStore(path), ReportStore(path)
+    first.add(report('orders', 100.0))
+    second.add(report('customers', 50.0))
+    second.add(report('orders', 10.0))
+    first.flush()
+    second.flush()
+
+    assert [(load.table, load.reports) for load in first.top_tables()] == [('orders', 2), ('customers', 1)]
+    first.close()
+    second.close()
+
+
+def test_failed_flush_keeps_buffer(tmp_path, monkeypatch):
+    path = str(tmp_path / 'store.db')
+    store = ReportStore(path)
+    store.add(report('orders', 100.0))
+
+    def fail(column):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(store, '_to_bytes', fail)
+    with pytest.raises(RuntimeError):
+        store.flush()
+    monkeypatch.undo()
+
+    store.add(report('customers', 50.0))
+    store.close()
+
+    store = ReportStore(path)
+    assert [(load.table, load.reports) for load in store.top_tables()] == [('orders', 1), ('customers', 1)]
+    store.close()
@@ -0,0 +1,49 @@
+import pytest
+from ..utils import MultipleStatementsError, ensure_single_statement, is_single_statement, split_statements
+
+
+def test_split_statements_basic():
+    assert split_statements("SELECT 1; SELECT 2;\n\n;  ") == ["SELECT 1", "SELECT 2"]
+    assert split_statements("  ;  -- только комментарий\n") == []
+
+
+@pytest.mark.parametrize('sql', [
+    "SELECT 'a;b'",
+    "SELECT 'it''s; fine'",
+    'SELECT "weird;name" FROM t',
+    "SELECT E'a\\';b'",
+    "SELECT e'\\\\'",
+    "SELECT $$a;b$$",
+    "SELECT $fn$ a; $$ b; $fn$",
+    "SELECT 1 -- ; DELETE FROM t",
+    "SELECT /* ; /* nested ; */ still comment; */ 1",
+])
+def test_single_statement(sql):
+    assert split_statements(sql) == [sql]
+    assert is_single_statement(sql)
+
+
+@pytest.mark.parametrize('sql, expected', [
+    ("SELECT E'x'; SELECT 2", ["SELECT E'x'", "SELECT 2"]),
+    ("SELECT $$x$$; SELECT 2", ["SELECT $$x$$", "SELECT 2"]),
+    ("SELECT /* /* */ */ 1; SELECT 2", ["SELECT /* /* */ */ 1", "SELECT 2"]),
+    ("SELECT $1; SELECT $2", ["SELECT $1", "SELECT $2"]),
+    ("SELECT a$b$c; SELECT 2", ["SELECT a$b$c", "SELECT 2"]),
+])
+def test_multiple_statements(sql, expected):
+    assert split_statements(sql) == expected
+    assert not is_single_statement(sql)
+
+
+def test_identifier_ending_in_e_is_not_an_escape_string():
+    sql = "SELECT name'x\\'; DELETE FROM t; COMMIT; --'"
+    assert split_statements(sql) == ["SELECT name'x\\'", "DELETE FROM t", "COMMIT"]
+    assert not is_single_statement(sql)
+    with pytest.raises(MultipleStatementsError) as error:
+        ensure_single_statement(sql)
+    assert error.value.count == 3
+
+
+def test_ensure_single_statement_rejects_empty():
+    with pytest.raises(MultipleStatementsError):
+        ensure_single_statement(" ; -- пусто")
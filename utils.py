@@ -1,5 +1,7 @@
+import os
 import re
-from typing import Dict, Any, List
+from typing import Dict, Any, List, NamedTuple
+from .lexer import scan_query, skip_block_comment
 
 def parse_psql_connection_string(psql_str: str) -> Dict[str, str]:
     psql_str = psql_str.strip()
@@ -25,35 +27,23 @@ def parse_psql_connection_string(psql_str: str) -> Dict[str, str]:
     return params
 
 def extract_query_info(query: str) -> Dict[str, Any]:
-    query_upper = query.upper()
-
-    info = {
-        'type': 'UNKNOWN',
-        'tables': [],
-        'operations': []
+    info = scan_query(query)
+    return {
+        'type': info.type,
+        'tables': info.tables,
+        'ctes': info.ctes,
+        'operations': info.operations,
+        'fingerprint': info.fingerprint,
+        'max_param': info.max_param,
     }
 
-    if query_upper.startswith('SELECT'):
-        info['type'] = 'SELECT'
-    elif query_upper.startswith('INSERT'):
-        info['type'] = 'INSERT'
-    elif query_upper.startswith('UPDATE'):
-        info['type'] = 'UPDATE'
-    elif query_upper.startswith('DELETE'):
-        info['type'] = 'DELETE'
-
-    table_matches = re.findall(r'\b(FROM|JOIN|INTO|UPDATE)\s+(\w+)', query_upper)
-    info['tables'] = list(set([match[1] for match in table_matches]))
-
-    if 'WHERE' in query_upper:
-        info['operations'].append('FILTER')
-    if 'ORDER BY' in query_upper:
-        info['operations'].append('SORT')
-    if 'GROUP BY' in query_upper:
-        info['operations'].append('AGGREGATE')
-    if 'JOIN' in query_upper:
-        info['operations'].append('JOIN')
-    return info
+def normalize_query(query: str) -> str:
+    return scan_query(query).normalized
+
+
+def fingerprint_query(query: str) -> str:
+    return scan_query(query).fingerprint
+
 
 def extract_filter_columns(scan_node: Dict[str, Any]) -> str:
     filter_str = str(scan_node.get('Filter', ''))
@@ -65,11 +55,92 @@ def extract_filter_columns(scan_node: Dict[str, Any]) -> str:
 
 def find_plan_nodes(plan_node: dict[str, Any], node_type: str) -> List[dict[str, Any]]:
     nodes = []
-    def _find_nodes(node):
+    stack = [plan_node]
+    while stack:
+        node = stack.pop()
         if node.get('Node Type') == node_type:
             nodes.append(node)
         if 'Plans' in node:
-            for child in node['Plans']:
-                _find_nodes(child)
-    _find_nodes(plan_node)
+            stack.extend(reversed(node['Plans']))
     return nodes
+
+
+_STATEMENT_TOKEN = re.compile(r"""
+      --[^\n]*
+    | /\*
+    | (?<![\w$])[Ee]'(?:[^'\\]|\\.|'')*'?
+    | '(?:[^']|'')*'?
+    | "(?:[^"]|"")*"?
+    | (?<![\w$])\$(?:[A-Za-z_][A-Za-z_0-9]*)?\$
+    | ;
+""", re.X | re.S)
+
+
+def split_statements(sql: str) -> List[str]:
+    statements = []
+    start = pos = 0
+    has_content = False
+    while True:
+        match = _STATEMENT_TOKEN.search(sql, pos)
+        end = match.start() if match else len(sql)
+        if not has_content and sql[pos:end].strip():
+            has_content = True
+        if match is None:
+            break
+
+        token = match.group()
+        pos = match.end()
+        if token == ';':
+            if has_content:
+                statements.append(sql[start:match.start()].strip())
+            start = pos
+            has_content = False
+        elif token.startswith('--'):
+            continue
+        elif token == '/*':
+            pos = skip_block_comment(sql, pos)
+        else:
+            has_content = True
+            if token.startswith('$'):
+                close = sql.find(token, pos)
+                pos = len(sql) if close < 0 else close + len(token)
+
+    if has_content:
+        statements.append(sql[start:].strip())
+    return statements
+
+
+class MultipleStatementsError(ValueError):
+    def __init__(self, count: int):
+        super().__init__(f"Ожидается ровно один SQL-оператор, получено: {count}")
+        self.count = count
+
+
+def is_single_statement(sql: str) -> bool:
+    return len(split_statements(sql)) == 1
+
+
+def ensure_single_statement(sql: str):
+    count = len(split_statements(sql))
+    if count != 1:
+        raise MultipleStatementsError(count)
+
+
+class SqlStatement(NamedTuple):
+    path: str
+    number: int
+    query: str
+
+
+def read_sql_dir(directory: str) -> List[SqlStatement]:
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        paths.extend(os.path.join(root, name) for name in sorted(files) if name.endswith('.sql'))
+
+    statements = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for number, query in enumerate(split_statements(f.read()), 1):
+                statements.append(SqlStatement(os.path.relpath(path, directory), number, query))
+    return statements